@@ -0,0 +1,57 @@
+# adminapp/listing.py
+"""
+Shared paging and sorting for the management list pages.
+
+Views filter and project their queryset (only the columns the table
+shows), then hand it to paginate_list() with the sorts they allow. The
+templates render the result with includes/admin_pagination.html and
+{% querystring %} links, so filters survive paging and sorting.
+"""
+from django.core.paginator import Paginator
+
+PER_PAGE_OPTIONS = (25, 50, 100)
+DEFAULT_PER_PAGE = 25
+
+
+def paginate_list(request, queryset, sorts, default_sort):
+    """
+    `sorts` maps a sort key to its order_by() fields, e.g.
+    {"name": ("name", "id"), "price": ("price", "id")}. `?sort=name` sorts
+    ascending, `?sort=-name` descending.
+
+    Returns the template context: page_obj, sort (the active key, with its
+    "-"), sorting ({key: {"toggle": the sort to link to, "indicator":
+    "▲"/"▼"/""}}) and per_page.
+    """
+    sort = request.GET.get("sort", default_sort)
+    if sort.lstrip("-") not in sorts:
+        sort = default_sort
+    key = sort.lstrip("-")
+    fields = sorts[key]
+    if sort.startswith("-"):
+        fields = [f[1:] if f.startswith("-") else f"-{f}" for f in fields]
+
+    try:
+        per_page = int(request.GET.get("per_page", DEFAULT_PER_PAGE))
+    except ValueError:
+        per_page = DEFAULT_PER_PAGE
+    if per_page not in PER_PAGE_OPTIONS:
+        per_page = DEFAULT_PER_PAGE
+
+    paginator = Paginator(queryset.order_by(*fields), per_page)
+    page_obj = paginator.get_page(request.GET.get("page"))
+
+    return {
+        "page_obj": page_obj,
+        "sort": sort,
+        # Clicking the active column flips it, any other sorts ascending
+        "sorting": {
+            k: {
+                "toggle": f"-{k}" if k == sort else k,
+                "indicator": "▲" if k == sort else "▼" if f"-{k}" == sort else "",
+            }
+            for k in sorts
+        },
+        "per_page": per_page,
+        "per_page_options": PER_PAGE_OPTIONS,
+    }
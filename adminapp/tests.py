@@ -1,3 +1,71 @@
-from django.test import TestCase
+from django.test import RequestFactory, TestCase
 
-# Create your tests here.
+from productsapp.models import Product
+from productsapp.testing import make_category
+from usersapp.models import CustomUser
+from .listing import DEFAULT_PER_PAGE, paginate_list
+
+SORTS = {
+    "name": ("name", "id"),
+    "price": ("price", "id"),
+    "featured": ("-featured", "name", "id"),
+}
+
+
+class PaginateListTests(TestCase):
+    def setUp(self):
+        self.beans = make_category("Beans")
+        self.tools = make_category("Tools")
+        for i in range(60):
+            Product.objects.create(
+                name=f"Product {i:02}", slug=f"product-{i}", price=f"{60 - i}.00",
+                category=self.beans if i % 2 else self.tools, featured=i % 3 == 0,
+            )
+
+    def paginate(self, **params):
+        request = RequestFactory().get("/", params)
+        return paginate_list(request, Product.objects.all(), SORTS, "name")
+
+    def names(self, context):
+        return [p.name for p in context["page_obj"]]
+
+    def test_whitelisted_sorts_both_ways(self):
+        context = self.paginate(sort="price")
+        self.assertEqual(self.names(context)[:2], ["Product 59", "Product 58"])
+        self.assertEqual(context["sorting"]["price"], {"toggle": "-price", "indicator": "▲"})
+        self.assertEqual(context["sorting"]["name"], {"toggle": "name", "indicator": ""})
+
+        context = self.paginate(sort="-price")
+        self.assertEqual(self.names(context)[:2], ["Product 00", "Product 01"])
+        self.assertEqual(context["sorting"]["price"], {"toggle": "price", "indicator": "▼"})
+
+        # A descending field flips to ascending
+        context = self.paginate(sort="-featured")
+        self.assertFalse(context["page_obj"][0].featured)
+
+    def test_invalid_params_fall_back_to_defaults(self):
+        for sort in ("stock", "-id", "name;drop", ""):
+            context = self.paginate(sort=sort)
+            self.assertEqual(context["sort"], "name")
+            self.assertEqual(self.names(context)[0], "Product 00")
+
+        for per_page in ("7", "abc", "-25", "1000"):
+            self.assertEqual(self.paginate(per_page=per_page)["per_page"], DEFAULT_PER_PAGE)
+        self.assertEqual(len(self.paginate(per_page="50")["page_obj"]), 50)
+
+        self.assertEqual(self.paginate(page="abc")["page_obj"].number, 1)
+        # Past the end gives the last page
+        self.assertEqual(self.paginate(page="99")["page_obj"].number, 3)
+
+    def test_filters_with_pagination(self):
+        manager = CustomUser.objects.create_user("boss", password="x", role="manager")
+        self.client.force_login(manager)
+
+        params = {"category": self.beans.id, "sort": "-price", "per_page": "25", "page": "2"}
+        response = self.client.get("/adminmodule/products/", params)
+        self.assertEqual(response.status_code, 200)
+        page_obj = response.context["page_obj"]
+        self.assertEqual(page_obj.paginator.count, 30)
+        self.assertEqual(page_obj.number, 2)
+        self.assertEqual([p.name for p in page_obj], [f"Product {i:02}" for i in range(51, 60, 2)])
+        self.assertEqual(response.context["category"], str(self.beans.id))
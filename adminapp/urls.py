@@ -1,9 +1,12 @@
 from django.urls import path
 from .views import adminlandng
 from usersapp.views import user_list, user_create, user_delete
-from productsapp.views import product_list, product_add, product_edit, product_delete
+from productsapp.views import product_list, product_add, product_edit, product_delete, product_import
+from productsapp.views import product_export
+from productsapp.views import campaign_list, campaign_add, campaign_start, campaign_end
 from productsapp.views import category_list, category_add, category_edit, category_delete
 from productsapp.views import rubro_list, rubro_add, rubro_edit, rubro_delete
+from ordersapp.views import order_export
 
 urlpatterns = [
     # main
@@ -17,9 +20,17 @@ urlpatterns = [
     # Products
     path("products/", product_list, name="product_list"),
     path("products/add/", product_add, name="product_add"),
+    path("products/import/", product_import, name="product_import"),
+    path("products/export/", product_export, name="product_export"),
     path("products/<int:product_id>/edit/", product_edit, name="product_edit"),
     path("products/<int:product_id>/delete/", product_delete, name="product_delete"),
 
+    # Discount campaigns
+    path("campaigns/", campaign_list, name="campaign_list"),
+    path("campaigns/add/", campaign_add, name="campaign_add"),
+    path("campaigns/<int:campaign_id>/start/", campaign_start, name="campaign_start"),
+    path("campaigns/<int:campaign_id>/end/", campaign_end, name="campaign_end"),
+
     # Categories
     path("categories/", category_list, name="category_list"),
     path("categories/add/", category_add, name="category_add"),
@@ -31,4 +42,7 @@ urlpatterns = [
     path('rubros/add/', rubro_add, name="rubro_add"),
     path('rubros/edit/<int:rubro_id>/', rubro_edit, name="rubro_edit"),
     path('rubros/delete/<int:rubro_id>/', rubro_delete, name="rubro_delete"),
+
+    # Orders
+    path("orders/export/", order_export, name="order_export"),
 ]
\ No newline at end of file
@@ -1,10 +1,11 @@
 from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib.auth.decorators import user_passes_test
 from usersapp.models import CustomUser
+from ordersapp.models import Order
 from django.contrib import messages
 
 def is_manager(user):
     return user.is_authenticated and user.role == 'manager'
 
 def adminlandng(request):
-    return render(request, 'admin.html')
\ No newline at end of file
+    return render(request, 'admin.html', {"order_statuses": Order.Status.choices})
\ No newline at end of file
@@ -9,4 +9,11 @@ DB_HOST=os.environ.get('DB_HOST', config('DB_HOST', default='localhost'))
 SECRET_KEY =os.environ.get('SECRET_KEY', config('SECRET_KEY'))
 DEBUG=os.environ.get('DEBUG', config('DEBUG', default=True))
 ALLOWED_HOSTS = os.environ.get('ALLOWED_HOSTS', default='').split(',') if config('ALLOWED_HOSTS', default='') else []
-CSRF_TRUSTED_ORIGINS = os.environ.get('CSRF_TRUSTED_ORIGINS', default='').split(',') if config('CSRF_TRUSTED_ORIGINS', default='') else []
\ No newline at end of file
+CSRF_TRUSTED_ORIGINS = os.environ.get('CSRF_TRUSTED_ORIGINS', default='').split(',') if config('CSRF_TRUSTED_ORIGINS', default='') else []
+QUERY_BUDGET_STRICT = config('QUERY_BUDGET_STRICT', default=False, cast=bool)
+CACHE_URL = config('CACHE_URL', default='locmem://')
+SESSION_CACHE_URL = config('SESSION_CACHE_URL', default=CACHE_URL)
+# Optional: a backend of its own for the catalog caches
+CATALOG_CACHE_URL = config('CATALOG_CACHE_URL', default='')
+# Bearer token the Prometheus scraper sends to /metrics/ (empty: superusers only)
+METRICS_TOKEN = config('METRICS_TOKEN', default='')
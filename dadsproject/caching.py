@@ -0,0 +1,134 @@
+# dadsproject/caching.py
+"""
+Cache configuration and the caches the apps use.
+
+Backends are picked with a URL (CACHE_URL, SESSION_CACHE_URL in the
+environment / .env, see authvars.py):
+
+    locmem://                           per process (the default; fine for runserver)
+    file:///var/tmp/dadsproject-cache   a directory shared by the workers of one host
+    redis://127.0.0.1:6379/0            Redis over TCP (needs the redis package)
+    unix:///run/redis/redis.sock?db=0   Redis over a unix socket
+    memcached://127.0.0.1:11211         memcached (needs pymemcache)
+    memcached:///run/memcached.sock     memcached over a unix socket
+    dummy://                            no caching
+
+The catalog caches are invalidated by bumping version counters
+(productsapp/cache.py). With locmem every worker process has its own
+counters, so a write in one worker leaves the others serving stale pages
+until their entries time out. Any of the shared backends fixes that. The
+file backend needs no server but its incr() isn't atomic, so two bumps
+racing can count as one (the version still moves, which is what matters).
+With DEBUG off, `manage.py check` warns about per-process catalog caches
+(check_shared_caches, W001).
+
+Code reads caches through app_cache(name), not caches[...] directly: a
+name without an alias of its own in CACHES falls back to "default", so
+a busy cache can be moved to a backend of its own by configuration only
+(CATALOG_CACHE_URL for the catalog).
+"""
+from urllib.parse import urlsplit
+
+from django.conf import settings
+from django.core import checks
+from django.core.cache import caches
+from django.core.exceptions import ImproperlyConfigured
+
+BACKENDS = {
+    "locmem": "django.core.cache.backends.locmem.LocMemCache",
+    "file": "django.core.cache.backends.filebased.FileBasedCache",
+    "redis": "django.core.cache.backends.redis.RedisCache",
+    "rediss": "django.core.cache.backends.redis.RedisCache",
+    "unix": "django.core.cache.backends.redis.RedisCache",
+    "memcached": "django.core.cache.backends.memcached.PyMemcacheCache",
+    "dummy": "django.core.cache.backends.dummy.DummyCache",
+}
+
+
+def cache_settings(url, key_prefix="", timeout=300):
+    """
+    One CACHES entry for a backend URL (see the module docstring).
+    """
+    parts = urlsplit(url)
+    scheme = parts.scheme
+    if scheme not in BACKENDS:
+        raise ImproperlyConfigured(f"Unknown cache URL scheme {scheme!r} in {url!r}.")
+
+    config = {"BACKEND": BACKENDS[scheme], "KEY_PREFIX": key_prefix, "TIMEOUT": timeout}
+    if scheme == "locmem":
+        # Each alias its own store
+        config["LOCATION"] = parts.netloc or key_prefix or "default"
+    elif scheme == "file":
+        if not parts.path:
+            raise ImproperlyConfigured(f"The file cache needs a directory: {url!r}.")
+        config["LOCATION"] = parts.path
+    elif scheme == "memcached":
+        config["LOCATION"] = parts.netloc or f"unix:{parts.path}"
+    elif scheme in ("redis", "rediss", "unix"):
+        # redis-py reads these URLs itself, unix sockets included (?db=N)
+        config["LOCATION"] = url
+    return config
+
+
+def session_engine(url):
+    """
+    SESSION_ENGINE for a session cache URL. cached_db needs a cache every
+    worker shares: with a per-process one a logout in one worker would
+    leave the session alive in the others' copies.
+    """
+    if urlsplit(url).scheme in ("locmem", "dummy"):
+        return "django.contrib.sessions.backends.db"
+    return "django.contrib.sessions.backends.cached_db"
+
+
+# Aliases the catalog versions and pricing versions live in
+SHARED_CACHE_ALIASES = ("default", "catalog")
+PER_PROCESS_BACKENDS = (BACKENDS["locmem"],)
+
+
+def check_shared_caches(app_configs=None, **kwargs):
+    """
+    System check: outside DEBUG the catalog caches must be shared by the
+    workers, or writes in one leave the others serving stale pages (up to
+    a day) and stale pricing rules (up to PRICING_RULES_TTL).
+    """
+    if settings.DEBUG:
+        return []
+    return [
+        checks.Warning(
+            f"The {alias!r} cache is per process ({config['BACKEND']}).",
+            hint="Set CACHE_URL (or CATALOG_CACHE_URL) to a shared backend, e.g. "
+                 "file:///var/tmp/dadsproject-cache or redis://127.0.0.1:6379/0.",
+            id="dadsproject.W001",
+        )
+        for alias, config in settings.CACHES.items()
+        if alias in SHARED_CACHE_ALIASES and config["BACKEND"] in PER_PROCESS_BACKENDS
+    ]
+
+
+def app_cache(name):
+    """
+    The cache for `name`: its own CACHES alias if there is one, else
+    "default".
+    """
+    return caches[name if name in settings.CACHES else "default"]
+
+
+class AppCache:
+    """
+    Module-level handle on app_cache(name), looked up on every use so it
+    follows override_settings(CACHES=...) in tests.
+    """
+
+    def __init__(self, name):
+        self._name = name
+
+    def __getattr__(self, attr):
+        return getattr(app_cache(self._name), attr)
+
+    def __repr__(self):
+        return f"<AppCache {self._name}>"
+
+
+# Catalog responses, versions, availability and bundle expansions
+catalog_cache = AppCache("catalog")
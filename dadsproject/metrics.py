@@ -0,0 +1,160 @@
+# dadsproject/metrics.py
+"""
+In-process request metrics, fed by InstrumentationMiddleware and served at
+/metrics/ in the Prometheus text format (or ?format=json).
+
+Histograms live in the worker's memory: with several worker processes each
+one reports its own requests since it started, so scrape every worker (or
+sum them) rather than expecting one global view.
+"""
+import hmac
+import threading
+from bisect import bisect_left
+
+from django.conf import settings
+from django.http import Http404, HttpResponse, JsonResponse
+
+# Upper bounds; every histogram also has +Inf
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 200)
+
+
+class Histogram:
+    __slots__ = ("bounds", "counts", "sum", "count", "max")
+
+    def __init__(self, bounds):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)
+        self.sum = 0
+        self.count = 0
+        self.max = 0
+
+    def observe(self, value):
+        self.counts[bisect_left(self.bounds, value)] += 1
+        self.sum += value
+        self.count += 1
+        self.max = max(self.max, value)
+
+    def cumulative(self):
+        """
+        [(upper bound as text, observations <= bound)], ending with +Inf.
+        """
+        total = 0
+        result = []
+        for bound, count in zip([*map(str, self.bounds), "+Inf"], self.counts):
+            total += count
+            result.append((bound, total))
+        return result
+
+    def as_dict(self):
+        return {
+            "count": self.count,
+            "sum": round(self.sum, 6),
+            "avg": round(self.sum / self.count, 6) if self.count else 0,
+            "max": round(self.max, 6),
+            "buckets": dict(self.cumulative()),
+        }
+
+
+class ViewStats:
+    __slots__ = ("duration", "db_duration", "queries", "statuses")
+
+    def __init__(self):
+        self.duration = Histogram(DURATION_BUCKETS)
+        self.db_duration = Histogram(DURATION_BUCKETS)
+        self.queries = Histogram(QUERY_BUCKETS)
+        self.statuses = {}
+
+
+class Registry:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._views = {}
+
+    def observe(self, view, duration, db_duration, queries, status):
+        """
+        duration and db_duration in seconds.
+        """
+        with self._lock:
+            stats = self._views.get(view)
+            if stats is None:
+                stats = self._views[view] = ViewStats()
+            stats.duration.observe(duration)
+            stats.db_duration.observe(db_duration)
+            stats.queries.observe(queries)
+            stats.statuses[status] = stats.statuses.get(status, 0) + 1
+
+    def reset(self):
+        with self._lock:
+            self._views = {}
+
+    def as_dict(self):
+        with self._lock:
+            return {
+                view: {
+                    "duration_seconds": stats.duration.as_dict(),
+                    "db_duration_seconds": stats.db_duration.as_dict(),
+                    "queries": stats.queries.as_dict(),
+                    "statuses": {str(status): n for status, n in sorted(stats.statuses.items())},
+                }
+                for view, stats in sorted(self._views.items())
+            }
+
+    def render_prometheus(self):
+        families = (
+            ("http_request_duration_seconds", "Wall time per request, by view.", "duration"),
+            ("http_request_db_duration_seconds", "Time spent in database queries per request, by view.", "db_duration"),
+            ("http_request_db_queries", "Database queries per request, by view.", "queries"),
+        )
+        with self._lock:
+            views = sorted(self._views.items())
+            lines = []
+            for name, help_text, attr in families:
+                lines += [f"# HELP {name} {help_text}", f"# TYPE {name} histogram"]
+                for view, stats in views:
+                    histogram = getattr(stats, attr)
+                    label = _label(view)
+                    for bound, count in histogram.cumulative():
+                        lines.append(f'{name}_bucket{{view="{label}",le="{bound}"}} {count}')
+                    lines.append(f'{name}_sum{{view="{label}"}} {histogram.sum:.6f}')
+                    lines.append(f'{name}_count{{view="{label}"}} {histogram.count}')
+            lines += ["# HELP http_responses_total Responses by view and status.", "# TYPE http_responses_total counter"]
+            for view, stats in views:
+                for status, count in sorted(stats.statuses.items()):
+                    lines.append(f'http_responses_total{{view="{_label(view)}",status="{status}"}} {count}')
+        return "\n".join(lines) + "\n"
+
+
+def _label(value):
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+registry = Registry()
+
+
+def _has_token(request):
+    token = getattr(settings, "METRICS_TOKEN", "")
+    if not token:
+        return False
+    scheme, _, sent = request.headers.get("Authorization", "").partition(" ")
+    return scheme.lower() == "bearer" and hmac.compare_digest(sent.strip().encode(), token.encode())
+
+
+def metrics(request):
+    """
+    Answers superusers, requests bearing METRICS_TOKEN and requests from
+    METRICS_ALLOWED_IPS (none by default: behind a local reverse proxy
+    every client looks like 127.0.0.1). 404 for everyone else.
+    """
+    allowed_ips = getattr(settings, "METRICS_ALLOWED_IPS", ())
+    user = getattr(request, "user", None)
+    allowed = (
+        (user and user.is_superuser)
+        or _has_token(request)
+        or request.META.get("REMOTE_ADDR") in allowed_ips
+    )
+    if not allowed:
+        raise Http404()
+    if request.GET.get("format") == "json":
+        return JsonResponse(registry.as_dict())
+    return HttpResponse(registry.render_prometheus(), content_type="text/plain; version=0.0.4; charset=utf-8")
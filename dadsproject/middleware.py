@@ -0,0 +1,153 @@
+# dadsproject/middleware.py
+"""
+Request instrumentation.
+
+InstrumentationMiddleware times every request and, through a database
+execute_wrapper, counts its queries and the time spent in them. Per
+request it:
+
+- adds a Server-Timing header (app and db durations, query count), so the
+  browser's network panel shows where the time went;
+- feeds the per-view histograms served at /metrics/ (dadsproject/metrics.py);
+- logs slow requests with their slowest statements, and any statement
+  over SLOW_SQL_MS, to the "dadsproject.performance" logger;
+- checks QUERY_BUDGETS: {url name: max queries}. Going over logs a
+  warning, or raises QueryBudgetExceeded when QUERY_BUDGET_STRICT is on
+  (tests / CI), so an N+1 regression fails the build.
+
+Views are keyed by their URL name (resolver_match.view_name). Queries run
+while a StreamingHttpResponse is consumed happen after the middleware
+returns and aren't counted.
+
+The middleware is async-capable, so under ASGI async views aren't pushed
+onto a thread on its account. Connections are per thread and async ORM
+calls run on the request's sync thread, so that's where the wrapper is
+installed.
+"""
+import heapq
+import logging
+import time
+from contextlib import ExitStack
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.db import connections
+
+from .metrics import registry
+
+logger = logging.getLogger("dadsproject.performance")
+
+# Statements kept per request for the slow request log
+SLOWEST_KEPT = 3
+
+
+class QueryBudgetExceeded(AssertionError):
+    pass
+
+
+class QueryRecorder:
+    """
+    execute_wrapper callable: counts statements and their time, keeping
+    the slowest few.
+    """
+
+    def __init__(self):
+        self.count = 0
+        self.duration = 0.0
+        self.slowest = []  # min-heap of (seconds, sql)
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            elapsed = time.perf_counter() - started
+            self.count += 1
+            self.duration += elapsed
+            if len(self.slowest) < SLOWEST_KEPT:
+                heapq.heappush(self.slowest, (elapsed, sql))
+            elif elapsed > self.slowest[0][0]:
+                heapq.heapreplace(self.slowest, (elapsed, sql))
+
+    def slowest_first(self):
+        return sorted(self.slowest, reverse=True)
+
+
+def view_name(request):
+    match = getattr(request, "resolver_match", None)
+    if match is None:
+        return "<unresolved>"
+    return match.view_name or match._func_path
+
+
+def _watch_queries(stack, recorder):
+    for alias in connections:
+        stack.enter_context(connections[alias].execute_wrapper(recorder))
+
+
+class InstrumentationMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        recorder = QueryRecorder()
+        started = time.perf_counter()
+        with ExitStack() as stack:
+            _watch_queries(stack, recorder)
+            response = self.get_response(request)
+        return self.finish(request, response, time.perf_counter() - started, recorder)
+
+    async def __acall__(self, request):
+        recorder = QueryRecorder()
+        started = time.perf_counter()
+        stack = ExitStack()
+        await sync_to_async(_watch_queries)(stack, recorder)
+        try:
+            response = await self.get_response(request)
+        finally:
+            await sync_to_async(stack.close)()
+        return self.finish(request, response, time.perf_counter() - started, recorder)
+
+    def finish(self, request, response, duration, recorder):
+        view = view_name(request)
+        registry.observe(view, duration, recorder.duration, recorder.count, response.status_code)
+
+        if getattr(settings, "SERVER_TIMING", True):
+            response["Server-Timing"] = (
+                f"app;dur={duration * 1000:.1f}, "
+                f'db;dur={recorder.duration * 1000:.1f};desc="{recorder.count} queries"'
+            )
+
+        self.log_slow(request, view, duration, recorder)
+        self.check_budget(request, view, recorder)
+        return response
+
+    def log_slow(self, request, view, duration, recorder):
+        slow_sql = getattr(settings, "SLOW_SQL_MS", 100) / 1000
+        for elapsed, sql in recorder.slowest_first():
+            if elapsed >= slow_sql:
+                logger.warning("Slow SQL in %s (%.1fms): %s", view, elapsed * 1000, sql)
+
+        if duration >= getattr(settings, "SLOW_REQUEST_MS", 500) / 1000:
+            logger.warning(
+                "Slow request %s %s (%s): %.1fms, %d queries, %.1fms in DB. Slowest: %s",
+                request.method, request.path, view, duration * 1000, recorder.count, recorder.duration * 1000,
+                " | ".join(f"{elapsed * 1000:.1f}ms {sql[:300]}" for elapsed, sql in recorder.slowest_first()),
+            )
+
+    def check_budget(self, request, view, recorder):
+        budget = getattr(settings, "QUERY_BUDGETS", {}).get(view)
+        if budget is None or recorder.count <= budget:
+            return
+        message = f"{view} ran {recorder.count} queries, its budget is {budget} ({request.method} {request.path})."
+        if getattr(settings, "QUERY_BUDGET_STRICT", False):
+            raise QueryBudgetExceeded(message)
+        logger.warning("Query budget exceeded: %s", message)
@@ -11,7 +11,9 @@ https://docs.djangoproject.com/en/5.2/ref/settings/
 """
 
 from pathlib import Path
-from .authvars import SECRET_KEY, DEBUG, DB_NAME, DB_USR, DB_PASS,DB_HOST, DB_PORT
+from .authvars import SECRET_KEY, DEBUG, DB_NAME, DB_USR, DB_PASS,DB_HOST, DB_PORT, QUERY_BUDGET_STRICT
+from .authvars import CACHE_URL, SESSION_CACHE_URL, CATALOG_CACHE_URL, METRICS_TOKEN
+from .caching import cache_settings, session_engine
 from django.contrib.messages import constants as messages
 
 
@@ -48,6 +50,8 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    # First, so it also times and counts the other middleware
+    'dadsproject.middleware.InstrumentationMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -97,6 +101,21 @@ DATABASES = {
 }
 
 
+# Cache backends by URL, see dadsproject/caching.py. The catalog caches use
+# "default" unless CATALOG_CACHE_URL gives them their own.
+CACHES = {
+    'default': cache_settings(CACHE_URL, key_prefix='dads'),
+    'sessions': cache_settings(SESSION_CACHE_URL, key_prefix='dads-session'),
+}
+if CATALOG_CACHE_URL:
+    CACHES['catalog'] = cache_settings(CATALOG_CACHE_URL, key_prefix='dads-catalog')
+
+# Sessions read from the cache and written through to the DB when
+# SESSION_CACHE_URL is shared by all workers, plain DB sessions otherwise.
+# Purge the expired rows with `manage.py purge_sessions` (from cron).
+SESSION_ENGINE = session_engine(SESSION_CACHE_URL)
+SESSION_CACHE_ALIAS = 'sessions'
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
@@ -163,4 +182,61 @@ MESSAGE_TAGS = {
 }
 
 MEDIA_URL = '/media/'
-MEDIA_ROOT = BASE_DIR / "media"
\ No newline at end of file
+MEDIA_ROOT = BASE_DIR / "media"
+# Threads resizing product images after upload (productsapp/images.py),
+# 0 resizes inline on commit
+IMAGE_DERIVATIVE_WORKERS = 2
+# Product image files saved (or reused by an identical upload) this many
+# seconds ago are never deleted on release (productsapp/storage.py)
+IMAGE_RELEASE_GRACE = 300
+
+# Seconds a worker reuses its compiled pricing rules (ordersapp/pricing.py)
+# before re-reading them, however the rules' cache version looks
+PRICING_RULES_TTL = 60
+
+# Request instrumentation (dadsproject/middleware.py)
+SERVER_TIMING = True
+SLOW_REQUEST_MS = 500
+SLOW_SQL_MS = 100
+# /metrics/ is for superusers and requests with "Authorization: Bearer
+# <METRICS_TOKEN>". Behind a reverse proxy on this host every request comes
+# from 127.0.0.1, so loopback isn't trusted unless listed here.
+METRICS_TOKEN = METRICS_TOKEN
+METRICS_ALLOWED_IPS = ()
+
+# Max queries per URL name. Over budget logs a warning, or fails the
+# request when QUERY_BUDGET_STRICT is set (set it in CI).
+QUERY_BUDGETS = {
+    'home': 4,
+    # Cold cache, pricing rules included (3, when a worker recompiles them);
+    # a cached page runs none
+    'products_api': 13,
+    'products_api_async': 13,
+    'facets_api': 4,
+    'quote_api': 6,
+    # One stock UPDATE per product in the cart on top of these
+    'checkout_api': 20,
+    'checkout_api_async': 20,
+    'checkout_batch_api': 30,
+    # Orders and their items, two queries whatever the page holds
+    'orders_api': 4,
+    'order_detail_api': 4,
+    'adminlanding': 4,
+    'product_list': 8,
+    'category_list': 7,
+    'rubro_list': 6,
+    'campaign_list': 6,
+    'user_list': 6,
+}
+QUERY_BUDGET_STRICT = QUERY_BUDGET_STRICT
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'console': {'class': 'logging.StreamHandler'},
+    },
+    'loggers': {
+        'dadsproject.performance': {'handlers': ['console'], 'level': 'WARNING', 'propagate': False},
+    },
+}
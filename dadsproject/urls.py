@@ -18,11 +18,13 @@ from django.contrib import admin
 from django.urls import path, include
 from django.conf import settings
 from django.conf.urls.static import static
+from .metrics import metrics
 
 urlpatterns = [
     path('admin/', admin.site.urls),
     path('', include('storefrontapp.urls')),
     path('adminmodule/', include('adminapp.urls')),
+    path('metrics/', metrics, name='metrics'),
 ]
 
 if settings.DEBUG:
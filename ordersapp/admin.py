@@ -1,3 +1,21 @@
 from django.contrib import admin
 
-# Register your models here.
+from .models import ShippingTier, CategoryDiscount, Promotion
+
+
+@admin.register(ShippingTier)
+class ShippingTierAdmin(admin.ModelAdmin):
+    list_display = ('delivery_method', 'min_subtotal', 'cost', 'active')
+    list_filter = ('delivery_method', 'active')
+
+
+@admin.register(CategoryDiscount)
+class CategoryDiscountAdmin(admin.ModelAdmin):
+    list_display = ('category', 'percent', 'active')
+    list_filter = ('active',)
+
+
+@admin.register(Promotion)
+class PromotionAdmin(admin.ModelAdmin):
+    list_display = ('name', 'min_subtotal', 'percent_off', 'active', 'starts_at', 'ends_at')
+    list_filter = ('active',)
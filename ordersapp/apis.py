@@ -1,13 +1,171 @@
 # dadsproject/ordersapp/apis.py
 
 import json
+import hashlib
+from datetime import timedelta
 from django.http import JsonResponse
-from django.views.decorators.http import require_POST
+from django.views.decorators.http import require_GET, require_POST
 from django.contrib.auth.decorators import login_required
 from django.core.exceptions import ValidationError
-from .services import create_order_from_payload
+from django.db import transaction, IntegrityError
+from django.db.models import Prefetch
+from django.utils import timezone
+from productsapp.models import Product
+from productsapp.pagination import KeysetPaginator, InvalidCursor
+from .models import Order, OrderItem, IdempotencyKey
+from .pricing import get_rules
+from .services import create_order_from_payload, create_orders_from_payloads
 import traceback
 
+# How long a stored checkout response can be replayed
+IDEMPOTENCY_TTL = timedelta(hours=24)
+
+# Upper bound on orders per batch upload
+MAX_BATCH_ORDERS = 200
+
+# Order history: newest first, id breaks ties (backed by order_user_created_id_idx)
+HISTORY_ORDERING = ("-created_at", "-id")
+HISTORY_PAGE_SIZE = 20
+MAX_HISTORY_PAGE_SIZE = 100
+HISTORY_FIELDS = (
+    "id", "created_at", "status", "delivery_method",
+    "subtotal", "discount_total", "shipping_total", "total",
+)
+HISTORY_ITEM_FIELDS = ("id", "order_id", "product_id", "product_name", "unit_price", "quantity", "line_total")
+
+
+def _checkout(user, payload):
+    """
+    Runs the checkout and returns (body, status).
+    """
+    # Call the service layer
+    try:
+        order = create_order_from_payload(user, payload)
+    except ValidationError as e:
+        return {"status": "error", "message": str(e)}, 400
+    except Exception as e:
+        traceback.print_exc()
+        return {"status": "error", "message": "Internal error while creating order"}, 500
+
+    # Return order summary
+    return {
+        "status": "ok",
+        "order_id": order.id,
+        "subtotal": float(order.subtotal),
+        "shipping": float(order.shipping_total),
+        "total": float(order.total),
+        "items": [
+            {
+                "product_id": item.product_id,
+                "name": item.product_name,
+                "qty": item.quantity,
+                "unit_price": float(item.unit_price),
+                "line_total": float(item.line_total),
+            }
+            for item in order.items.all()
+        ]
+    }, 201
+
+
+def _replay(record):
+    response = JsonResponse(record.response_body, status=record.response_status)
+    response["Idempotent-Replayed"] = "true"
+    return response
+
+
+def _request_hash(payload):
+    return hashlib.sha256(json.dumps(payload, sort_keys=True).encode("utf-8")).hexdigest()
+
+
+def _completed_key(user, key):
+    """
+    The key's stored response, if it has one that hasn't expired.
+    """
+    return IdempotencyKey.objects.filter(
+        user=user, key=key, response_status__isnull=False, expires_at__gt=timezone.now()
+    )
+
+
+def _replay_completed(record, request_hash):
+    if record.request_hash != request_hash:
+        return JsonResponse(
+            {"status": "error", "message": "Idempotency-Key was already used with a different payload."},
+            status=422,
+        )
+    return _replay(record)
+
+
+def _idempotent_checkout(user, key, payload):
+    request_hash = _request_hash(payload)
+
+    # Fast path: a completed request is replayed with a single read
+    record = _completed_key(user, key).first()
+    if record:
+        return _replay_completed(record, request_hash)
+    return _locked_checkout(user, key, payload, request_hash)
+
+
+def _locked_checkout(user, key, payload, request_hash):
+    now = timezone.now()
+    with transaction.atomic():
+        # Insert first, then lock. A concurrent request with the same key
+        # blocks on the INSERT until this transaction commits, then replays
+        # (locking a missing row first would risk a gap-lock deadlock).
+        try:
+            with transaction.atomic():
+                record = IdempotencyKey.objects.create(
+                    user=user, key=key, request_hash=request_hash, expires_at=now + IDEMPOTENCY_TTL
+                )
+        except IntegrityError:
+            record = IdempotencyKey.objects.select_for_update().get(user=user, key=key)
+
+            if record.expires_at <= now or record.response_status is None:
+                # Expired, or the earlier attempt failed (only successes are
+                # stored): the key starts over, with whatever cart the client
+                # fixed in the meantime
+                record.request_hash = request_hash
+                record.response_status = None
+                record.response_body = None
+            elif record.request_hash != request_hash:
+                return JsonResponse(
+                    {"status": "error", "message": "Idempotency-Key was already used with a different payload."},
+                    status=422,
+                )
+            else:
+                return _replay(record)
+
+        body, status = _checkout(user, payload)
+
+        # Only successes are stored, a failed attempt can be retried
+        if status == 201:
+            record.response_status = status
+            record.response_body = body
+        record.expires_at = now + IDEMPOTENCY_TTL
+        record.save(update_fields=["request_hash", "response_status", "response_body", "expires_at"])
+
+    return JsonResponse(body, status=status)
+
+
+def _checkout_request(request):
+    """
+    (payload, Idempotency-Key, None), or (None, None, error response).
+    """
+    try:
+        payload = json.loads(request.body.decode("utf-8"))
+    except json.JSONDecodeError:
+        return None, None, JsonResponse(
+            {"status": "error", "message": "Invalid JSON payload"},
+            status=400,
+        )
+
+    key = request.headers.get("Idempotency-Key", "").strip()
+    if len(key) > 255:
+        return None, None, JsonResponse(
+            {"status": "error", "message": "Idempotency-Key is too long."},
+            status=400,
+        )
+    return payload, key, None
+
 
 @require_POST
 @login_required(login_url="/login/")
@@ -15,9 +173,31 @@ def checkout_api(request):
     """
     JSON-only endpoint for creating orders.
     Authenticated users only.
+
+    Send an Idempotency-Key header to make retries safe: a repeated key
+    returns the original 201 response instead of creating another order.
     """
+    payload, key, error = _checkout_request(request)
+    if error:
+        return error
+    if key:
+        return _idempotent_checkout(request.user, key, payload)
 
-    # Parse JSON input
+    body, status = _checkout(request.user, payload)
+    return JsonResponse(body, status=status)
+
+
+@require_POST
+@login_required(login_url="/login/")
+def checkout_batch_api(request):
+    """
+    Creates many orders in one request (kiosks uploading queued orders).
+
+    Body: {"mode": "atomic" | "partial", "orders": [<checkout payload>, ...]}
+
+    "atomic" (default) creates all orders or none; "partial" commits the
+    valid ones. The response reports the outcome of every order by index.
+    """
     try:
         payload = json.loads(request.body.decode("utf-8"))
     except json.JSONDecodeError:
@@ -26,26 +206,126 @@ def checkout_api(request):
             status=400,
         )
 
-    # Call the service layer
-    try:
-        order = create_order_from_payload(request.user, payload)
-    except ValidationError as e:
+    orders = payload.get("orders") if isinstance(payload, dict) else None
+    if not isinstance(orders, list) or not orders:
+        return JsonResponse({"status": "error", "message": "No orders in batch."}, status=400)
+    if len(orders) > MAX_BATCH_ORDERS:
         return JsonResponse(
-            {"status": "error", "message": str(e)},
+            {"status": "error", "message": f"A batch can have at most {MAX_BATCH_ORDERS} orders."},
             status=400,
         )
-    except Exception as e:
+    if not all(isinstance(o, dict) for o in orders):
+        return JsonResponse({"status": "error", "message": "Every order must be an object."}, status=400)
+
+    mode = payload.get("mode") or "atomic"
+    if mode not in ("atomic", "partial"):
+        return JsonResponse({"status": "error", "message": "Invalid mode."}, status=400)
+
+    try:
+        results = create_orders_from_payloads(request.user, orders, all_or_nothing=(mode == "atomic"))
+    except ValidationError as e:
+        return JsonResponse({"status": "error", "message": str(e)}, status=400)
+    except Exception:
         traceback.print_exc()
         return JsonResponse(
-            {"status": "error", "message": "Internal error while creating order"},
+            {"status": "error", "message": "Internal error while creating orders"},
             status=500,
         )
 
-    # Return order summary
+    created = 0
+    for result in results:
+        order = result.pop("order", None)
+        if order is not None:
+            created += 1
+            result["order_id"] = order.id
+            result["total"] = float(order.total)
+
     return JsonResponse({
-        "status": "ok",
-        "order_id": order.id,
+        "status": "ok" if created == len(results) else "partial" if created else "error",
+        "created": created,
+        "failed": len(results) - created,
+        "results": results,
+    }, status=201 if created else 400)
+
+
+@require_POST
+def quote_api(request):
+    """
+    Prices a cart with the same rules checkout uses, so the frontend
+    doesn't have to re-implement shipping or discounts.
+
+    Body: {"delivery_method": "pickup", "items": [{"product_id": 1, "quantity": 2}, ...]}
+    """
+    try:
+        payload = json.loads(request.body.decode("utf-8"))
+    except json.JSONDecodeError:
+        return JsonResponse(
+            {"status": "error", "message": "Invalid JSON payload"},
+            status=400,
+        )
+
+    if not isinstance(payload, dict):
+        return JsonResponse({"status": "error", "message": "Invalid JSON payload"}, status=400)
+
+    delivery_method = payload.get("delivery_method") or Order.DeliveryMethod.PICKUP
+    if delivery_method not in Order.DeliveryMethod.values:
+        return JsonResponse({"status": "error", "message": "Invalid delivery method."}, status=400)
+
+    items_data = payload.get("items") or []
+    if not isinstance(items_data, list) or not all(isinstance(i, dict) for i in items_data):
+        return JsonResponse({"status": "error", "message": "Items must be a list of objects."}, status=400)
+
+    items = []
+    missing = []
+    for item in items_data:
+        if not item.get("product_id"):
+            continue
+        try:
+            product_id = int(item["product_id"])
+        except (TypeError, ValueError):
+            # Not an id any product could have
+            missing.append(item["product_id"])
+            continue
+        try:
+            qty = int(item.get("quantity") or 0)
+        except (TypeError, ValueError):
+            qty = 0
+        items.append((item["product_id"], product_id, qty))
+    products = Product.objects.in_bulk([product_id for _, product_id, _ in items])
+
+    lines = []
+    for raw_id, product_id, qty in items:
+        product = products.get(product_id)
+        if product is None:
+            missing.append(raw_id)
+        elif qty > 0:
+            lines.append((product, qty))
+
+    quote = get_rules().quote(lines, delivery_method)
+    return JsonResponse({"status": "ok", **quote.as_dict(), "missing": missing})
+
+
+def _history_queryset(user):
+    """
+    The user's orders with their items: two queries however many items
+    each order has, both reading only the columns the payload shows.
+    """
+    items = OrderItem.objects.only(*HISTORY_ITEM_FIELDS).order_by("id")
+    return (
+        Order.objects.filter(user=user)
+        .only(*HISTORY_FIELDS)
+        .prefetch_related(Prefetch("items", queryset=items))
+    )
+
+
+def _order_history_entry(order):
+    return {
+        "id": order.id,
+        "created_at": order.created_at.isoformat(),
+        "status": order.status,
+        "delivery_method": order.delivery_method,
         "subtotal": float(order.subtotal),
+        "discount": float(order.discount_total),
         "shipping": float(order.shipping_total),
         "total": float(order.total),
         "items": [
@@ -57,5 +337,51 @@ def checkout_api(request):
                 "line_total": float(item.line_total),
             }
             for item in order.items.all()
-        ]
-    }, status=201)
+        ],
+    }
+
+
+@require_GET
+@login_required(login_url="/login/")
+def orders_api(request):
+    """
+    The current user's orders, newest first, with their items.
+
+    Keyset paginated: pass `cursor` from the previous response's next/prev
+    (nothing for the first page). Optional: page_size (max 100), status.
+    """
+    try:
+        page_size = min(max(int(request.GET.get("page_size", HISTORY_PAGE_SIZE)), 1), MAX_HISTORY_PAGE_SIZE)
+    except ValueError:
+        page_size = HISTORY_PAGE_SIZE
+
+    orders = _history_queryset(request.user)
+    status = request.GET.get("status")
+    if status:
+        if status not in Order.Status.values:
+            return JsonResponse({"status": "error", "message": "Invalid status."}, status=400)
+        orders = orders.filter(status=status)
+
+    paginator = KeysetPaginator(orders, HISTORY_ORDERING, page_size)
+    try:
+        page = paginator.page(request.GET.get("cursor", "").strip())
+    except InvalidCursor as e:
+        return JsonResponse({"status": "error", "message": str(e)}, status=400)
+
+    return JsonResponse({
+        "results": [_order_history_entry(order) for order in page],
+        "next": page.next_cursor,
+        "prev": page.prev_cursor,
+    })
+
+
+@require_GET
+@login_required(login_url="/login/")
+def order_detail_api(request, order_id):
+    """
+    One of the current user's orders with its items, 404 for anyone else's.
+    """
+    order = _history_queryset(request.user).filter(id=order_id).first()
+    if order is None:
+        return JsonResponse({"status": "error", "message": "Order not found."}, status=404)
+    return JsonResponse(_order_history_entry(order))
@@ -0,0 +1,34 @@
+# ordersapp/async_apis.py
+"""
+Async variant of checkout_api, for ASGI deployments (/api/async/checkout/).
+
+Same request and responses as the sync view. Replays of a completed
+Idempotency-Key are answered with an async read. The checkout itself
+locks stock inside transaction.atomic(), which Django only supports in
+sync code, so it runs on the request's sync thread.
+"""
+from asgiref.sync import sync_to_async
+from django.contrib.auth.decorators import login_required
+from django.http import JsonResponse
+from django.views.decorators.http import require_POST
+
+from .apis import _checkout, _checkout_request, _completed_key, _locked_checkout, _replay_completed, _request_hash
+
+
+@require_POST
+@login_required(login_url="/login/")
+async def checkout_api_async(request):
+    payload, key, error = _checkout_request(request)
+    if error:
+        return error
+    user = await request.auser()
+
+    if key:
+        request_hash = _request_hash(payload)
+        record = await _completed_key(user, key).afirst()
+        if record:
+            return _replay_completed(record, request_hash)
+        return await sync_to_async(_locked_checkout)(user, key, payload, request_hash)
+
+    body, status = await sync_to_async(_checkout)(user, payload)
+    return JsonResponse(body, status=status)
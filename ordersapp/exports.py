@@ -0,0 +1,65 @@
+# ordersapp/exports.py
+"""
+Orders export. JSON Lines gets one object per order with its items nested;
+CSV gets one line per item with the order's columns repeated (orders
+without items still get a line).
+"""
+from adminapp.exports import CHUNK_SIZE, created_between, iter_chunks
+
+from .models import Order, OrderItem
+
+ORDER_COLUMNS = (
+    "id", "created_at", "status", "delivery_method", "user_id",
+    "customer_name", "customer_email", "customer_phone", "customer_address",
+    "subtotal", "discount_total", "shipping_total", "total", "note",
+)
+ITEM_COLUMNS = ("product_id", "product_name", "unit_price", "quantity", "line_total")
+
+# CSV: item columns get a prefix so they can't clash with the order's
+ORDER_CSV_COLUMNS = ORDER_COLUMNS + tuple(f"item_{c}" for c in ITEM_COLUMNS)
+
+
+def filter_orders(queryset=None, statuses=None, date_from=None, date_to=None):
+    """
+    statuses: iterable of Order.Status values; dates are inclusive local
+    dates (datetime.date).
+    """
+    if queryset is None:
+        queryset = Order.objects.all()
+    if statuses:
+        queryset = queryset.filter(status__in=statuses)
+    return queryset.filter(**created_between(date_from, date_to))
+
+
+def order_export_chunks(queryset, chunk_size=CHUNK_SIZE):
+    """
+    Yields lists of order dicts with an "items" list: one query for the
+    chunk's orders and one for all of their items.
+    """
+    for orders in iter_chunks(queryset.values(*ORDER_COLUMNS), chunk_size):
+        items = {}
+        lines = (
+            OrderItem.objects.filter(order_id__in=[order["id"] for order in orders])
+            .order_by("order_id", "id")
+            .values("order_id", *ITEM_COLUMNS)
+        )
+        for line in lines:
+            items.setdefault(line.pop("order_id"), []).append(line)
+        for order in orders:
+            order["items"] = items.get(order["id"], [])
+        yield orders
+
+
+def order_csv_chunks(chunks):
+    """
+    Flattens order_export_chunks() to one dict per item.
+    """
+    for orders in chunks:
+        rows = []
+        for order in orders:
+            items = order.pop("items")
+            for item in items or [{}]:
+                row = dict(order)
+                row.update({f"item_{c}": item.get(c) for c in ITEM_COLUMNS})
+                rows.append(row)
+        yield rows
@@ -1,7 +1,7 @@
 # ordersapp/models.py
 from django.db import models
 from django.conf import settings
-from productsapp.models import Product
+from productsapp.models import Product, Category
 
 
 class Order(models.Model):
@@ -52,11 +52,20 @@ class Order(models.Model):
 
     note = models.TextField(blank=True)
 
+    # {product_id: qty} taken out of stock at checkout (bundles as their
+    # components), released as-is on cancellation
+    reserved_stock = models.JSONField(default=dict, blank=True)
+
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
     class Meta:
         ordering = ["-created_at"]
+        indexes = [
+            # id breaks created_at ties for the order history's keyset pages
+            models.Index(fields=["user", "-created_at", "-id"], name="order_user_created_id_idx"),
+            models.Index(fields=["status", "-created_at"], name="order_status_created_idx"),
+        ]
 
     def __str__(self):
         return f"Order #{self.id} — {self.status}"
@@ -96,3 +105,94 @@ class OrderItem(models.Model):
 
     def __str__(self):
         return f"{self.product_name} x {self.quantity}"
+
+
+class IdempotencyKey(models.Model):
+    """
+    Response stored for a checkout sent with an Idempotency-Key header.
+    A retry with the same key replays it instead of creating a second order.
+    """
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name="idempotency_keys",
+    )
+    key = models.CharField(max_length=255)
+
+    # Reusing a key with a different payload is a client bug, not a retry
+    request_hash = models.CharField(max_length=64)
+
+    # Empty until the request completes successfully
+    response_status = models.PositiveSmallIntegerField(null=True, blank=True)
+    response_body = models.JSONField(null=True, blank=True)
+
+    created_at = models.DateTimeField(auto_now_add=True)
+    expires_at = models.DateTimeField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["user", "key"], name="idempotency_key_per_user"),
+        ]
+        indexes = [
+            models.Index(fields=["expires_at"], name="idempotency_expires_idx"),
+        ]
+
+    def __str__(self):
+        return f"{self.key} ({self.user_id})"
+
+
+# --- Pricing rules (compiled by ordersapp/pricing.py) ---
+
+class ShippingTier(models.Model):
+    """
+    Shipping cost for carts whose subtotal is at least `min_subtotal`.
+    The highest matching tier wins. A blank delivery method applies to both.
+    """
+    delivery_method = models.CharField(
+        max_length=20,
+        choices=Order.DeliveryMethod.choices,
+        blank=True,
+    )
+    min_subtotal = models.DecimalField(max_digits=10, decimal_places=2, default=0)
+    cost = models.DecimalField(max_digits=10, decimal_places=2)
+    active = models.BooleanField(default=True)
+
+    class Meta:
+        ordering = ["delivery_method", "min_subtotal"]
+
+    def __str__(self):
+        method = self.delivery_method or "any"
+        return f"{method} ≥ {self.min_subtotal}: {self.cost}"
+
+
+class CategoryDiscount(models.Model):
+    """
+    Percentage off every product in a category. A product gets whichever is
+    lower: this or its own flat Product.discount.
+    """
+    category = models.ForeignKey(
+        Category,
+        on_delete=models.CASCADE,
+        related_name="discount_rules",
+    )
+    percent = models.DecimalField(max_digits=5, decimal_places=2)
+    active = models.BooleanField(default=True)
+
+    def __str__(self):
+        return f"{self.category.name}: -{self.percent}%"
+
+
+class Promotion(models.Model):
+    """
+    Cart-wide percentage off once the subtotal reaches `min_subtotal`.
+    Only the best applicable promotion is used.
+    """
+    name = models.CharField(max_length=120)
+    min_subtotal = models.DecimalField(max_digits=10, decimal_places=2, default=0)
+    percent_off = models.DecimalField(max_digits=5, decimal_places=2)
+    active = models.BooleanField(default=True)
+    starts_at = models.DateTimeField(null=True, blank=True)
+    ends_at = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        return self.name
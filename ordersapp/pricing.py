@@ -0,0 +1,176 @@
+# ordersapp/pricing.py
+"""
+Pricing engine: prices a whole cart in one pass.
+
+Shipping tiers, category discounts and promotions are read from the DB
+once and compiled into lookup tables (sorted thresholds + dicts). The
+compiled rules are reused until a rule changes, which bumps the pricing
+version (see signals.py), and for at most PRICING_RULES_TTL seconds: with
+a per-process cache (locmem) other workers never see the bump, and rows
+changed without signals (queryset.update()) don't send one.
+"""
+import bisect
+import threading
+import time
+from decimal import Decimal, ROUND_HALF_UP
+
+from django.conf import settings
+from django.utils import timezone
+
+from productsapp.cache import get_version, bump_version
+from .models import Order, ShippingTier, CategoryDiscount, Promotion
+
+PRICING_VERSION_KEY = "pricing:version"
+
+CENT = Decimal("0.01")
+ZERO = Decimal("0.00")
+HUNDRED = Decimal("100")
+
+# Used while no ShippingTier rows exist: free from 30.00, else 4.50
+DEFAULT_SHIPPING_TIERS = ((Decimal("0.00"), Decimal("4.50")), (Decimal("30.00"), Decimal("0.00")))
+
+
+def _money(value):
+    return value.quantize(CENT, rounding=ROUND_HALF_UP)
+
+
+class QuoteLine:
+    def __init__(self, product, quantity, unit_price):
+        self.product = product
+        self.quantity = quantity
+        self.unit_price = unit_price
+        self.line_total = unit_price * quantity
+        self.discount = max(product.price - unit_price, ZERO) * quantity
+
+
+class Quote:
+    def __init__(self, lines, subtotal, line_discount, promotion, promotion_discount, shipping):
+        self.lines = lines
+        self.subtotal = subtotal
+        self.promotion = promotion
+        self.promotion_discount = promotion_discount
+        self.discount_total = line_discount + promotion_discount
+        self.shipping = shipping
+        self.total = subtotal - promotion_discount + shipping
+
+    def as_dict(self):
+        return {
+            "lines": [
+                {
+                    "product_id": line.product.id,
+                    "qty": line.quantity,
+                    "unit_price": float(line.unit_price),
+                    "line_total": float(line.line_total),
+                }
+                for line in self.lines
+            ],
+            "subtotal": float(self.subtotal),
+            "discount_total": float(self.discount_total),
+            "promotion": self.promotion.name if self.promotion else None,
+            "promotion_discount": float(self.promotion_discount),
+            "shipping": float(self.shipping),
+            "total": float(self.total),
+        }
+
+
+class PricingRules:
+    """
+    Compiled, read-only view of the pricing rule tables.
+    """
+
+    def __init__(self, tiers, category_discounts, promotions):
+        # {delivery_method or "": ([min_subtotal, ...], [cost, ...])}
+        tables = {}
+        for method, min_subtotal, cost in sorted(tiers, key=lambda t: (t[0], t[1])):
+            mins, costs = tables.setdefault(method, ([], []))
+            mins.append(min_subtotal)
+            costs.append(cost)
+        if not tables:
+            tables[""] = tuple(list(col) for col in zip(*DEFAULT_SHIPPING_TIERS))
+        self.shipping_tables = tables
+
+        # {category_id: best percent}
+        self.category_percent = {}
+        for category_id, percent in category_discounts:
+            self.category_percent[category_id] = max(percent, self.category_percent.get(category_id, ZERO))
+
+        # Best first, so the first applicable one wins
+        self.promotions = sorted(promotions, key=lambda p: p.percent_off, reverse=True)
+
+    def unit_price(self, product):
+        return self.listing_price(product.price, product.discount, product.category_id)
+
+    def listing_price(self, price, discount, category_id):
+        """
+        unit_price() from the bare columns, for listings read with values().
+        """
+        final = max(price - discount, ZERO)
+        percent = self.category_percent.get(category_id)
+        if percent:
+            final = min(final, _money(price * (HUNDRED - percent) / HUNDRED))
+        return max(final, ZERO)
+
+    def shipping(self, subtotal, delivery_method):
+        if subtotal <= 0:
+            return ZERO
+        mins, costs = self.shipping_tables.get(delivery_method) or self.shipping_tables.get("") or ([], [])
+        i = bisect.bisect_right(mins, subtotal) - 1
+        return costs[i] if i >= 0 else ZERO
+
+    def promotion(self, subtotal, now):
+        for promo in self.promotions:
+            if promo.min_subtotal > subtotal:
+                continue
+            if promo.starts_at and promo.starts_at > now:
+                continue
+            if promo.ends_at and promo.ends_at <= now:
+                continue
+            return promo
+        return None
+
+    def quote(self, lines, delivery_method=Order.DeliveryMethod.PICKUP, now=None):
+        """
+        Prices [(product, quantity), ...] in one pass.
+        """
+        quote_lines = [QuoteLine(product, qty, self.unit_price(product)) for product, qty in lines]
+        subtotal = sum((line.line_total for line in quote_lines), ZERO)
+        line_discount = sum((line.discount for line in quote_lines), ZERO)
+
+        promo = self.promotion(subtotal, now or timezone.now())
+        promo_discount = _money(subtotal * promo.percent_off / HUNDRED) if promo else ZERO
+
+        shipping = self.shipping(subtotal - promo_discount, delivery_method)
+        return Quote(quote_lines, subtotal, line_discount, promo, promo_discount, shipping)
+
+
+def compile_rules():
+    tiers = ShippingTier.objects.filter(active=True).values_list("delivery_method", "min_subtotal", "cost")
+    category_discounts = CategoryDiscount.objects.filter(active=True).values_list("category_id", "percent")
+    promotions = Promotion.objects.filter(active=True).only(
+        "name", "min_subtotal", "percent_off", "starts_at", "ends_at"
+    )
+    return PricingRules(list(tiers), list(category_discounts), list(promotions))
+
+
+_rules_lock = threading.Lock()
+_rules = (None, None, None)  # (pricing version, compiled at (monotonic), PricingRules)
+
+
+def get_rules():
+    global _rules
+
+    def fresh():
+        compiled_at = _rules[1]
+        ttl = getattr(settings, "PRICING_RULES_TTL", 60)
+        return _rules[0] == version and compiled_at is not None and time.monotonic() - compiled_at < ttl
+
+    version = get_version(PRICING_VERSION_KEY)
+    if not fresh():
+        with _rules_lock:
+            if not fresh():
+                _rules = (version, time.monotonic(), compile_rules())
+    return _rules[2]
+
+
+def invalidate_rules():
+    bump_version(PRICING_VERSION_KEY)
@@ -1,9 +1,230 @@
 # ordersapp/services.py
-from decimal import Decimal
-from django.db import transaction
+from collections import Counter
+from django.db import transaction, connection
+from django.db.models import F
 from django.core.exceptions import ValidationError
 from productsapp.models import Product
+from productsapp.bundles import expand_bundles
+from productsapp.availability import stock_changed
 from .models import Order, OrderItem
+from .pricing import get_rules
+
+
+class OutOfStock(ValidationError):
+    """
+    A reservation found less stock than it needs.
+    """
+
+
+def attach_items(order, items):
+    """
+    Primes order.items with the in-memory items, as if prefetched, so
+    callers can read them back without a query.
+    """
+    queryset = order.items.all()
+    queryset._result_cache = list(items)
+    queryset._prefetch_done = True
+    order._prefetched_objects_cache = {"items": queryset}
+
+
+def reserve_stock(quantities):
+    """
+    Atomically takes `quantities` ({product_id: qty}) out of Product.stock.
+
+    Each product gets a conditional UPDATE ... SET stock = stock - qty
+    WHERE stock >= qty, so concurrent checkouts can never push stock below
+    zero. Rows are updated in id order so two orders for the same products
+    always lock them in the same order and can't deadlock.
+
+    Must run inside a transaction: on OutOfStock (a ValidationError) the
+    caller's rollback undoes any decrements already applied.
+    """
+    for pid in sorted(quantities):
+        qty = quantities[pid]
+        updated = Product.objects.filter(id=pid, stock__gte=qty).update(stock=F("stock") - qty)
+        if not updated:
+            raise OutOfStock(f"Not enough stock for product id={pid}.")
+    stock_changed({pid: -qty for pid, qty in quantities.items()})
+
+
+def release_stock(quantities):
+    """
+    Puts `quantities` ({product_id: qty}) back into Product.stock.
+    """
+    for pid in sorted(quantities):
+        Product.objects.filter(id=pid).update(stock=F("stock") + quantities[pid])
+    stock_changed(quantities)
+
+
+def stock_quantities(lines, bundles):
+    """
+    {product_id: qty} of stock that `lines` ((product_id, qty) pairs) take.
+    Bundles take their components' stock (`bundles` is the
+    expand_bundles() result covering them).
+    """
+    quantities = Counter()
+    for pid, qty in lines:
+        if pid in bundles:
+            for component_id, per_bundle in bundles[pid].items():
+                quantities[component_id] += per_bundle * qty
+        else:
+            quantities[pid] += qty
+    return quantities
+
+
+def _bundles_of(products):
+    return expand_bundles(pid for pid, product in products.items() if product.is_bundle)
+
+
+@transaction.atomic
+def cancel_order(order_id):
+    """
+    Moves an order to CANCELLED and releases its reserved stock.
+    Cancelling an already cancelled order is a no-op.
+
+    Releases what checkout reserved, not what the order's bundles are made
+    of today: a bundle edited since would put back other products.
+    """
+    # Lock the order so two concurrent cancels can't release stock twice
+    order = Order.objects.select_for_update().get(id=order_id)
+    if order.status == Order.Status.CANCELLED:
+        return order
+
+    if order.reserved_stock:
+        # Products deleted since simply match no row
+        release_stock({int(pid): qty for pid, qty in order.reserved_stock.items()})
+    else:
+        # Placed before reservations were recorded
+        lines = list(
+            order.items.filter(product__isnull=False).values_list("product_id", "product__is_bundle", "quantity")
+        )
+        bundles = expand_bundles(pid for pid, is_bundle, _ in lines if is_bundle)
+        release_stock(stock_quantities([(pid, qty) for pid, _, qty in lines], bundles))
+
+    order.status = Order.Status.CANCELLED
+    order.save(update_fields=["status", "updated_at"])
+    return order
+
+
+def _order_lines(payload):
+    """
+    [(product_id, qty), ...] from the payload's items, leaving out lines
+    without a product or a positive quantity. Raises ValidationError on a
+    malformed payload or item.
+    """
+    if not isinstance(payload, dict):
+        raise ValidationError("Invalid order payload.")
+    items_data = payload.get("items") or []
+    if not isinstance(items_data, list):
+        raise ValidationError("Order items must be a list.")
+
+    lines = []
+    for item in items_data:
+        if not isinstance(item, dict):
+            raise ValidationError("Invalid order item.")
+        pid = item.get("product_id")
+        if not pid:
+            continue
+        try:
+            pid = int(pid)
+            qty = int(item.get("quantity") or 0)
+        except (TypeError, ValueError):
+            raise ValidationError(f"Invalid product id or quantity for product id={pid}.")
+        if qty > 0:
+            lines.append((pid, qty))
+    return lines
+
+
+def _text(payload, key):
+    value = payload.get(key) or ""
+    if not isinstance(value, str):
+        raise ValidationError(f"Invalid {key}.")
+    return value
+
+
+def _product_ids(payload):
+    # Malformed payloads are reported by prepare_order(), order by order
+    try:
+        return [pid for pid, _ in _order_lines(payload)]
+    except ValidationError:
+        return []
+
+
+def prepare_order(user, payload: dict, products: dict, bundles: dict):
+    """
+    Validates and prices `payload` against the preloaded `products`
+    ({id: Product}) and their `bundles` (expand_bundles()) without touching
+    the database.
+
+    Returns (order, items, reserved): an unsaved Order with its final
+    totals, its unsaved OrderItems, and the {product_id: qty} to reserve.
+    Raises ValidationError on invalid input.
+    """
+
+    if not isinstance(payload, dict) or not payload.get("items"):
+        raise ValidationError("No items in order.")
+
+    # Delivery method validation
+    delivery_method = payload.get("delivery_method") or Order.DeliveryMethod.PICKUP
+    valid_methods = [c[0] for c in Order.DeliveryMethod.choices]
+    if delivery_method not in valid_methods:
+        raise ValidationError("Invalid delivery method.")
+
+    # Customer data
+    customer_name = _text(payload, "customer_name").strip()
+    customer_email = _text(payload, "customer_email").strip()
+    customer_address = _text(payload, "customer_address").strip()
+    customer_phone = _text(payload, "customer_phone").strip()
+    note = _text(payload, "note")
+
+    if not customer_name or not customer_email:
+        raise ValidationError("Customer name and email are required.")
+
+    lines = []
+
+    # Iterate items (everything is priced before the Order INSERT)
+    for pid, qty in _order_lines(payload):
+        product = products.get(pid)
+        if not product:
+            raise ValidationError(f"Product with id={pid} not found.")
+
+        lines.append((product, qty))
+
+    if not lines:
+        raise ValidationError("No valid items in order.")
+
+    reserved = stock_quantities([(product.id, qty) for product, qty in lines], bundles)
+
+    # Pricing logic (backend is the truth, see ordersapp/pricing.py)
+    quote = get_rules().quote(lines, delivery_method)
+
+    # Snapshot items (attached to the order once it exists)
+    order_items = [
+        OrderItem(
+            product=line.product,
+            product_name=line.product.name,
+            unit_price=line.unit_price,
+            quantity=line.quantity,
+            line_total=line.line_total,
+        )
+        for line in quote.lines
+    ]
+
+    order = Order(
+        user=user if (user and user.is_authenticated) else None,
+        delivery_method=delivery_method,
+        customer_name=customer_name,
+        customer_email=customer_email,
+        customer_address=customer_address if delivery_method == Order.DeliveryMethod.DELIVERY else "",
+        customer_phone=customer_phone,
+        note=note,
+        subtotal=quote.subtotal,
+        discount_total=quote.discount_total,
+        shipping_total=quote.shipping,
+        total=quote.total,
+        reserved_stock={str(pid): qty for pid, qty in reserved.items()},
+    )
+    return order, order_items, reserved
 
 
 def create_order_from_payload(user, payload: dict) -> Order:
@@ -11,10 +232,11 @@ def create_order_from_payload(user, payload: dict) -> Order:
     Creates an Order + OrderItems from payload.
 
     IMPORTANT:
-    - No stock decrement.
-    - No stock mutation.
+    - Reserves stock for every line (see reserve_stock), in the same
+      transaction as the order. Bundles reserve their components. Insufficient stock raises ValidationError
+      and nothing is written.
     - No side-effects (no logs, no external calls).
-    - Only validates, computes, creates, and returns the order.
+    - Only validates, computes, reserves, creates, and returns the order.
 
     Payload example:
     {
@@ -31,114 +253,138 @@ def create_order_from_payload(user, payload: dict) -> Order:
     }
     """
 
-    items_data = payload.get("items") or []
-    if not items_data:
-        raise ValidationError("No items in order.")
+    # Load product objects in a single query
+    products = Product.objects.in_bulk(_product_ids(payload))
 
-    # Delivery method validation
-    delivery_method = payload.get("delivery_method") or Order.DeliveryMethod.PICKUP
-    valid_methods = [c[0] for c in Order.DeliveryMethod.choices]
-    if delivery_method not in valid_methods:
-        raise ValidationError("Invalid delivery method.")
+    order, order_items, reserved = prepare_order(user, payload, products, _bundles_of(products))
 
-    # Customer data
-    customer_name = (payload.get("customer_name") or "").strip()
-    customer_email = (payload.get("customer_email") or "").strip()
-    customer_address = (payload.get("customer_address") or "").strip()
-    customer_phone = (payload.get("customer_phone") or "").strip()
-    note = payload.get("note") or ""
+    @transaction.atomic
+    def _create():
+        # Take the stock (rolls back with the order on failure)
+        reserve_stock(reserved)
 
-    if not customer_name or not customer_email:
-        raise ValidationError("Customer name and email are required.")
+        # One INSERT with the final totals
+        order.save(force_insert=True)
 
-    # Load product objects in a single query
-    product_ids = [i.get("product_id") for i in items_data if i.get("product_id")]
-    products = Product.objects.in_bulk(product_ids)
+        # Save items
+        for order_item in order_items:
+            order_item.order = order
+        OrderItem.objects.bulk_create(order_items)
 
-    subtotal = Decimal("0.00")
-    discount_total = Decimal("0.00")
+        attach_items(order, order_items)
+        return order
 
-    order_items_to_create = []
+    return _create()
 
-    @transaction.atomic
-    def _create():
-        nonlocal subtotal, discount_total
-
-        # Create order with temporary zero totals
-        order = Order.objects.create(
-            user=user if (user and user.is_authenticated) else None,
-            delivery_method=delivery_method,
-            customer_name=customer_name,
-            customer_email=customer_email,
-            customer_address=customer_address if delivery_method == Order.DeliveryMethod.DELIVERY else "",
-            customer_phone=customer_phone,
-            note=note,
-            subtotal=Decimal("0.00"),
-            discount_total=Decimal("0.00"),
-            shipping_total=Decimal("0.00"),
-            total=Decimal("0.00"),
-        )
 
-        # Iterate items
-        for item in items_data:
-            pid = item.get("product_id")
-            qty = int(item.get("quantity") or 0)
+class BatchRejected(Exception):
+    pass
 
-            if not pid or qty <= 0:
-                continue
-
-            product = products.get(pid)
-            if not product:
-                raise ValidationError(f"Product with id={pid} not found.")
-
-            # Pricing logic (backend is the truth)
-            unit_price = product.discounted_price
-            original_price = product.price
-            line_total = unit_price * qty
-
-            # Accumulate totals
-            subtotal += line_total
-
-            # Track discount granted
-            discount_unit = (original_price - unit_price)
-            if discount_unit > 0:
-                discount_total += discount_unit * qty
-
-            # Snapshot item
-            order_items_to_create.append(
-                OrderItem(
-                    order=order,
-                    product=product,
-                    product_name=product.name,
-                    unit_price=unit_price,
-                    quantity=qty,
-                    line_total=line_total,
-                )
-            )
 
-        if not order_items_to_create:
-            raise ValidationError("No valid items in order.")
+def _insert_orders(prepared):
+    """
+    Bulk-inserts the prepared (order, items) pairs: one INSERT for the
+    orders where the backend returns their ids, then one for all items.
+    """
+    orders = [order for order, _ in prepared]
+    if connection.features.can_return_rows_from_bulk_insert:
+        Order.objects.bulk_create(orders)
+    else:
+        # MySQL can't hand back bulk-inserted ids, the items need them
+        for order in orders:
+            order.save(force_insert=True)
 
-        # Save items
-        OrderItem.objects.bulk_create(order_items_to_create)
+    all_items = []
+    for order, items in prepared:
+        for order_item in items:
+            order_item.order = order
+        all_items.extend(items)
+    OrderItem.objects.bulk_create(all_items)
+
+    for order, items in prepared:
+        attach_items(order, items)
 
-        # Shipping rules (match your frontend logic)
-        if subtotal == 0:
-            shipping = Decimal("0.00")
-        elif subtotal >= Decimal("30.00"):
-            shipping = Decimal("0.00")
-        else:
-            shipping = Decimal("4.50")
 
-        total = subtotal + shipping
+def create_orders_from_payloads(user, payloads: list, all_or_nothing=True) -> list:
+    """
+    Creates many orders at once (kiosk / wholesale uploads).
 
-        # Finalize totals
-        order.subtotal = subtotal
-        order.discount_total = discount_total
-        order.shipping_total = shipping
-        order.total = total
-        order.save(update_fields=["subtotal", "discount_total", "shipping_total", "total"])
+    All referenced products are loaded in one query and locked in id order,
+    stock is checked order by order against the locked rows, and the
+    accepted orders and their items are bulk-inserted.
 
-        return order
+    Returns one result per payload, in order:
+        {"index": 0, "status": "ok", "order": <Order>}
+        {"index": 1, "status": "error", "message": "..."}
+        {"index": 2, "status": "skipped", "message": "..."}
+
+    all_or_nothing=True writes nothing unless every order is valid (the
+    valid ones come back as "skipped"). With False, the valid orders are
+    committed and only the failing ones are reported.
+    """
+    results = [None] * len(payloads)
+
+    product_ids = {pid for payload in payloads for pid in _product_ids(payload)}
+    products = Product.objects.in_bulk(product_ids)
+    bundles = _bundles_of(products)
+
+    prepared = []
+    for index, payload in enumerate(payloads):
+        try:
+            prepared.append((index, *prepare_order(user, payload, products, bundles)))
+        except ValidationError as e:
+            results[index] = {"index": index, "status": "error", "message": " ".join(e.messages)}
+
+    def _skip_valid():
+        for index, *_ in prepared:
+            if results[index] is None:
+                results[index] = {
+                    "index": index,
+                    "status": "skipped",
+                    "message": "Batch rejected because another order failed.",
+                }
+        return results
+
+    if all_or_nothing and len(prepared) < len(payloads):
+        return _skip_valid()
+
+    try:
+        with transaction.atomic():
+            # Lock every product once, in id order (no deadlocks with
+            # concurrent single checkouts, which lock in id order too)
+            stock_ids = {pid for *_, reserved in prepared for pid in reserved}
+            stock = dict(
+                Product.objects.select_for_update()
+                .filter(id__in=stock_ids)
+                .order_by("id")
+                .values_list("id", "stock")
+            )
+
+            accepted = []
+            reserved_total = Counter()
+            for index, order, items, reserved in prepared:
+                short = [pid for pid, qty in reserved.items() if stock.get(pid, 0) < qty]
+                if short:
+                    results[index] = {
+                        "index": index,
+                        "status": "error",
+                        "message": f"Not enough stock for product id={short[0]}.",
+                    }
+                    if all_or_nothing:
+                        raise BatchRejected()
+                    continue
+                for pid, qty in reserved.items():
+                    stock[pid] -= qty
+                reserved_total.update(reserved)
+                accepted.append((index, order, items))
+
+            if accepted:
+                reserve_stock(reserved_total)
+                _insert_orders([(order, items) for _, order, items in accepted])
+
+            for index, order, _ in accepted:
+                results[index] = {"index": index, "status": "ok", "order": order}
+    except BatchRejected:
+        return _skip_valid()
 
-    return _create()
\ No newline at end of file
+    return results
@@ -0,0 +1,25 @@
+# ordersapp/signals.py
+from django.db import transaction
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+
+from productsapp.signals import catalog_changed
+from .models import ShippingTier, CategoryDiscount, Promotion
+from .pricing import invalidate_rules
+
+
+@receiver(post_save, sender=ShippingTier)
+@receiver(post_save, sender=CategoryDiscount)
+@receiver(post_save, sender=Promotion)
+@receiver(post_delete, sender=ShippingTier)
+@receiver(post_delete, sender=CategoryDiscount)
+@receiver(post_delete, sender=Promotion)
+def pricing_rule_changed(sender, **kwargs):
+    transaction.on_commit(invalidate_rules)
+
+
+@receiver(post_save, sender=CategoryDiscount)
+@receiver(post_delete, sender=CategoryDiscount)
+def category_discount_changed(sender, **kwargs):
+    # Listings show the category price too (productsapp/serializers.py)
+    transaction.on_commit(lambda: catalog_changed.send(sender=sender))
@@ -1,3 +1,527 @@
-from django.test import TestCase
+import json
+import random
+import threading
+import time
+from datetime import timedelta
+from decimal import Decimal
+from unittest import mock
 
-# Create your tests here.
+from django.core.cache import cache
+from django.core.exceptions import ValidationError
+from django.db import OperationalError, connection, close_old_connections, transaction
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from productsapp.models import Product
+from productsapp.pagination import encode_cursor
+from productsapp.testing import make_category
+from usersapp.models import CustomUser
+from .exports import order_export_chunks
+from .models import CategoryDiscount, IdempotencyKey, Order, OrderItem, Promotion, ShippingTier
+from .pricing import get_rules
+from .services import (
+    OutOfStock, cancel_order, create_order_from_payload, create_orders_from_payloads, reserve_stock,
+)
+
+
+def make_product(stock, price="10.00", slug="beans"):
+    return Product.objects.create(name="Beans", slug=slug, category=make_category(), price=price, stock=stock)
+
+
+def payload(product, qty):
+    return {
+        "customer_name": "Ana",
+        "customer_email": "ana@example.com",
+        "items": [{"product_id": product.id, "quantity": qty}],
+    }
+
+
+class StockReservationTests(TestCase):
+    def setUp(self):
+        self.user = CustomUser.objects.create_user("ana", password="x")
+
+    def test_checkout_decrements_stock(self):
+        product = make_product(stock=5)
+        create_order_from_payload(self.user, payload(product, 3))
+        product.refresh_from_db()
+        self.assertEqual(product.stock, 2)
+
+    def test_insufficient_stock_creates_nothing(self):
+        product = make_product(stock=2)
+        with self.assertRaises(ValidationError):
+            create_order_from_payload(self.user, payload(product, 3))
+        product.refresh_from_db()
+        self.assertEqual(product.stock, 2)
+        self.assertFalse(Order.objects.exists())
+
+    def test_conditional_update_refuses_the_second_of_two_reservations(self):
+        product = make_product(stock=5)
+        # Both checkouts saw enough stock before either reserved
+        self.assertTrue(Product.objects.get(pk=product.pk).stock >= 3)
+
+        outcomes = []
+        for _ in range(2):
+            try:
+                with transaction.atomic():
+                    reserve_stock({product.pk: 3})
+                outcomes.append("ok")
+            except OutOfStock:
+                outcomes.append("out of stock")
+        self.assertEqual(outcomes, ["ok", "out of stock"])
+        product.refresh_from_db()
+        self.assertEqual(product.stock, 2)
+
+    def test_cancel_releases_stock_once(self):
+        product = make_product(stock=5)
+        order = create_order_from_payload(self.user, payload(product, 4))
+        cancel_order(order.id)
+        cancel_order(order.id)
+        product.refresh_from_db()
+        self.assertEqual(product.stock, 5)
+        order.refresh_from_db()
+        self.assertEqual(order.status, Order.Status.CANCELLED)
+
+
+class ConcurrentCheckoutStressTests(TransactionTestCase):
+    CHECKOUTS = 50
+    STOCK = 20
+
+    def test_stock_never_goes_negative(self):
+        product = make_product(stock=self.STOCK)
+        user = CustomUser.objects.create_user("ana", password="x")
+        results = []
+        start = threading.Barrier(self.CHECKOUTS)
+
+        def checkout():
+            try:
+                start.wait()
+                while True:
+                    try:
+                        create_order_from_payload(user, payload(product, 1))
+                        results.append("ok")
+                    except ValidationError:
+                        results.append("sold out")
+                    except OperationalError:
+                        # SQLite (the test DB without a MySQL server) locks whole tables
+                        # and fails instead of waiting: retry on a fresh connection. A
+                        # lock can also hit the after-commit cache refresh of a checkout
+                        # that went through, so only the database is counted below.
+                        connection.close()
+                        time.sleep(random.uniform(0.005, 0.02))
+                        continue
+                    break
+            finally:
+                close_old_connections()
+                connection.close()
+
+        threads = [threading.Thread(target=checkout) for _ in range(self.CHECKOUTS)]
+        began = time.perf_counter()
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        elapsed = time.perf_counter() - began
+
+        product.refresh_from_db()
+        self.assertEqual(len(results), self.CHECKOUTS)
+        self.assertLessEqual(results.count("ok"), self.STOCK)
+        self.assertEqual(product.stock, 0)
+        self.assertEqual(Order.objects.count(), self.STOCK)
+        if connection.vendor != "sqlite":
+            # Throughput guard: row locks are held only for the order's transaction
+            self.assertLess(elapsed, 10)
+
+
+class CheckoutQueryCountTests(TestCase):
+    def setUp(self):
+        self.user = CustomUser.objects.create_user("ana", password="x")
+        self.products = [make_product(stock=10, slug=f"beans-{i}") for i in range(3)]
+        self.payload = {
+            "customer_name": "Ana",
+            "customer_email": "ana@example.com",
+            "items": [{"product_id": p.id, "quantity": 1} for p in self.products],
+        }
+        # Pricing rules are compiled once and cached across requests
+        get_rules()
+
+    def test_create_order_writes_once_and_never_reads_back(self):
+        # product lookup, one stock UPDATE per product, order INSERT,
+        # items bulk INSERT, and the atomic block's SAVEPOINT/RELEASE
+        with self.assertNumQueries(1 + len(self.products) + 2 + 2):
+            order = create_order_from_payload(self.user, self.payload)
+
+        with self.assertNumQueries(0):
+            items = list(order.items.all())
+        self.assertEqual(len(items), len(self.products))
+        self.assertEqual(order.subtotal, Decimal("30.00"))
+
+    def test_checkout_api_does_not_requery_items(self):
+        self.client.force_login(self.user)
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.post("/api/checkout/", self.payload, content_type="application/json")
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(len(response.json()["items"]), len(self.products))
+
+        order_sql = [q["sql"] for q in ctx.captured_queries if "ordersapp_order" in q["sql"]]
+        self.assertEqual(len(order_sql), 2)
+        self.assertTrue(all(sql.startswith("INSERT") for sql in order_sql))
+
+
+class PricingRulesTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.product = make_product(stock=10, price="20.00")
+        self.product.refresh_from_db()
+
+    def rules(self):
+        # Rule saves recompile on commit
+        return get_rules()
+
+    def test_default_and_per_method_shipping_tiers(self):
+        rules = self.rules()
+        self.assertEqual(rules.shipping(Decimal("29.99"), "delivery"), Decimal("4.50"))
+        self.assertEqual(rules.shipping(Decimal("30.00"), "delivery"), Decimal("0.00"))
+        self.assertEqual(rules.shipping(Decimal("0"), "delivery"), Decimal("0.00"))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            ShippingTier.objects.create(delivery_method="", min_subtotal="0", cost="6.00")
+            ShippingTier.objects.create(delivery_method="", min_subtotal="50", cost="2.00")
+            ShippingTier.objects.create(delivery_method="pickup", min_subtotal="0", cost="0.00")
+        rules = self.rules()
+        self.assertEqual(rules.shipping(Decimal("49.99"), "delivery"), Decimal("6.00"))
+        self.assertEqual(rules.shipping(Decimal("50.00"), "delivery"), Decimal("2.00"))
+        self.assertEqual(rules.shipping(Decimal("49.99"), "pickup"), Decimal("0.00"))
+
+    def test_lower_of_category_percent_and_own_discount(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            CategoryDiscount.objects.create(category=self.product.category, percent="10")
+        self.assertEqual(self.rules().unit_price(self.product), Decimal("18.00"))
+
+        self.product.discount = Decimal("5.00")
+        self.assertEqual(self.rules().unit_price(self.product), Decimal("15.00"))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            CategoryDiscount.objects.create(category=self.product.category, percent="50")
+        self.assertEqual(self.rules().unit_price(self.product), Decimal("10.00"))
+
+    def test_best_promotion_within_its_window(self):
+        now = timezone.now()
+        with self.captureOnCommitCallbacks(execute=True):
+            Promotion.objects.create(name="small", min_subtotal="0", percent_off="5")
+            Promotion.objects.create(name="big", min_subtotal="100", percent_off="20")
+            Promotion.objects.create(name="later", percent_off="50", starts_at=now + timedelta(days=1))
+            Promotion.objects.create(name="over", percent_off="50", ends_at=now)
+        rules = self.rules()
+
+        quote = rules.quote([(self.product, 2)], now=now)
+        self.assertEqual(quote.promotion.name, "small")
+        self.assertEqual(quote.promotion_discount, Decimal("2.00"))
+
+        quote = rules.quote([(self.product, 5)], now=now)
+        self.assertEqual(quote.promotion.name, "big")
+        self.assertEqual(quote.total, Decimal("80.00"))
+
+        self.assertEqual(rules.quote([(self.product, 5)], now=now + timedelta(days=2)).promotion.name, "later")
+
+    def test_recompiles_after_an_admin_change(self):
+        rules = self.rules()
+        self.assertIs(self.rules(), rules)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            rule = CategoryDiscount.objects.create(category=self.product.category, percent="25")
+        self.assertEqual(self.rules().unit_price(self.product), Decimal("15.00"))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            rule.delete()
+        self.assertEqual(self.rules().unit_price(self.product), Decimal("20.00"))
+
+    @override_settings(PRICING_RULES_TTL=60)
+    def test_rules_expire_without_a_version_bump(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            rule = CategoryDiscount.objects.create(category=self.product.category, percent="10")
+        self.assertEqual(self.rules().unit_price(self.product), Decimal("18.00"))
+
+        # As another worker sees it: changed, but no version bump reaches it
+        CategoryDiscount.objects.filter(pk=rule.pk).update(percent="50")
+        now = time.monotonic()
+        with mock.patch("ordersapp.pricing.time.monotonic", return_value=now + 30):
+            self.assertEqual(self.rules().unit_price(self.product), Decimal("18.00"))
+        with mock.patch("ordersapp.pricing.time.monotonic", return_value=now + 61):
+            self.assertEqual(self.rules().unit_price(self.product), Decimal("10.00"))
+
+    def test_listings_show_the_price_checkout_charges(self):
+        response = self.client.get("/api/products/")
+        self.assertEqual(response.json()["results"][0]["price"], 20.0)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            CategoryDiscount.objects.create(category=self.product.category, percent="10")
+        response = self.client.get("/api/products/")
+        self.assertEqual(response["X-Cache"], "MISS")
+        result = response.json()["results"][0]
+        self.assertEqual((result["price"], result["original_price"], result["discount"]), (18.0, 20.0, 2.0))
+
+    def test_quote_reports_bad_ids_as_missing(self):
+        body = {"items": [{"product_id": "abc", "quantity": 1}, {"product_id": str(self.product.id), "quantity": 1}]}
+        response = self.client.post("/api/quote/", body, content_type="application/json")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()["missing"], ["abc"])
+        self.assertEqual(response.json()["subtotal"], 20.0)
+
+    def test_quote_rejects_malformed_items(self):
+        for items in (5, "x", {"product_id": 1}, [1], ["x"]):
+            with self.subTest(items=items):
+                response = self.client.post("/api/quote/", {"items": items}, content_type="application/json")
+                self.assertEqual(response.status_code, 400)
+
+
+class IdempotentCheckoutTests(TestCase):
+    def setUp(self):
+        self.user = CustomUser.objects.create_user("ana", password="x")
+        self.product = make_product(stock=5)
+        self.client.force_login(self.user)
+
+    def post(self, body, key="k1"):
+        return self.client.post(
+            "/api/checkout/", json.dumps(body), content_type="application/json", headers={"idempotency-key": key}
+        )
+
+    def test_replays_the_first_response(self):
+        first = self.post(payload(self.product, 2))
+        again = self.post(payload(self.product, 2))
+        self.assertEqual(first.status_code, 201)
+        self.assertEqual(again.status_code, 201)
+        self.assertEqual(again["Idempotent-Replayed"], "true")
+        self.assertEqual(again.json(), first.json())
+        self.assertEqual(Order.objects.count(), 1)
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.stock, 3)
+
+    def test_rejects_another_payload_after_success(self):
+        self.post(payload(self.product, 2))
+        response = self.post(payload(self.product, 1))
+        self.assertEqual(response.status_code, 422)
+        self.assertEqual(Order.objects.count(), 1)
+
+    def test_retry_with_a_fixed_cart_after_a_failure(self):
+        self.assertEqual(self.post(payload(self.product, 50)).status_code, 400)
+        response = self.post(payload(self.product, 1))
+        self.assertEqual(response.status_code, 201)
+        self.assertFalse(response.has_header("Idempotent-Replayed"))
+        self.assertEqual(Order.objects.count(), 1)
+
+    def test_expired_key_starts_over(self):
+        self.post(payload(self.product, 1))
+        IdempotencyKey.objects.update(expires_at=timezone.now() - timedelta(seconds=1))
+        response = self.post(payload(self.product, 2))
+        self.assertEqual(response.status_code, 201)
+        self.assertFalse(response.has_header("Idempotent-Replayed"))
+        self.assertEqual(Order.objects.count(), 2)
+
+
+class AsyncCheckoutTests(TestCase):
+    def setUp(self):
+        self.user = CustomUser.objects.create_user("ana", password="x")
+        self.product = make_product(stock=5)
+
+    async def test_creates_and_replays_by_idempotency_key(self):
+        await self.async_client.aforce_login(self.user)
+        body = json.dumps(payload(self.product, 2))
+        first = await self.async_client.post(
+            "/api/async/checkout/", body, content_type="application/json", headers={"idempotency-key": "k1"}
+        )
+        self.assertEqual(first.status_code, 201)
+        again = await self.async_client.post(
+            "/api/async/checkout/", body, content_type="application/json", headers={"idempotency-key": "k1"}
+        )
+        self.assertEqual(again["Idempotent-Replayed"], "true")
+        self.assertEqual(again.json()["order_id"], first.json()["order_id"])
+        self.assertEqual(await Order.objects.acount(), 1)
+        await self.product.arefresh_from_db()
+        self.assertEqual(self.product.stock, 3)
+
+    async def test_login_required(self):
+        response = await self.async_client.post(
+            "/api/async/checkout/", json.dumps(payload(self.product, 1)), content_type="application/json"
+        )
+        self.assertEqual(response.status_code, 302)
+
+
+@override_settings(QUERY_BUDGET_STRICT=True)
+class OrderHistoryTests(TestCase):
+    def setUp(self):
+        self.user = CustomUser.objects.create_user("ana", password="x")
+        other = CustomUser.objects.create_user("bob", password="x")
+        product = make_product(stock=10)
+        self.orders = []
+        for i in range(7):
+            order = Order.objects.create(user=self.user, customer_name="Ana", customer_email="ana@example.com")
+            OrderItem.objects.bulk_create(
+                OrderItem(order=order, product=product, product_name="Beans", unit_price=1, line_total=1)
+                for _ in range(1 + i * 3)
+            )
+            self.orders.append(order)
+        # Same timestamp for some: id has to break the tie
+        Order.objects.filter(id__in=[o.id for o in self.orders[2:5]]).update(created_at=self.orders[2].created_at)
+        self.foreign = Order.objects.create(user=other, customer_name="Bob", customer_email="bob@example.com")
+        self.client.force_login(self.user)
+
+    def test_walks_every_order_once_newest_first(self):
+        seen, cursor, query_counts = [], "", []
+        while cursor is not None:
+            with CaptureQueriesContext(connection) as queries:
+                response = self.client.get("/api/orders/", {"page_size": 3, "cursor": cursor})
+            self.assertEqual(response.status_code, 200)
+            query_counts.append(len(queries))
+            seen += [order["id"] for order in response.json()["results"]]
+            cursor = response.json()["next"]
+
+        expected = Order.objects.filter(user=self.user).order_by("-created_at", "-id").values_list("id", flat=True)
+        self.assertEqual(seen, list(expected))
+        # Pages holding 1 to 19 items per order cost the same
+        self.assertEqual(len(set(query_counts)), 1)
+
+    def test_items_and_back_cursor(self):
+        first = self.client.get("/api/orders/", {"page_size": 2}).json()
+        self.assertEqual(len(first["results"][0]["items"]), 19)
+        second = self.client.get("/api/orders/", {"page_size": 2, "cursor": first["next"]}).json()
+        back = self.client.get("/api/orders/", {"page_size": 2, "cursor": second["prev"]}).json()
+        self.assertEqual(back["results"], first["results"])
+        self.assertEqual(self.client.get("/api/orders/", {"cursor": "nope"}).status_code, 400)
+
+    def test_tampered_cursors_are_rejected(self):
+        for key in (["notadate", 1], [{"a": 1}, 1], [self.orders[0].created_at, "x"], [None, 1]):
+            with self.subTest(key=key):
+                response = self.client.get("/api/orders/", {"cursor": encode_cursor("next", key)})
+                self.assertEqual(response.status_code, 400)
+
+    def test_detail_only_for_the_owner(self):
+        response = self.client.get(f"/api/orders/{self.orders[1].id}/")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.json()["items"]), 4)
+        self.assertEqual(self.client.get(f"/api/orders/{self.foreign.id}/").status_code, 404)
+
+
+class BatchCheckoutTests(TestCase):
+    def setUp(self):
+        self.user = CustomUser.objects.create_user("kiosk", password="x")
+        self.product = make_product(stock=5)
+        self.payloads = [payload(self.product, 2), payload(self.product, 2), payload(self.product, 2)]
+
+    def test_all_or_nothing_writes_nothing_on_failure(self):
+        results = create_orders_from_payloads(self.user, self.payloads)
+        self.assertEqual([r["status"] for r in results], ["skipped", "skipped", "error"])
+        self.assertFalse(Order.objects.exists())
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.stock, 5)
+
+    def test_partial_commits_valid_orders(self):
+        results = create_orders_from_payloads(self.user, self.payloads, all_or_nothing=False)
+        self.assertEqual([r["status"] for r in results], ["ok", "ok", "error"])
+        self.assertEqual(Order.objects.count(), 2)
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.stock, 1)
+
+    def test_malformed_orders_fail_on_their_own(self):
+        bad_quantity = payload(self.product, 1)
+        bad_quantity["items"][0]["quantity"] = "two"
+        bad_item = {**payload(self.product, 1), "items": ["beans"]}
+        bad_name = {**payload(self.product, 1), "customer_name": 7}
+        self.client.force_login(self.user)
+        response = self.client.post(
+            "/api/checkout/batch/",
+            {"mode": "partial", "orders": [bad_quantity, bad_item, bad_name, payload(self.product, 1)]},
+            content_type="application/json",
+        )
+        self.assertEqual(response.status_code, 201)
+        results = response.json()["results"]
+        self.assertEqual([r["status"] for r in results], ["error", "error", "error", "ok"])
+        self.assertIn("quantity", results[0]["message"])
+
+        response = self.client.post("/api/checkout/", bad_quantity, content_type="application/json")
+        self.assertEqual(response.status_code, 400)
+
+
+class BundleCheckoutTests(TestCase):
+    def setUp(self):
+        self.user = CustomUser.objects.create_user("ana", password="x")
+        self.mug = make_product(stock=5, slug="mug")
+        self.beans = make_product(stock=3, slug="beans")
+        self.kit = make_product(stock=0, slug="kit")
+        self.kit.items.set([self.mug, self.beans])
+
+    def test_bundles_reserve_and_release_their_components(self):
+        order = create_order_from_payload(self.user, payload(self.kit, 2))
+        self.mug.refresh_from_db()
+        self.beans.refresh_from_db()
+        self.assertEqual((self.mug.stock, self.beans.stock), (3, 1))
+
+        cancel_order(order.id)
+        self.mug.refresh_from_db()
+        self.beans.refresh_from_db()
+        self.assertEqual((self.mug.stock, self.beans.stock), (5, 3))
+
+    def test_bundle_limited_by_scarcest_component(self):
+        with self.assertRaises(ValidationError):
+            create_order_from_payload(self.user, payload(self.kit, 4))
+
+    def test_cancel_releases_what_was_reserved_after_a_bundle_edit(self):
+        order = create_order_from_payload(self.user, payload(self.kit, 1))
+        filter_ = make_product(stock=4, slug="filter")
+        self.kit.items.set([self.mug, filter_])
+
+        cancel_order(order.id)
+        self.mug.refresh_from_db()
+        self.beans.refresh_from_db()
+        filter_.refresh_from_db()
+        self.assertEqual((self.mug.stock, self.beans.stock, filter_.stock), (5, 3, 4))
+
+
+class OrderExportTests(TestCase):
+    def setUp(self):
+        self.user = CustomUser.objects.create_user("ana", password="x")
+        self.manager = CustomUser.objects.create_user("boss", password="x", role="manager")
+        self.beans = make_product(stock=100)
+        self.mug = make_product(stock=100, slug="mug")
+        self.orders = [create_order_from_payload(self.user, payload(self.beans, 1)) for _ in range(5)]
+        cancel_order(self.orders[0].id)
+
+    def test_two_queries_per_chunk(self):
+        with CaptureQueriesContext(connection) as ctx:
+            chunks = list(order_export_chunks(Order.objects.all(), chunk_size=2))
+        # 3 chunks (2, 2, 1), each: orders + their items
+        self.assertEqual([len(c) for c in chunks], [2, 2, 1])
+        self.assertEqual(len(ctx.captured_queries), 6)
+        self.assertEqual(chunks[0][0]["items"][0]["product_name"], "Beans")
+
+    def test_streams_filtered_csv_and_jsonl(self):
+        self.client.login(username="boss", password="x")
+
+        response = self.client.get("/adminmodule/orders/export/", {"format": "csv", "status": "cancelled"})
+        self.assertTrue(response.streaming)
+        lines = b"".join(response.streaming_content).decode().splitlines()
+        self.assertEqual(len(lines), 2)
+        self.assertTrue(lines[0].startswith("id,created_at,status"))
+        self.assertIn(f"{self.orders[0].id},", lines[1])
+
+        response = self.client.get("/adminmodule/orders/export/", {"format": "jsonl", "from": "2000-01-01"})
+        orders = [json.loads(line) for line in b"".join(response.streaming_content).splitlines()]
+        self.assertEqual(len(orders), 5)
+        self.assertEqual(orders[0]["items"][0]["quantity"], 1)
+
+        response = self.client.get("/adminmodule/orders/export/", {"to": "2000-01-01"})
+        self.assertEqual(len(b"".join(response.streaming_content).splitlines()), 1)
+
+    def test_managers_only(self):
+        self.client.login(username="ana", password="x")
+        response = self.client.get("/adminmodule/orders/export/")
+        self.assertEqual(response.status_code, 302)
+
+
+class OrderIndexTests(TestCase):
+    def test_history_index_replaced(self):
+        with connection.cursor() as cursor:
+            constraints = connection.introspection.get_constraints(cursor, Order._meta.db_table)
+        self.assertIn("order_user_created_id_idx", constraints)
+        self.assertEqual(constraints["order_user_created_id_idx"]["columns"], ["user_id", "created_at", "id"])
+        self.assertNotIn("order_user_created_idx", constraints)
@@ -1,3 +1,32 @@
-from django.shortcuts import render
+from django.contrib.auth.decorators import user_passes_test
+from django.http import HttpResponseBadRequest
+from adminapp.exports import EXPORT_FORMATS, date_param, stream_export
+from .exports import ORDER_COLUMNS, ORDER_CSV_COLUMNS, filter_orders, order_export_chunks, order_csv_chunks
+from .models import Order
 
-# Create your views here.
+
+def is_manager(user):
+    return user.is_authenticated and user.role == 'manager'
+
+
+@user_passes_test(is_manager, login_url="/unauthorized/")
+def order_export(request):
+    """
+    Streams orders with their items as CSV (one line per item) or JSON
+    Lines (one order per line). Filters: status (repeatable), from, to
+    (YYYY-MM-DD, inclusive).
+    """
+    fmt = request.GET.get("format", "csv")
+    if fmt not in EXPORT_FORMATS:
+        return HttpResponseBadRequest("format must be csv or jsonl.")
+    statuses = [s for s in request.GET.getlist("status") if s in Order.Status.values]
+    orders = filter_orders(
+        statuses=statuses,
+        date_from=date_param(request.GET.get("from")),
+        date_to=date_param(request.GET.get("to")),
+    )
+
+    chunks = order_export_chunks(orders)
+    if fmt == "csv":
+        return stream_export(fmt, "orders", ORDER_CSV_COLUMNS, order_csv_chunks(chunks))
+    return stream_export(fmt, "orders", ORDER_COLUMNS, chunks)
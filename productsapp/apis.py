@@ -1,28 +1,79 @@
-from django.http import JsonResponse
+from django.http import JsonResponse, HttpResponse
 from django.core.paginator import Paginator
-from django.db.models import Q
 from django.conf import settings
+from django.utils.cache import patch_cache_control
+from django.views.decorators.http import condition
 from .models import Product, Category, Rubro
+from django.db.models import Count, Q
+from .cache import get_or_build, get_taxonomy, catalog_etag, get_catalog_last_modified
+from .search import search_products, ranked_product_ids
+from .pagination import KeysetPaginator, InvalidCursor
+from .availability import available_bundle_ids
+from .serializers import FIELD_SETS, DEFAULT_FIELD_SET, project, serialize_rows, dumps
 
+SORT_OPTIONS = ("default", "price-asc", "price-desc", "name-asc")
 
-def products_api(request):
-    page = int(request.GET.get("page", 1))
-    page_size = int(request.GET.get("page_size", 40))
-    search = request.GET.get("search", "").strip()
-    rubro_slug = request.GET.get("rubro", "").strip()
-    category_slug = request.GET.get("category", "").strip()
+# Keyset orderings per sort, id last as the tiebreaker
+CURSOR_ORDERINGS = {
+    "default": ("-featured", "name", "id"),
+    "price-asc": ("price", "id"),
+    "price-desc": ("-price", "-id"),
+    "name-asc": ("name", "id"),
+}
+DEFAULT_PAGE_SIZE = 40
+MAX_PAGE_SIZE = 100
+
+
+def _int_param(value, default, maximum=None):
+    try:
+        value = int(value)
+    except (TypeError, ValueError):
+        return default
+    if value < 1:
+        return default
+    if maximum is not None:
+        value = min(value, maximum)
+    return value
+
+
+def _products_params(request):
+    """
+    Normalized query params for products_api. Equivalent requests map to
+    the same dict, which is what the response cache is keyed on.
+    """
     sort = request.GET.get("sort", "default")
+    fields = request.GET.get("fields", DEFAULT_FIELD_SET)
+    params = {
+        "search": " ".join(request.GET.get("search", "").split()).lower(),
+        "rubro": request.GET.get("rubro", "").strip(),
+        "category": request.GET.get("category", "").strip(),
+        "sort": sort if sort in SORT_OPTIONS else "default",
+        "page_size": _int_param(request.GET.get("page_size"), DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE),
+        "fields": fields if fields in FIELD_SETS else DEFAULT_FIELD_SET,
+        # Clients that load /api/products/facets/ can drop the taxonomy here
+        "taxonomy": request.GET.get("taxonomy") != "0",
+        "in_stock_only": request.GET.get("in_stock_only") in ("1", "true"),
+    }
+    # Cursor mode is opt-in: any `cursor` param (empty for the first page)
+    if "cursor" in request.GET:
+        params["cursor"] = request.GET.get("cursor", "").strip()
+        params["with_total"] = request.GET.get("with_total") == "1"
+    else:
+        params["page"] = _int_param(request.GET.get("page"), 1)
+    return params
+
+
+def _filtered_queryset(params):
+    search = params["search"]
+    rubro_slug = params["rubro"]
+    category_slug = params["category"]
 
-    # Base queryset
-    qs = Product.objects.select_related("category", "category__rubro")
+    # Base queryset, projected down to the columns the field set needs
+    qs = project(Product.objects.all(), params["fields"])
 
-    # Search
+    # Search (FULLTEXT on MySQL, see productsapp/search.py)
     if search:
-        qs = qs.filter(
-            Q(name__icontains=search)
-            | Q(short_description__icontains=search)
-            | Q(long_description__icontains=search)
-        )
+        qs = search_products(qs, search)
 
     # Rubro filter
     if rubro_slug:
@@ -32,6 +83,30 @@ def products_api(request):
     if category_slug:
         qs = qs.filter(category__slug=category_slug)
 
+    # Sellable only: plain products by stock, bundles by their components
+    if params["in_stock_only"]:
+        qs = qs.filter(Q(is_bundle=False, stock__gt=0) | Q(id__in=available_bundle_ids()))
+
+    return qs
+
+
+def _build_taxonomy():
+    # Rubros + categories (for filters)
+    rubros = list(Rubro.objects.all().values("id", "name", "slug"))
+    categories = list(Category.objects.all().values("id", "name", "slug", "rubro_id"))
+    return {"rubros": rubros, "categories": categories}
+
+
+def _taxonomy(params):
+    if not params["taxonomy"]:
+        return {}
+    return get_taxonomy(_build_taxonomy)
+
+
+def _sorted_queryset(params):
+    qs = _filtered_queryset(params)
+    sort = params["sort"]
+
     # Sorting
     if sort == "price-asc":
         qs = qs.order_by("price")
@@ -39,36 +114,148 @@ def products_api(request):
         qs = qs.order_by("-price")
     elif sort == "name-asc":
         qs = qs.order_by("name")
+    elif params["search"]:  # default sort, best matches first
+        qs = qs.order_by("-relevance", "-featured", "name")
     else:  # default sort
         qs = qs.order_by("-featured", "name")
 
-    # Pagination
-    paginator = Paginator(qs, page_size)
-    page_obj = paginator.get_page(page)
-
-    # Serialize products
-    products_data = []
-    for p in page_obj:
-        products_data.append({
-            "id": p.id,
-            "name": p.name,
-            "price": float(p.discounted_price),
-            "original_price": float(p.price),
-            "discount": float(p.discount),
-            "discount_name": p.discount_name,
-            "short_description": p.short_description,
-            "long_description": p.long_description,
-            "image": p.image.url if p.image else "",
-        })
+    return qs
 
-    # Rubros + categories (for filters)
-    rubros = list(Rubro.objects.all().values("id", "name", "slug"))
-    categories = list(Category.objects.all().values("id", "name", "slug", "rubro_id"))
 
-    return JsonResponse({
-        "results": products_data,
-        "page": page_obj.number,
-        "total_pages": paginator.num_pages,
-        "rubros": rubros,
-        "categories": categories,
-    })
+def _ranked_page(params):
+    """
+    (rows, page number, total pages) for a search in the default sort
+    when the in-process index ranks it (see search.ranked_product_ids):
+    the page is cut from the ranked ids and only its rows are read. None
+    when the search is ranked in SQL.
+    """
+    if not params["search"] or params["sort"] != "default":
+        return None
+    ids = ranked_product_ids(params["search"])
+    if ids is None:
+        return None
+    if params["rubro"] or params["category"] or params["in_stock_only"]:
+        allowed = set(_filtered_queryset({**params, "search": ""}).values_list("id", flat=True))
+        ids = [pid for pid in ids if pid in allowed]
+
+    paginator = Paginator(ids, params["page_size"])
+    page_obj = paginator.get_page(params["page"])
+    page_rows = project(Product.objects.filter(id__in=page_obj.object_list), params["fields"])
+    rows = {row["id"]: row for row in page_rows}
+    return [rows[pid] for pid in page_obj if pid in rows], page_obj.number, paginator.num_pages
+
+
+def _build_products_payload(params):
+    ranked = _ranked_page(params)
+    if ranked is not None:
+        rows, number, total_pages = ranked
+    else:
+        qs = _sorted_queryset(params)
+
+        # Pagination
+        paginator = Paginator(qs, params["page_size"])
+        page_obj = paginator.get_page(params["page"])
+        rows, number, total_pages = page_obj, page_obj.number, paginator.num_pages
+
+    return {
+        "results": serialize_rows(rows, params["fields"]),
+        "page": number,
+        "total_pages": total_pages,
+        **_taxonomy(params),
+    }
+
+
+def _build_products_cursor_payload(params):
+    """
+    Keyset pagination: no COUNT and no OFFSET. Search results keep the
+    sort's own key order here, relevance ranking is page-mode only.
+    """
+    qs = _filtered_queryset(params)
+    paginator = KeysetPaginator(qs, CURSOR_ORDERINGS[params["sort"]], params["page_size"])
+    page = paginator.page(params["cursor"])
+
+    payload = {
+        "results": serialize_rows(page, params["fields"]),
+        "next": page.next_cursor,
+        "prev": page.prev_cursor,
+        **_taxonomy(params),
+    }
+
+    if params["with_total"]:
+        # Counted once per catalog version and filter set, not per page
+        count_params = {k: params[k] for k in ("search", "rubro", "category", "in_stock_only")}
+        payload["approx_total"], _ = get_or_build("products-count", count_params, qs.count)
+
+    return payload
+
+
+def _products_etag(request, *args, **kwargs):
+    return catalog_etag("products", _products_params(request))
+
+
+def _catalog_last_modified(request, *args, **kwargs):
+    return get_catalog_last_modified()
+
+
+# Conditional GETs are answered with a 304 before the view runs any query
+@condition(etag_func=_products_etag, last_modified_func=_catalog_last_modified)
+def products_api(request):
+    params = _products_params(request)
+
+    build = _build_products_cursor_payload if "cursor" in params else _build_products_payload
+
+    # Cached (already encoded) per catalog version, see productsapp/cache.py
+    try:
+        body, hit = get_or_build("products", params, lambda: dumps(build(params)))
+    except InvalidCursor as e:
+        return JsonResponse({"status": "error", "message": str(e)}, status=400)
+
+    response = HttpResponse(body, content_type="application/json")
+    response["X-Cache"] = "HIT" if hit else "MISS"
+    # Let clients keep the body but always revalidate it
+    patch_cache_control(response, no_cache=True)
+    return response
+
+
+def _facets_params(request):
+    return {"search": " ".join(request.GET.get("search", "").split()).lower()}
+
+
+def _build_facets_payload(params):
+    qs = Product.objects.all()
+    if params["search"]:
+        qs = search_products(qs, params["search"])
+
+    category_counts = dict(
+        qs.order_by().values_list("category_id").annotate(n=Count("id"))
+    )
+
+    taxonomy = get_taxonomy(_build_taxonomy)
+    rubro_counts = {}
+    categories = []
+    for cat in taxonomy["categories"]:
+        count = category_counts.get(cat["id"], 0)
+        rubro_counts[cat["rubro_id"]] = rubro_counts.get(cat["rubro_id"], 0) + count
+        categories.append({**cat, "count": count})
+
+    rubros = [{**r, "count": rubro_counts.get(r["id"], 0)} for r in taxonomy["rubros"]]
+
+    return {"rubros": rubros, "categories": categories}
+
+
+def _facets_etag(request, *args, **kwargs):
+    return catalog_etag("facets", _facets_params(request))
+
+
+@condition(etag_func=_facets_etag, last_modified_func=_catalog_last_modified)
+def facets_api(request):
+    """
+    Rubros and categories with product counts for the current search.
+    """
+    params = _facets_params(request)
+    body, hit = get_or_build("facets", params, lambda: dumps(_build_facets_payload(params)))
+
+    response = HttpResponse(body, content_type="application/json")
+    response["X-Cache"] = "HIT" if hit else "MISS"
+    patch_cache_control(response, no_cache=True)
+    return response
@@ -4,3 +4,6 @@ from django.apps import AppConfig
 class ProductsappConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'productsapp'
+
+    def ready(self):
+        from . import signals  # noqa: F401
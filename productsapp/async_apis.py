@@ -0,0 +1,130 @@
+# productsapp/async_apis.py
+"""
+Async variant of products_api, for ASGI deployments (/api/async/products/).
+
+Same params, payload, cache entries and validators as the sync view in
+apis.py. The page rows, the count and the taxonomy are independent and
+are awaited together. Django still runs each ORM call on the request's
+one sync thread (the async ORM wraps the sync one), so they don't hit the
+database in parallel; what the async view saves is the worker thread held
+for the whole request, which under an ASGI server caps concurrency at the
+thread pool size.
+
+The ETag and Last-Modified checks read the cache, so they run off the
+event loop too instead of through @condition, which would call them
+inline.
+"""
+import asyncio
+import math
+
+from asgiref.sync import sync_to_async
+from django.http import HttpResponse, JsonResponse
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import http_date, quote_etag
+
+from .apis import (
+    CURSOR_ORDERINGS, _catalog_last_modified, _filtered_queryset, _products_etag, _products_params,
+    _ranked_page, _sorted_queryset, _taxonomy,
+)
+from .cache import aget_or_build, get_or_build
+from .pagination import InvalidCursor, KeysetPaginator
+from .serializers import dumps, serialize_rows
+
+
+async def _page_rows(qs, page, page_size):
+    offset = (page - 1) * page_size
+    return [row async for row in qs[offset:offset + page_size]]
+
+
+async def _abuild_products_payload(params):
+    ranked, taxonomy = await asyncio.gather(
+        sync_to_async(_ranked_page)(params), sync_to_async(_taxonomy)(params)
+    )
+    if ranked is not None:
+        rows, page, total_pages = ranked
+        return {
+            "results": await sync_to_async(serialize_rows)(rows, params["fields"]),
+            "page": page,
+            "total_pages": total_pages,
+            **taxonomy,
+        }
+
+    # Search and the in-stock filter may read the database to build the queryset
+    qs = await sync_to_async(_sorted_queryset)(params)
+    page_size = params["page_size"]
+    page = params["page"]
+
+    count, rows = await asyncio.gather(qs.acount(), _page_rows(qs, page, page_size))
+    # Same clamping as Paginator.get_page(): past the end gives the last page
+    total_pages = max(1, math.ceil(count / page_size))
+    if page > total_pages:
+        page = total_pages
+        rows = await _page_rows(qs, page, page_size)
+
+    return {
+        "results": await sync_to_async(serialize_rows)(rows, params["fields"]),
+        "page": page,
+        "total_pages": total_pages,
+        **taxonomy,
+    }
+
+
+async def _abuild_products_cursor_payload(params):
+    qs = await sync_to_async(_filtered_queryset)(params)
+    paginator = KeysetPaginator(qs, CURSOR_ORDERINGS[params["sort"]], params["page_size"])
+
+    pending = [paginator.apage(params["cursor"]), sync_to_async(_taxonomy)(params)]
+    if params["with_total"]:
+        count_params = {k: params[k] for k in ("search", "rubro", "category", "in_stock_only")}
+        pending.append(sync_to_async(get_or_build)("products-count", count_params, qs.count))
+    page, taxonomy, *total = await asyncio.gather(*pending)
+
+    payload = {
+        "results": await sync_to_async(serialize_rows)(page, params["fields"]),
+        "next": page.next_cursor,
+        "prev": page.prev_cursor,
+        **taxonomy,
+    }
+    if total:
+        payload["approx_total"] = total[0][0]
+    return payload
+
+
+def _validators(request):
+    """
+    (quoted ETag, Last-Modified timestamp), as @condition computes them.
+    """
+    last_modified = int(_catalog_last_modified(request).timestamp())
+    return quote_etag(_products_etag(request)), last_modified
+
+
+async def _products_response(request):
+    params = _products_params(request)
+
+    build = _abuild_products_cursor_payload if "cursor" in params else _abuild_products_payload
+
+    async def encoded():
+        return dumps(await build(params))
+
+    try:
+        body, hit = await aget_or_build("products", params, encoded)
+    except InvalidCursor as e:
+        return JsonResponse({"status": "error", "message": str(e)}, status=400)
+
+    response = HttpResponse(body, content_type="application/json")
+    response["X-Cache"] = "HIT" if hit else "MISS"
+    patch_cache_control(response, no_cache=True)
+    return response
+
+
+async def products_api_async(request):
+    etag, last_modified = await sync_to_async(_validators)(request)
+    response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+    if response is None:
+        response = await _products_response(request)
+
+    if request.method in ("GET", "HEAD"):
+        if not response.has_header("Last-Modified"):
+            response.headers["Last-Modified"] = http_date(last_modified)
+        response.headers.setdefault("ETag", etag)
+    return response
@@ -0,0 +1,148 @@
+# productsapp/availability.py
+"""
+Sellable quantities.
+
+A plain product can sell its `stock`. A bundle has no stock of its own: it
+can sell as many units as its scarcest component allows, i.e. the minimum
+of component stock // quantity per bundle (see bundles.py).
+
+get_availability() answers for any list of products with a fixed number of
+queries and caches each answer. Stock moves (checkout, cancellation) call
+stock_changed(), which drops the cached values of the touched products and
+of every bundle containing them once the transaction commits.
+
+Cached product pages only key on stock to get in_stock_only and the sold
+out state right, so stock_changed() bumps the stock version only when a
+product or bundle goes from sellable to sold out or back. Between those,
+a cached page can show an `available` count that lags behind; checkout
+checks the real stock.
+"""
+from django.db import transaction
+
+from dadsproject.caching import catalog_cache
+from .models import Product
+from .bundles import BundleItem, expand_bundles
+from .cache import get_catalog_version, bump_stock_version
+
+# Entries are dropped on every stock move; the timeout only bounds how long
+# a value computed by a transaction racing a commit can survive.
+AVAILABILITY_TIMEOUT = 60 * 5
+
+
+def _cache_keys(product_ids):
+    version = get_catalog_version()
+    return {pid: f"catalog:available:{version}:{pid}" for pid in product_ids}
+
+
+def get_availability(product_ids):
+    """
+    {product_id: sellable quantity} for the existing products among
+    `product_ids`. Misses cost the bundle expansion (usually cached) plus
+    one stock query, however many products are asked for.
+    """
+    keys = _cache_keys(set(product_ids))
+    if not keys:
+        return {}
+    cached = catalog_cache.get_many(keys.values())
+
+    result = {}
+    missing = []
+    for pid, key in keys.items():
+        if key in cached:
+            result[pid] = cached[key]
+        else:
+            missing.append(pid)
+
+    if missing:
+        bundles = expand_bundles(missing)
+        needed = set(missing)
+        for components in bundles.values():
+            needed.update(components)
+        stock = dict(Product.objects.filter(id__in=needed).order_by().values_list("id", "stock"))
+
+        fresh = {}
+        for pid in missing:
+            if pid not in stock:
+                continue  # no such product
+            if pid in bundles:
+                available = min(stock.get(cid, 0) // qty for cid, qty in bundles[pid].items())
+            else:
+                available = stock[pid]
+            result[pid] = available
+            fresh[keys[pid]] = available
+        catalog_cache.set_many(fresh, AVAILABILITY_TIMEOUT)
+
+    return result
+
+
+def available_bundle_ids():
+    """
+    Ids of the bundles that can sell at least one unit.
+    """
+    bundle_ids = Product.objects.filter(is_bundle=True).values_list("id", flat=True)
+    return [pid for pid, available in get_availability(bundle_ids).items() if available > 0]
+
+
+def _containing_bundles(product_ids):
+    """
+    Every bundle that contains any of `product_ids`, directly or nested.
+    One query per nesting level.
+    """
+    found = set()
+    frontier = set(product_ids)
+    while frontier:
+        parents = set(
+            BundleItem.objects.filter(to_product_id__in=frontier).values_list("from_product_id", flat=True)
+        )
+        frontier = parents - found
+        found |= parents
+    return found
+
+
+def invalidate_availability(product_ids):
+    product_ids = set(product_ids)
+    product_ids |= _containing_bundles(product_ids)
+    catalog_cache.delete_many(_cache_keys(product_ids).values())
+
+
+def _crossed_zero(changes, bundle_ids):
+    """
+    Whether applying `changes` ({product_id: stock delta}) moved any of the
+    products, or of the `bundle_ids` containing them, between sellable and
+    sold out. Compares the committed stock with the stock minus the deltas.
+    """
+    bundles = expand_bundles(bundle_ids)
+    needed = set(changes)
+    for components in bundles.values():
+        needed.update(components)
+    after = dict(Product.objects.filter(id__in=needed).order_by().values_list("id", "stock"))
+    before = {pid: stock - changes.get(pid, 0) for pid, stock in after.items()}
+
+    for pid in changes:
+        if pid in after and (after[pid] > 0) != (before[pid] > 0):
+            return True
+    for components in bundles.values():
+        sellable = [
+            min(stock.get(cid, 0) // qty for cid, qty in components.items()) > 0
+            for stock in (before, after)
+        ]
+        if sellable[0] != sellable[1]:
+            return True
+    return False
+
+
+def stock_changed(changes):
+    """
+    Call after changing Product.stock outside model saves (saves bump the
+    catalog version, which already refreshes everything). `changes` is
+    {product_id: stock delta}, negative for reservations.
+    """
+    changes = dict(changes)
+
+    def _refresh():
+        bundle_ids = _containing_bundles(changes)
+        catalog_cache.delete_many(_cache_keys(set(changes) | bundle_ids).values())
+        if _crossed_zero(changes, bundle_ids):
+            bump_stock_version()
+
+    transaction.on_commit(_refresh)
@@ -0,0 +1,136 @@
+# productsapp/bundles.py
+"""
+Bundle expansion.
+
+A bundle is a Product whose `items` M2M lists other products, which may be
+bundles themselves. expand_bundles() flattens any number of bundles into
+their leaf components with one query per nesting level (not per product)
+and caches each flattened result until the next catalog write.
+
+The `items` through table has no quantity column, so a component counts
+once per path that reaches it: a bundle holding two bundles that both
+contain "Mug" needs two mugs.
+"""
+from collections import Counter
+
+from django.db.models import Exists, OuterRef
+
+from dadsproject.caching import catalog_cache
+from .models import Product
+from .cache import get_catalog_version, RESPONSE_TIMEOUT
+
+BundleItem = Product.items.through
+
+
+class BundleCycleError(ValueError):
+    pass
+
+
+def _cache_key(product_id):
+    return f"catalog:bundle:{get_catalog_version()}:{product_id}"
+
+
+def load_edges(product_ids):
+    """
+    {product_id: [item ids]} for `product_ids` and every product reachable
+    from them, one query per nesting level.
+    """
+    edges = {}
+    frontier = set(product_ids)
+    while frontier:
+        level = {pid: [] for pid in frontier}
+        rows = BundleItem.objects.filter(from_product_id__in=frontier).values_list(
+            "from_product_id", "to_product_id"
+        )
+        for bundle_id, item_id in rows:
+            level[bundle_id].append(item_id)
+        edges.update(level)
+        frontier = {i for items in level.values() for i in items} - edges.keys()
+    return edges
+
+
+def _flatten(product_id, edges, memo, path):
+    if product_id in memo:
+        return memo[product_id]
+    if product_id in path:
+        raise BundleCycleError(f"Bundle cycle through product id={product_id}.")
+
+    items = edges.get(product_id) or []
+    if not items:
+        return None  # not a bundle
+
+    path.add(product_id)
+    components = Counter()
+    for item_id in items:
+        nested = _flatten(item_id, edges, memo, path)
+        if nested is None:
+            components[item_id] += 1
+        else:
+            components.update(nested)
+    path.discard(product_id)
+
+    memo[product_id] = components
+    return components
+
+
+def expand_bundles(product_ids):
+    """
+    {bundle_id: {component_id: quantity}} for the bundles among
+    `product_ids`; plain products are left out. Components are always
+    plain products (nested bundles are expanded).
+
+    Raises BundleCycleError if the data contains a cycle (ProductForm
+    rejects them, so that means the rows were written some other way).
+    """
+    product_ids = set(product_ids)
+    if not product_ids:
+        return {}
+
+    keys = {pid: _cache_key(pid) for pid in product_ids}
+    cached = catalog_cache.get_many(keys.values())
+
+    result = {}
+    missing = []
+    for pid, key in keys.items():
+        if key in cached:
+            # Plain products are cached as {} so they aren't looked up again
+            if cached[key]:
+                result[pid] = cached[key]
+        else:
+            missing.append(pid)
+
+    if missing:
+        edges = load_edges(missing)
+        memo = {}
+        fresh = {}
+        for pid in missing:
+            components = _flatten(pid, edges, memo, set())
+            fresh[keys[pid]] = dict(components) if components else {}
+            if components:
+                result[pid] = dict(components)
+        catalog_cache.set_many(fresh, RESPONSE_TIMEOUT)
+
+    return result
+
+
+def would_create_cycle(bundle_id, item_ids):
+    """
+    True if making `item_ids` the items of `bundle_id` would let the bundle
+    contain itself, directly or through nested bundles.
+    """
+    if bundle_id is None:
+        return False  # a product that doesn't exist yet can't be an item
+    item_ids = set(item_ids)
+    if bundle_id in item_ids:
+        return True
+    return bundle_id in load_edges(item_ids)
+
+
+def sync_is_bundle(product_ids):
+    """
+    Recomputes Product.is_bundle for `product_ids` in one UPDATE.
+    """
+    if not product_ids:
+        return
+    has_items = BundleItem.objects.filter(from_product_id=OuterRef("pk"))
+    Product.objects.filter(id__in=product_ids).update(is_bundle=Exists(has_items))
@@ -0,0 +1,189 @@
+# productsapp/cache.py
+"""
+Versioned response cache for the catalog APIs.
+
+Every cache key embeds the current catalog "version". The version is bumped
+(see signals.py) whenever a Product, Category or Rubro is written, so cached
+pages go stale immediately and no TTL has to be guessed.
+
+Stock has its own version, bumped after a committed reservation or release
+sells a product out or brings it back (see availability.py). Only the
+namespaces whose payloads show stock key on it, so checkouts don't flush
+the rest of the catalog cache.
+"""
+import hashlib
+import time
+
+from django.utils import timezone
+
+from dadsproject.caching import catalog_cache
+
+CATALOG_VERSION_KEY = "catalog:version"
+CATALOG_MODIFIED_KEY = "catalog:modified"
+# Only bumped by Category/Rubro writes, so the taxonomy outlives product edits
+TAXONOMY_VERSION_KEY = "catalog:taxonomy-version"
+STOCK_VERSION_KEY = "catalog:stock-version"
+
+# Namespaces whose payloads depend on stock
+STOCK_NAMESPACES = {"products", "products-count"}
+
+# Entries are invalidated by version, the timeout only bounds garbage.
+RESPONSE_TIMEOUT = 60 * 60 * 24
+
+
+def get_version(key):
+    """
+    Current value of a version counter, seeded on first use.
+    """
+    version = catalog_cache.get(key)
+    if version is None:
+        # Seed from the clock so a version lost to eviction or a restart
+        # never collides with one handed out before.
+        seed = time.time_ns()
+        catalog_cache.add(key, seed, None)
+        version = catalog_cache.get(key, seed)
+    return version
+
+
+def bump_version(key):
+    try:
+        return catalog_cache.incr(key)
+    except ValueError:
+        # Key missing: a fresh seed is already newer than anything cached
+        return get_version(key)
+
+
+def get_catalog_version():
+    return get_version(CATALOG_VERSION_KEY)
+
+
+def bump_catalog_version():
+    catalog_cache.set(CATALOG_MODIFIED_KEY, timezone.now(), None)
+    return bump_version(CATALOG_VERSION_KEY)
+
+
+def get_taxonomy_version():
+    return get_version(TAXONOMY_VERSION_KEY)
+
+
+def bump_taxonomy_version():
+    return bump_version(TAXONOMY_VERSION_KEY)
+
+
+def get_stock_version():
+    return get_version(STOCK_VERSION_KEY)
+
+
+def bump_stock_version():
+    catalog_cache.set(CATALOG_MODIFIED_KEY, timezone.now(), None)
+    return bump_version(STOCK_VERSION_KEY)
+
+
+def _namespace_version(namespace):
+    if namespace in STOCK_NAMESPACES:
+        return f"{get_catalog_version()}.{get_stock_version()}"
+    return get_catalog_version()
+
+
+def get_catalog_last_modified():
+    """
+    Time of the last catalog write. Unknown (e.g. after a restart) counts
+    as "now", which only costs clients one full response.
+    """
+    modified = catalog_cache.get(CATALOG_MODIFIED_KEY)
+    if modified is None:
+        now = timezone.now().replace(microsecond=0)
+        catalog_cache.add(CATALOG_MODIFIED_KEY, now, None)
+        modified = catalog_cache.get(CATALOG_MODIFIED_KEY, now)
+    return modified
+
+
+def _stats_key(namespace, name):
+    return f"catalog:stats:{namespace}:{name}"
+
+
+def _count(key):
+    if not catalog_cache.add(key, 1, None):
+        try:
+            catalog_cache.incr(key)
+        except ValueError:
+            catalog_cache.set(key, 1, None)
+
+
+async def _acount(key):
+    if not await catalog_cache.aadd(key, 1, None):
+        try:
+            await catalog_cache.aincr(key)
+        except ValueError:
+            await catalog_cache.aset(key, 1, None)
+
+
+def params_digest(params):
+    raw = "&".join(f"{k}={params[k]}" for k in sorted(params))
+    return hashlib.sha1(raw.encode("utf-8")).hexdigest()
+
+
+def response_cache_key(namespace, params):
+    """
+    Builds the cache key for a normalized params dict.
+    """
+    return f"catalog:{namespace}:{_namespace_version(namespace)}:{params_digest(params)}"
+
+
+def catalog_etag(namespace, params):
+    """
+    Strong validator for a response: changes with the catalog version and
+    with the (normalized) query.
+    """
+    raw = f"{namespace}:{_namespace_version(namespace)}:{params_digest(params)}"
+    return hashlib.sha1(raw.encode("utf-8")).hexdigest()
+
+
+def get_or_build(namespace, params, build):
+    """
+    Returns (payload, hit). `build` is only called on a miss.
+    """
+    key = response_cache_key(namespace, params)
+    payload = catalog_cache.get(key)
+    if payload is not None:
+        _count(_stats_key(namespace, "hits"))
+        return payload, True
+
+    _count(_stats_key(namespace, "misses"))
+    payload = build()
+    catalog_cache.set(key, payload, RESPONSE_TIMEOUT)
+    return payload, False
+
+
+async def aget_or_build(namespace, params, build):
+    """
+    get_or_build() for async views, `build` being a coroutine function.
+    """
+    key = response_cache_key(namespace, params)
+    payload = await catalog_cache.aget(key)
+    if payload is not None:
+        await _acount(_stats_key(namespace, "hits"))
+        return payload, True
+
+    await _acount(_stats_key(namespace, "misses"))
+    payload = await build()
+    await catalog_cache.aset(key, payload, RESPONSE_TIMEOUT)
+    return payload, False
+
+
+def cache_stats(namespace):
+    hits = catalog_cache.get(_stats_key(namespace, "hits"), 0)
+    misses = catalog_cache.get(_stats_key(namespace, "misses"), 0)
+    return {"hits": hits, "misses": misses}
+
+
+def get_taxonomy(build):
+    """
+    Rubros + categories, cached until the next Category/Rubro write.
+    """
+    key = f"catalog:taxonomy:{get_taxonomy_version()}"
+    taxonomy = catalog_cache.get(key)
+    if taxonomy is None:
+        taxonomy = build()
+        catalog_cache.set(key, taxonomy, RESPONSE_TIMEOUT)
+    return taxonomy
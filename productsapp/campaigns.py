@@ -0,0 +1,211 @@
+# productsapp/campaigns.py
+"""
+Bulk discounts (DiscountCampaign).
+
+Applying a campaign walks the products in its scope in id batches. Per
+batch: one SELECT of ids, one INSERT ... SELECT copying the current
+discounts into CampaignProduct rows, one UPDATE setting the new discount
+in SQL and one recording it on the CampaignProduct rows. Reverting
+restores the remembered values with one UPDATE per batch. Neither goes through Product.save(), so the catalog
+caches are refreshed with a single catalog_changed at the end.
+
+Each batch commits on its own. A run that dies halfway can simply be run
+again: products that already have a CampaignProduct row are skipped.
+
+Scheduled campaigns start and end when run_due_campaigns() runs
+(`manage.py run_discount_campaigns`, e.g. from cron every few minutes).
+"""
+from decimal import Decimal
+
+from django.db import connection, transaction
+from django.db.models import DecimalField, Exists, F, OuterRef, Q, Subquery, Value
+from django.db.models.constants import OnConflict
+from django.db.models.functions import Least, Round
+from django.utils import timezone
+
+from .models import CampaignProduct, DiscountCampaign, Product
+from .signals import catalog_changed
+
+BATCH_SIZE = 1000
+
+_MONEY = DecimalField(max_digits=8, decimal_places=2)
+
+
+def campaign_products(campaign):
+    """
+    The products a campaign covers (the whole catalog if it has no scope).
+    """
+    scope = Q()
+    category_ids = campaign.categories.values("id")
+    rubro_ids = campaign.rubros.values("id")
+    product_ids = campaign.products.values("id")
+    if category_ids.exists():
+        scope |= Q(category_id__in=category_ids)
+    if rubro_ids.exists():
+        scope |= Q(category__rubro_id__in=rubro_ids)
+    if product_ids.exists():
+        scope |= Q(id__in=product_ids)
+    return Product.objects.filter(scope)
+
+
+def discount_expression(campaign):
+    """
+    The new Product.discount, computed from each row's own price.
+    """
+    if campaign.kind == DiscountCampaign.Kind.PERCENT:
+        # The rate as one literal: price * value / 100 is integer division on SQLite for whole prices
+        rate = Value(campaign.value / Decimal("100"), output_field=DecimalField(max_digits=7, decimal_places=4))
+        return Round(F("price") * rate, 2, output_field=_MONEY)
+    # Never more than the price
+    return Least(F("price"), Value(campaign.value, output_field=_MONEY), output_field=_MONEY)
+
+
+def _id_batches(queryset, batch_size):
+    last_id = 0
+    while True:
+        rows = list(queryset.filter(id__gt=last_id).order_by("id")[:batch_size])
+        if not rows:
+            return
+        yield rows
+        last_id = rows[-1][0]
+
+
+def _remember_discounts(campaign, ids):
+    """
+    INSERT ... SELECT of the products' current discounts into
+    CampaignProduct. bulk_create() would build a model instance per row;
+    this way the rows never leave the database. Products a concurrent run
+    took in the meantime are skipped by the unique product_id.
+    """
+    quote = connection.ops.quote_name
+    entry, product = CampaignProduct._meta, Product._meta
+    columns = ["campaign", "product", "previous_discount", "previous_discount_name"]
+    sql = (
+        "{insert} {table} ({columns}) SELECT %s, {id}, {discount}, {name} "
+        "FROM {source} WHERE {id} IN ({ids}) {suffix}"
+    ).format(
+        insert=connection.ops.insert_statement(on_conflict=OnConflict.IGNORE),
+        table=quote(entry.db_table),
+        columns=", ".join(quote(entry.get_field(c).column) for c in columns),
+        id=quote(product.pk.column),
+        discount=quote(product.get_field("discount").column),
+        name=quote(product.get_field("discount_name").column),
+        source=quote(product.db_table),
+        ids=", ".join(["%s"] * len(ids)),
+        suffix=connection.ops.on_conflict_suffix_sql([], OnConflict.IGNORE, [], []),
+    )
+    with connection.cursor() as cursor:
+        cursor.execute(sql, [campaign.pk, *ids])
+
+
+def apply_campaign(campaign, batch_size=BATCH_SIZE):
+    """
+    Sets the campaign's discount on every product in its scope that isn't
+    in another active campaign. Returns the number of products changed.
+    Doesn't send catalog_changed, see run_due_campaigns().
+    """
+    campaign.refresh_from_db(fields=["status"])
+    if campaign.status == DiscountCampaign.Status.ENDED:
+        return 0
+    # Marked first, so revert_campaign() also undoes a half-applied run
+    DiscountCampaign.objects.filter(pk=campaign.pk).update(status=DiscountCampaign.Status.ACTIVE)
+
+    products = campaign_products(campaign).filter(campaign_entry__isnull=True)
+    discount = discount_expression(campaign)
+    changed = 0
+    for rows in _id_batches(products.values_list("id"), batch_size):
+        ids = [row[0] for row in rows]
+        with transaction.atomic():
+            _remember_discounts(campaign, ids)
+            # Only the rows this run took (a subquery on another table, fine for MySQL)
+            taken = CampaignProduct.objects.filter(campaign=campaign, product_id__in=ids)
+            changed += Product.objects.filter(id__in=taken.values("product_id")).update(
+                discount=discount, discount_name=campaign.name
+            )
+            applied = Product.objects.filter(pk=OuterRef("product_id")).values("discount")[:1]
+            taken.update(applied_discount=Subquery(applied))
+
+    DiscountCampaign.objects.filter(pk=campaign.pk).update(applied_count=F("applied_count") + changed)
+    return changed
+
+
+def revert_campaign(campaign, batch_size=BATCH_SIZE):
+    """
+    Ends a campaign, putting back the discounts its products had before.
+    Products whose discount or discount name was changed since (edited by
+    hand) keep their current discount. Returns the number of products
+    restored. Doesn't send catalog_changed, see run_due_campaigns().
+    """
+    DiscountCampaign.objects.filter(pk=campaign.pk).update(status=DiscountCampaign.Status.ENDED)
+
+    entries = CampaignProduct.objects.filter(campaign=campaign)
+    previous = CampaignProduct.objects.filter(product_id=OuterRef("pk"))
+    untouched = previous.filter(Q(applied_discount=OuterRef("discount")) | Q(applied_discount__isnull=True))
+    restored = 0
+    for rows in _id_batches(entries.values_list("id", "product_id"), batch_size):
+        with transaction.atomic():
+            restored += Product.objects.filter(
+                Exists(untouched), id__in=[row[1] for row in rows], discount_name=campaign.name
+            ).update(
+                discount=Subquery(previous.values("previous_discount")[:1]),
+                discount_name=Subquery(previous.values("previous_discount_name")[:1]),
+            )
+            CampaignProduct.objects.filter(id__in=[row[0] for row in rows]).delete()
+    return restored
+
+
+def run_due_campaigns(now=None, batch_size=BATCH_SIZE):
+    """
+    Starts scheduled campaigns whose time has come and ends expired ones,
+    then sends catalog_changed once if any product changed. Returns
+    (started campaigns, ended campaigns, products changed).
+    """
+    now = now or timezone.now()
+    not_over = Q(ends_at__isnull=True) | Q(ends_at__gt=now)
+    to_end = DiscountCampaign.objects.filter(status=DiscountCampaign.Status.ACTIVE, ends_at__lte=now)
+    to_start = DiscountCampaign.objects.filter(not_over, status=DiscountCampaign.Status.SCHEDULED, starts_at__lte=now)
+
+    changed = 0
+    ended = list(to_end)
+    for campaign in ended:
+        changed += revert_campaign(campaign, batch_size)
+    # Scheduled but already over: nothing to apply
+    DiscountCampaign.objects.filter(status=DiscountCampaign.Status.SCHEDULED, ends_at__lte=now).update(
+        status=DiscountCampaign.Status.ENDED
+    )
+    started = list(to_start.order_by("starts_at", "id"))
+    for campaign in started:
+        changed += apply_campaign(campaign, batch_size)
+
+    _notify(changed)
+    return len(started), len(ended), changed
+
+
+def start_now(campaign):
+    """
+    Applies a scheduled campaign right away. Returns the products changed.
+    """
+    DiscountCampaign.objects.filter(pk=campaign.pk, status=DiscountCampaign.Status.SCHEDULED).update(
+        starts_at=timezone.now()
+    )
+    changed = apply_campaign(campaign)
+    _notify(changed)
+    return changed
+
+
+def end_now(campaign):
+    """
+    Ends a campaign right away, restoring the previous discounts. Returns
+    the products restored.
+    """
+    now = timezone.now()
+    DiscountCampaign.objects.filter(Q(ends_at__isnull=True) | Q(ends_at__gt=now), pk=campaign.pk).update(ends_at=now)
+    changed = revert_campaign(campaign)
+    _notify(changed)
+    return changed
+
+
+def _notify(changed):
+    # One event for the whole run, after it's committed
+    if changed:
+        transaction.on_commit(lambda: catalog_changed.send(sender=Product))
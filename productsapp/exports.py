@@ -0,0 +1,53 @@
+# productsapp/exports.py
+"""
+Catalog export. The columns are the importer's (plus id), so an exported
+CSV can be edited and imported back.
+"""
+from adminapp.exports import CHUNK_SIZE, iter_chunks
+
+from .bundles import BundleItem
+from .importer import COLUMNS
+
+PRODUCT_EXPORT_COLUMNS = ("id",) + COLUMNS
+
+_VALUES = (
+    "id", "slug", "name", "category__slug", "category__rubro__slug", "price", "discount", "discount_name",
+    "featured", "short_description", "long_description", "stock", "is_bundle",
+)
+
+
+def product_export_chunks(queryset, chunk_size=CHUNK_SIZE):
+    """
+    Yields lists of export dicts for `queryset`: one query per chunk, plus
+    one for the items of the chunk's bundles.
+    """
+    for rows in iter_chunks(queryset.values(*_VALUES), chunk_size):
+        items = {}
+        bundle_ids = [row["id"] for row in rows if row["is_bundle"]]
+        if bundle_ids:
+            edges = (
+                BundleItem.objects.filter(from_product_id__in=bundle_ids)
+                .order_by("from_product_id", "to_product__slug")
+                .values_list("from_product_id", "to_product__slug")
+            )
+            for bundle_id, slug in edges:
+                items.setdefault(bundle_id, []).append(slug)
+
+        yield [
+            {
+                "id": row["id"],
+                "slug": row["slug"],
+                "name": row["name"],
+                "category": row["category__slug"],
+                "rubro": row["category__rubro__slug"],
+                "price": row["price"],
+                "discount": row["discount"],
+                "discount_name": row["discount_name"],
+                "featured": row["featured"],
+                "short_description": row["short_description"],
+                "long_description": row["long_description"],
+                "stock": row["stock"],
+                "items": items.get(row["id"], []),
+            }
+            for row in rows
+        ]
@@ -1,5 +1,8 @@
+import re
+
 from django import forms
-from .models import Product, Category, Rubro
+from .models import Product, Category, Rubro, DiscountCampaign
+from .bundles import would_create_cycle
 
 class ProductForm(forms.ModelForm):
     class Meta:
@@ -76,4 +79,53 @@ class ProductForm(forms.ModelForm):
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
         for field in self.fields.values():
-            field.widget.attrs.update({"class": "form-control"})
\ No newline at end of file
+            field.widget.attrs.update({"class": "form-control"})
+
+    def clean_items(self):
+        items = self.cleaned_data["items"]
+        if would_create_cycle(self.instance.pk, [p.pk for p in items]):
+            raise forms.ValidationError("A bundle can't contain itself, directly or through another bundle.")
+        return items
+
+class DiscountCampaignForm(forms.ModelForm):
+    # Slugs rather than a <select> of the whole catalog
+    product_slugs = forms.CharField(
+        label="Products",
+        required=False,
+        widget=forms.Textarea(attrs={"rows": 3}),
+        help_text="Product slugs, separated by spaces, commas or new lines.",
+    )
+
+    class Meta:
+        model = DiscountCampaign
+        fields = ["name", "kind", "value", "categories", "rubros", "product_slugs", "starts_at", "ends_at"]
+        labels = {
+            "name": "Name (shown as the products' discount name)",
+            "value": "Discount (% or amount)",
+        }
+        help_texts = {
+            "categories": "Leave categories, rubros and products empty for a storewide discount.",
+        }
+        widgets = {
+            "starts_at": forms.DateTimeInput(attrs={"type": "datetime-local"}, format="%Y-%m-%dT%H:%M"),
+            "ends_at": forms.DateTimeInput(attrs={"type": "datetime-local"}, format="%Y-%m-%dT%H:%M"),
+        }
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        for field in self.fields.values():
+            field.widget.attrs.update({"class": "form-control"})
+
+    def clean_product_slugs(self):
+        slugs = {s for s in re.split(r"[\s,]+", self.cleaned_data["product_slugs"]) if s}
+        found = dict(Product.objects.filter(slug__in=slugs).values_list("slug", "id"))
+        unknown = sorted(slugs - set(found))
+        if unknown:
+            raise forms.ValidationError(f"Unknown product slug(s): {', '.join(unknown[:20])}.")
+        return list(found.values())
+
+    def save(self, commit=True):
+        campaign = super().save(commit=commit)
+        if commit:
+            campaign.products.set(self.cleaned_data["product_slugs"])
+        return campaign
@@ -0,0 +1,188 @@
+# productsapp/images.py
+"""
+Product image derivatives.
+
+Every uploaded Product.image gets resized copies (DERIVATIVE_WIDTHS, never
+upscaled) in JPEG and WebP, stored under products/derivatives/ and listed
+in Product.image_derivatives. Like the images, they are content-addressed
+and shared by products whose images resize to the same bytes (see
+storage.py). The catalog API turns that into srcsets so
+grid cards stop downloading the full-size upload.
+
+Saves only schedule the work: it runs after commit on a small thread pool
+(Pillow releases the GIL while resizing and encoding). Jobs still queued
+when the process exits are lost; `manage.py backfill_image_derivatives`
+picks up anything missing or stale. IMAGE_DERIVATIVE_WORKERS = 0 runs the
+work inline in the committing thread instead (tests).
+"""
+import logging
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.db import connection, transaction
+from django.db.models import Q
+from PIL import Image, ImageOps
+
+from .models import Product
+from .storage import release_derivatives, release_image
+
+logger = logging.getLogger(__name__)
+
+DERIVATIVE_WIDTHS = (160, 400, 800)
+DERIVATIVES_DIR = "products/derivatives/"
+
+# Format key -> (Pillow format, extension, save options)
+FORMATS = {
+    "webp": ("WEBP", "webp", {"quality": 80, "method": 4}),
+    "jpeg": ("JPEG", "jpg", {"quality": 85, "optimize": True, "progressive": True}),
+}
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def _storage():
+    return Product._meta.get_field("image").storage
+
+
+def _flatten(image):
+    """
+    RGB copy for JPEG, with transparency composited onto white.
+    """
+    if image.mode in ("RGBA", "LA") or (image.mode == "P" and "transparency" in image.info):
+        image = image.convert("RGBA")
+        background = Image.new("RGB", image.size, (255, 255, 255))
+        background.paste(image, mask=image.getchannel("A"))
+        return background
+    return image.convert("RGB")
+
+
+def _encode(image, key):
+    fmt, _, options = FORMATS[key]
+    if fmt == "JPEG":
+        image = _flatten(image)
+    elif image.mode not in ("RGB", "RGBA"):
+        image = image.convert("RGBA")
+    buffer = BytesIO()
+    image.save(buffer, fmt, **options)
+    return buffer.getvalue()
+
+
+def derivative_names(derivatives):
+    """
+    Every stored file listed in an image_derivatives dict.
+    """
+    return [name for key in FORMATS for name in (derivatives or {}).get(key, {}).values()]
+
+
+def generate_derivatives(product_id, force=False):
+    """
+    Writes the derivatives of a product's current image and records them.
+    Returns True if image_derivatives changed.
+
+    Up to date derivatives (same source image) are kept unless `force`.
+    """
+    row = Product.objects.filter(pk=product_id).values("image", "image_derivatives").first()
+    if row is None:
+        return False
+    source, old = row["image"], row["image_derivatives"] or {}
+
+    if not source:
+        if not old:
+            return False
+        # The files themselves are collected with the old image (signals.py)
+        Product.objects.filter(Q(image="") | Q(image__isnull=True), pk=product_id).update(image_derivatives={})
+        return True
+
+    if old.get("source") == source and not force:
+        return False
+
+    storage = _storage()
+    with storage.open(source, "rb") as f:
+        original = Image.open(f)
+        original.load()
+    original = ImageOps.exif_transpose(original)
+
+    stem = os.path.splitext(os.path.basename(source))[0]
+    derivatives = {"source": source, **{key: {} for key in FORMATS}}
+    for width in DERIVATIVE_WIDTHS:
+        width = min(width, original.width)
+        height = max(1, round(original.height * width / original.width))
+        resized = original.resize((width, height), Image.LANCZOS)
+        for key, (_, ext, _) in FORMATS.items():
+            name = storage.save(f"{DERIVATIVES_DIR}{stem}-{width}w.{ext}", ContentFile(_encode(resized, key)))
+            derivatives[key][str(width)] = name
+        if width == original.width:
+            break
+
+    # Only record them if the image wasn't replaced while we worked
+    updated = Product.objects.filter(pk=product_id, image=source).update(image_derivatives=derivatives)
+    if not updated:
+        release_image(source, derivatives)
+    elif old.get("source") == source:
+        # Regenerated: drop older copies no other product is using
+        release_derivatives(set(derivative_names(old)) - set(derivative_names(derivatives)), product_id)
+    # Derivatives of a previous image go with it (signals.py)
+    return bool(updated)
+
+
+def _process(product_id):
+    # signals.py imports this module
+    from .signals import catalog_changed
+
+    try:
+        if generate_derivatives(product_id):
+            catalog_changed.send(sender=Product)
+    except Exception:
+        logger.exception("Could not generate image derivatives for product id=%s", product_id)
+
+
+def _process_in_pool(product_id):
+    try:
+        _process(product_id)
+    finally:
+        # Pool threads keep their own connection otherwise
+        connection.close()
+
+
+def _workers():
+    return getattr(settings, "IMAGE_DERIVATIVE_WORKERS", 2)
+
+
+def _get_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=_workers(), thread_name_prefix="image-derivatives")
+        return _executor
+
+
+def schedule_derivatives(product_id):
+    """
+    Queues generate_derivatives(product_id) for after the current commit,
+    or runs it then when IMAGE_DERIVATIVE_WORKERS is 0.
+    """
+    if _workers() == 0:
+        transaction.on_commit(lambda: _process(product_id))
+    else:
+        transaction.on_commit(lambda: _get_executor().submit(_process_in_pool, product_id))
+
+
+def srcsets(derivatives):
+    """
+    {"webp": "<url> 160w, <url> 400w", "jpeg": ...} for the API.
+    """
+    storage = _storage()
+    result = {}
+    for key in FORMATS:
+        sizes = (derivatives or {}).get(key)
+        if sizes:
+            result[key] = ", ".join(
+                f"{storage.url(name)} {width}w"
+                for width, name in sorted(sizes.items(), key=lambda item: int(item[0]))
+            )
+    return result
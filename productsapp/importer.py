@@ -0,0 +1,359 @@
+# productsapp/importer.py
+"""
+Bulk product import from CSV or XLSX.
+
+Rows are streamed and written in batches: one SELECT for the batch's
+existing slugs, then one bulk_create and one executemany UPDATE. Category and
+rubro slugs resolve against maps loaded once per import, so a 100k-row
+file costs a few hundred queries and only ever holds one batch in memory.
+
+Columns (header names, any order; only `slug` is always required):
+
+    slug, name, category, rubro, price, discount, discount_name, featured,
+    short_description, long_description, stock, items
+
+`slug` is the upsert key. New products need name, category and price.
+Existing products only have the columns present in the file updated.
+`rubro` is optional and only checked against the category's rubro.
+`items` lists bundle item slugs separated by "|"; it replaces the bundle's
+items and may reference products further down the same file. An empty
+`items` cell leaves the product's items as they are.
+"""
+import csv
+import io
+import os
+from dataclasses import dataclass, field
+from decimal import Decimal, InvalidOperation
+
+from django.db import connection, transaction
+from django.utils.text import slugify
+
+from .models import Product, Category, Rubro
+from .bundles import BundleItem, load_edges, sync_is_bundle
+from .signals import catalog_changed
+
+try:
+    import openpyxl
+except ImportError:  # XLSX support is optional, CSV always works
+    openpyxl = None
+
+BATCH_SIZE = 1000
+# Errors kept on the result (all of them still reach `on_error`)
+MAX_REPORTED_ERRORS = 500
+
+COLUMNS = (
+    "slug", "name", "category", "rubro", "price", "discount", "discount_name", "featured",
+    "short_description", "long_description", "stock", "items",
+)
+# Columns written straight to Product fields
+_FIELD_COLUMNS = (
+    "name", "price", "discount", "discount_name", "featured",
+    "short_description", "long_description", "stock",
+)
+_TRUE = {"1", "true", "yes", "y", "si", "sí", "x"}
+_FALSE = {"", "0", "false", "no", "n"}
+
+
+class ImportFormatError(ValueError):
+    pass
+
+
+class RowError(ValueError):
+    pass
+
+
+@dataclass
+class ImportResult:
+    created: int = 0
+    updated: int = 0
+    failed: int = 0
+    bundles: int = 0
+    errors: list = field(default_factory=list)  # [(line, slug, message)], capped
+
+    def add_error(self, line, slug, message, on_error=None):
+        self.failed += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append((line, slug, message))
+        if on_error:
+            on_error(line, slug, message)
+
+
+def read_rows(fileobj, filename):
+    """
+    Yields (line number, {column: text}) from a binary file object,
+    without loading the whole file.
+    """
+    if os.path.splitext(filename)[1].lower() == ".xlsx":
+        if openpyxl is None:
+            raise ImportFormatError("XLSX import needs openpyxl installed; upload a CSV instead.")
+        try:
+            workbook = openpyxl.load_workbook(fileobj, read_only=True, data_only=True)
+        except Exception as e:  # zipfile/openpyxl raise a handful of types for a bad file
+            raise ImportFormatError(f"Not a readable XLSX file ({e}).") from e
+        rows = workbook.active.iter_rows(values_only=True)
+        header = next(rows, None)
+        if header is None:
+            return
+        header = [str(h or "").strip().lower() for h in header]
+        for line, values in enumerate(rows, start=2):
+            yield line, {h: ("" if v is None else str(v)) for h, v in zip(header, values) if h}
+        workbook.close()
+    else:
+        text = io.TextIOWrapper(fileobj, encoding="utf-8-sig", newline="")
+        reader = csv.DictReader(text)
+        try:
+            if reader.fieldnames is None:
+                return
+            reader.fieldnames = [(h or "").strip().lower() for h in reader.fieldnames]
+            for row in reader:
+                yield reader.line_num, {k: (v or "") for k, v in row.items() if k}
+        except (UnicodeDecodeError, csv.Error) as e:
+            raise ImportFormatError(f"Line {reader.line_num + 1}: the file is not a UTF-8 CSV ({e}).") from e
+
+
+def _decimal(value, column):
+    try:
+        number = Decimal(value.replace(",", "."))
+    except InvalidOperation:
+        raise RowError(f"{column}: '{value}' is not a number.")
+    if not number.is_finite():
+        raise RowError(f"{column}: '{value}' is not a number.")
+    if number < 0 or number >= 10 ** 6:
+        raise RowError(f"{column}: {number} is out of range.")
+    return number.quantize(Decimal("0.01"))
+
+
+def _bool(value, column):
+    value = value.strip().lower()
+    if value in _TRUE:
+        return True
+    if value in _FALSE:
+        return False
+    raise RowError(f"{column}: '{value}' is not yes/no.")
+
+
+def _int(value, column):
+    try:
+        number = Decimal(value)
+    except InvalidOperation:
+        raise RowError(f"{column}: '{value}' is not a whole number.")
+    # XLSX cells can hold 5.0
+    if not number.is_finite() or number != number.to_integral_value():
+        raise RowError(f"{column}: '{value}' is not a whole number.")
+    number = int(number)
+    if number < 0:
+        raise RowError(f"{column}: can't be negative.")
+    return number
+
+
+class ProductImporter:
+    def __init__(self, batch_size=BATCH_SIZE, on_error=None):
+        self.batch_size = batch_size
+        self.on_error = on_error
+        self.result = ImportResult()
+        # The only taxonomy lookups of the whole import
+        self.categories = {
+            slug: (pk, rubro_id) for pk, slug, rubro_id in Category.objects.values_list("id", "slug", "rubro_id")
+        }
+        self.rubros = dict(Rubro.objects.values_list("slug", "id"))
+        # bundle slug -> (line, [item slugs]); bundles are few
+        self.bundle_items = {}
+
+    def parse(self, line, row, columns):
+        slug = row.get("slug", "").strip()
+        if not slug:
+            raise RowError("slug is required.")
+        if slug != slugify(slug):
+            raise RowError(f"slug: '{slug}' is not a valid slug.")
+
+        values = {}
+        text = {c: row.get(c, "").strip() for c in columns}
+        if "name" in columns:
+            if not text["name"]:
+                raise RowError("name can't be empty.")
+            values["name"] = text["name"][:200]
+        for column in ("discount_name", "short_description", "long_description"):
+            if column in columns:
+                limit = Product._meta.get_field(column).max_length
+                values[column] = text[column][:limit] if limit else text[column]
+        if "price" in columns:
+            values["price"] = _decimal(text["price"], "price")
+        if "discount" in columns:
+            values["discount"] = _decimal(text["discount"] or "0", "discount")
+        if "featured" in columns:
+            values["featured"] = _bool(text["featured"], "featured")
+        if "stock" in columns:
+            values["stock"] = _int(text["stock"] or "0", "stock")
+
+        if "category" in columns:
+            category = self.categories.get(text["category"])
+            if category is None:
+                raise RowError(f"category: unknown slug '{text['category']}'.")
+            values["category_id"] = category[0]
+            if "rubro" in columns and text["rubro"]:
+                if self.rubros.get(text["rubro"]) != category[1]:
+                    raise RowError(f"rubro: '{text['rubro']}' is not the rubro of category '{text['category']}'.")
+
+        items = [s.strip() for s in text.get("items", "").split("|") if s.strip()]
+        if items:
+            if slug in items:
+                raise RowError("items: a bundle can't contain itself.")
+            self.bundle_items[slug] = (line, items)
+
+        return slug, values
+
+    def write_batch(self, batch, columns):
+        """
+        batch: {slug: (line, values)}, later rows already won over earlier
+        duplicates.
+        """
+        existing = dict(Product.objects.filter(slug__in=batch).values_list("slug", "id"))
+        update_fields = [c for c in columns if c in _FIELD_COLUMNS + ("category",)]
+
+        to_create, to_update = [], []
+        for slug, (line, values) in batch.items():
+            if slug in existing:
+                to_update.append(Product(id=existing[slug], slug=slug, **values))
+                continue
+            missing = [c for c in ("name", "category_id", "price") if c not in values]
+            if missing:
+                self.bundle_items.pop(slug, None)
+                names = ", ".join(c.replace("_id", "") for c in missing)
+                self.result.add_error(line, slug, f"New product needs {names}.", self.on_error)
+                continue
+            to_create.append(Product(slug=slug, **values))
+
+        with transaction.atomic():
+            if to_create:
+                Product.objects.bulk_create(to_create)
+            if to_update and update_fields:
+                self.update_rows(to_update, update_fields)
+        self.result.created += len(to_create)
+        self.result.updated += len(to_update)
+
+    def update_rows(self, products, update_fields):
+        """
+        One parameterized UPDATE run for every row. bulk_update() builds a
+        CASE WHEN per column and row, which costs far more Python time than
+        the database spends on the writes.
+        """
+        fields = [Product._meta.get_field(name) for name in update_fields]
+        quote = connection.ops.quote_name
+        sql = "UPDATE {} SET {} WHERE {} = %s".format(
+            quote(Product._meta.db_table),
+            ", ".join(f"{quote(f.column)} = %s" for f in fields),
+            quote(Product._meta.pk.column),
+        )
+        params = [
+            [f.get_db_prep_save(getattr(product, f.attname), connection) for f in fields] + [product.pk]
+            for product in products
+        ]
+        with connection.cursor() as cursor:
+            cursor.executemany(sql, params)
+
+    def attach_bundles(self):
+        """
+        Replaces the items of every bundle in the file: cycles are checked
+        against the existing bundle graph first, then the through rows are
+        rewritten in bulk.
+        """
+        if not self.bundle_items:
+            return
+        slugs = set(self.bundle_items)
+        for _, items in self.bundle_items.values():
+            slugs.update(items)
+        ids = {}
+        slug_list = list(slugs)
+        for start in range(0, len(slug_list), self.batch_size):
+            chunk = slug_list[start:start + self.batch_size]
+            ids.update(Product.objects.filter(slug__in=chunk).values_list("slug", "id"))
+
+        edges_by_bundle = {}
+        for slug, (line, items) in self.bundle_items.items():
+            unknown = [s for s in items if s not in ids]
+            if slug not in ids:
+                continue  # the row itself failed and was already reported
+            if unknown:
+                self.result.add_error(line, slug, f"items: unknown slug(s) {', '.join(unknown)}.", self.on_error)
+                continue
+            edges_by_bundle[ids[slug]] = (line, slug, [ids[s] for s in items])
+
+        # Existing graph below the new items, with the imported bundles' new items
+        graph = load_edges({i for _, _, items in edges_by_bundle.values() for i in items})
+        graph.update({bundle_id: items for bundle_id, (_, _, items) in edges_by_bundle.items()})
+
+        def reaches(start, target):
+            seen, stack = set(), list(graph.get(start, []))
+            while stack:
+                node = stack.pop()
+                if node == target:
+                    return True
+                if node not in seen:
+                    seen.add(node)
+                    stack.extend(graph.get(node, []))
+            return False
+
+        for bundle_id, (line, slug, items) in list(edges_by_bundle.items()):
+            if reaches(bundle_id, bundle_id):
+                self.result.add_error(line, slug, "items: this would make the bundle contain itself.", self.on_error)
+                graph[bundle_id] = []
+                del edges_by_bundle[bundle_id]
+
+        with transaction.atomic():
+            BundleItem.objects.filter(from_product_id__in=edges_by_bundle).delete()
+            BundleItem.objects.bulk_create(
+                [
+                    BundleItem(from_product_id=bundle_id, to_product_id=item_id)
+                    for bundle_id, (_, _, items) in edges_by_bundle.items()
+                    for item_id in dict.fromkeys(items)
+                ],
+                batch_size=self.batch_size,
+            )
+            sync_is_bundle(list(edges_by_bundle))
+        self.result.bundles = len(edges_by_bundle)
+
+    def run(self, rows):
+        columns = None
+        batch = {}
+        for line, row in rows:
+            if columns is None:
+                columns = [c for c in COLUMNS if c in row]
+                if "slug" not in columns:
+                    raise ImportFormatError("The file needs a 'slug' column.")
+            try:
+                slug, values = self.parse(line, row, columns)
+            except RowError as e:
+                self.result.add_error(line, row.get("slug", ""), str(e), self.on_error)
+                continue
+            batch[slug] = (line, values)
+            if len(batch) >= self.batch_size:
+                self.write_batch(batch, columns)
+                batch = {}
+        if batch:
+            self.write_batch(batch, columns)
+        self.attach_bundles()
+        return self.result
+
+
+def import_products(fileobj, filename, dry_run=False, batch_size=BATCH_SIZE, on_error=None):
+    """
+    Imports products from an open binary file. Returns an ImportResult.
+
+    Each batch commits on its own, so a file that turns out unreadable
+    halfway (ImportFormatError) keeps the batches before it. dry_run
+    validates and writes everything inside a transaction that is rolled
+    back, so the report matches what a real run would do.
+    """
+    importer = ProductImporter(batch_size=batch_size, on_error=on_error)
+    rows = read_rows(fileobj, filename)
+    if dry_run:
+        with transaction.atomic():
+            result = importer.run(rows)
+            transaction.set_rollback(True)
+        return result
+
+    result = importer.run(rows)
+    # Bulk writes skip model signals: refresh the catalog caches once
+    if result.created or result.updated or result.bundles:
+        catalog_changed.send(sender=Product)
+    return result
@@ -0,0 +1,47 @@
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.management.base import BaseCommand
+from django.db import connection
+
+from productsapp.images import generate_derivatives
+from productsapp.models import Product
+from productsapp.signals import catalog_changed
+
+
+def _generate(product_id, force):
+    try:
+        return product_id, generate_derivatives(product_id, force=force), None
+    except Exception as e:
+        return product_id, False, e
+    finally:
+        connection.close()
+
+
+class Command(BaseCommand):
+    help = "Generates missing or stale image derivatives (thumbnails, WebP) for existing products."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--workers", type=int, default=4, help="Images processed in parallel (default 4).")
+        parser.add_argument("--force", action="store_true", help="Regenerate up to date derivatives too.")
+
+    def handle(self, *args, **options):
+        force = options["force"]
+        rows = Product.objects.exclude(image="").exclude(image__isnull=True).values_list(
+            "id", "image", "image_derivatives"
+        )
+        pending = [pid for pid, image, derivatives in rows if force or (derivatives or {}).get("source") != image]
+        self.stdout.write(f"{len(pending)} product image(s) to process with {options['workers']} worker(s).")
+
+        done = failed = 0
+        with ThreadPoolExecutor(max_workers=max(1, options["workers"])) as pool:
+            for product_id, changed, error in pool.map(lambda pid: _generate(pid, force), pending):
+                if error is not None:
+                    failed += 1
+                    self.stderr.write(f"product id={product_id}: {error}")
+                elif changed:
+                    done += 1
+
+        # One cache invalidation for the whole run
+        if done:
+            catalog_changed.send(sender=Product)
+        self.stdout.write(self.style.SUCCESS(f"Generated derivatives for {done} product(s), {failed} failed."))
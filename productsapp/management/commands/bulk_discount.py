@@ -0,0 +1,81 @@
+import datetime
+
+from django.core.exceptions import ValidationError
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.utils import timezone
+
+from productsapp.campaigns import campaign_products, start_now
+from productsapp.models import Category, DiscountCampaign, Product, Rubro
+
+
+def _datetime(value):
+    parsed = datetime.datetime.fromisoformat(value)
+    return timezone.make_aware(parsed) if timezone.is_naive(parsed) else parsed
+
+
+class Command(BaseCommand):
+    help = (
+        "Creates a discount campaign for categories, rubros and/or products (the whole catalog if none given). "
+        "It's applied right away unless --starts is in the future; see run_discount_campaigns."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("name", help="Campaign name, shown as the products' discount name.")
+        amount = parser.add_mutually_exclusive_group(required=True)
+        amount.add_argument("--percent", help="Percentage of each product's price.")
+        amount.add_argument("--amount", help="Fixed amount off (never more than the price).")
+        parser.add_argument("--category", action="append", default=[], help="Category slug (repeatable).")
+        parser.add_argument("--rubro", action="append", default=[], help="Rubro slug (repeatable).")
+        parser.add_argument("--product", action="append", default=[], help="Product slug (repeatable).")
+        parser.add_argument("--starts", type=_datetime, help="ISO date/time, default now.")
+        parser.add_argument("--ends", type=_datetime, help="ISO date/time, default open-ended.")
+        parser.add_argument("--dry-run", action="store_true", help="Only count the products it would cover.")
+
+    def _lookup(self, model, slugs):
+        found = dict(model.objects.filter(slug__in=slugs).values_list("slug", "id"))
+        unknown = sorted(set(slugs) - set(found))
+        if unknown:
+            raise CommandError(f"Unknown {model._meta.verbose_name} slug(s): {', '.join(unknown)}")
+        return list(found.values())
+
+    def handle(self, *args, **options):
+        categories = self._lookup(Category, options["category"])
+        rubros = self._lookup(Rubro, options["rubro"])
+        products = self._lookup(Product, options["product"])
+
+        percent = options["percent"] is not None
+        campaign = DiscountCampaign(
+            name=options["name"],
+            kind=DiscountCampaign.Kind.PERCENT if percent else DiscountCampaign.Kind.FIXED,
+            value=options["percent"] if percent else options["amount"],
+            starts_at=options["starts"] or timezone.now(),
+            ends_at=options["ends"],
+        )
+        try:
+            campaign.full_clean()
+        except ValidationError as e:
+            raise CommandError(" ".join(e.messages))
+
+        if options["dry_run"]:
+            # Saved only to resolve the scope, then rolled back
+            with transaction.atomic():
+                campaign.save()
+                campaign.categories.set(categories)
+                campaign.rubros.set(rubros)
+                campaign.products.set(products)
+                covered = campaign_products(campaign).filter(campaign_entry__isnull=True).count()
+                transaction.set_rollback(True)
+            self.stdout.write(f"[dry run] Would discount {covered} product(s).")
+            return
+
+        campaign.save()
+        campaign.categories.set(categories)
+        campaign.rubros.set(rubros)
+        campaign.products.set(products)
+
+        if campaign.starts_at > timezone.now():
+            self.stdout.write(f"Campaign #{campaign.pk} scheduled for {campaign.starts_at:%Y-%m-%d %H:%M}.")
+            return
+        changed = start_now(campaign)
+        self.stdout.write(self.style.SUCCESS(f"Campaign #{campaign.pk} started: {changed} product(s) changed."))
@@ -0,0 +1,87 @@
+from django.core.management.base import BaseCommand
+
+from productsapp.images import FORMATS, derivative_names
+from productsapp.models import Product
+from productsapp.signals import catalog_changed
+from productsapp.storage import is_content_addressed
+
+
+def _walk(storage, directory):
+    directories, files = storage.listdir(directory)
+    for name in files:
+        yield f"{directory}/{name}" if directory else name
+    for sub in directories:
+        yield from _walk(storage, f"{directory}/{sub}" if directory else sub)
+
+
+class Command(BaseCommand):
+    help = (
+        "Moves existing product images (and their derivatives) to content-addressed names, "
+        "merging identical files, then deletes media no product references."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--dry-run", action="store_true", help="Report what would change without writing.")
+        # The sweep can't see uploads whose product isn't committed yet: run it off-peak
+        parser.add_argument("--no-sweep", action="store_true", help="Keep unreferenced files under products/.")
+
+    def handle(self, *args, **options):
+        dry_run = options["dry_run"]
+        storage = Product._meta.get_field("image").storage
+        renamed = {}
+
+        def rehash(name):
+            if name not in renamed:
+                if is_content_addressed(name) or not storage.exists(name):
+                    renamed[name] = name
+                elif dry_run:
+                    with storage.open(name, "rb") as f:
+                        renamed[name] = storage.content_name(name, f)
+                else:
+                    with storage.open(name, "rb") as f:
+                        renamed[name] = storage.save(name, f)
+            return renamed[name]
+
+        with_image = Product.objects.exclude(image="").exclude(image__isnull=True)
+        moved = 0
+        for pid, image, derivatives in with_image.values_list("id", "image", "image_derivatives").iterator():
+            new_image = rehash(image)
+            new_derivatives = dict(derivatives or {})
+            if new_derivatives.get("source") == image:
+                new_derivatives["source"] = new_image
+            for key in FORMATS:
+                if key in new_derivatives:
+                    new_derivatives[key] = {w: rehash(n) for w, n in new_derivatives[key].items()}
+            if new_image != image or new_derivatives != derivatives:
+                moved += 1
+                if not dry_run:
+                    # Queryset update: no signals, the old files go in the sweep
+                    Product.objects.filter(pk=pid, image=image).update(
+                        image=new_image, image_derivatives=new_derivatives
+                    )
+
+        merged = len(renamed) - len(set(renamed.values()))
+        self.stdout.write(f"{moved} product(s) updated, {merged} duplicate file(s) merged.")
+
+        if not options["no_sweep"]:
+            # Every name a product points at (or will, after the moves)
+            referenced = set(renamed.values())
+            for image, derivatives in with_image.values_list("image", "image_derivatives").iterator():
+                referenced.add(renamed.get(image, image))
+                referenced.update(renamed.get(n, n) for n in derivative_names(derivatives))
+
+            freed = 0
+            deleted = 0
+            upload_dir = Product._meta.get_field("image").upload_to.rstrip("/")
+            for name in list(_walk(storage, upload_dir)):
+                if name in referenced:
+                    continue
+                freed += storage.size(name)
+                deleted += 1
+                if not dry_run:
+                    storage.delete(name)
+            verb = "Would delete" if dry_run else "Deleted"
+            self.stdout.write(f"{verb} {deleted} unreferenced file(s), {freed / 1024 / 1024:.1f} MB.")
+
+        if moved and not dry_run:
+            catalog_changed.send(sender=Product)
@@ -0,0 +1,72 @@
+import re
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.http import HttpRequest, QueryDict
+from django.utils.http import urlencode
+
+from ordersapp.models import Order
+from productsapp.apis import SORT_OPTIONS, DEFAULT_PAGE_SIZE, _products_params, _sorted_queryset
+from productsapp.models import Category
+
+# SQLite: "SCAN productsapp_product" without "USING [COVERING] INDEX"
+_SQLITE_FULL_SCAN = re.compile(r"\bSCAN (\w+)\b(?! USING)")
+
+
+def _products_query(**params):
+    # Parsed by the API itself, so new params get their defaults here too
+    request = HttpRequest()
+    request.GET = QueryDict(urlencode(params))
+    return _sorted_queryset(_products_params(request))
+
+
+class Command(BaseCommand):
+    help = (
+        "Runs EXPLAIN on the canonical catalog/order API queries and fails if "
+        "any of them falls back to a full table scan. Run it against a "
+        "realistically sized database: on tiny tables the planner may "
+        "legitimately prefer a scan."
+    )
+
+    def canonical_queries(self):
+        category = Category.objects.select_related("rubro").first()
+
+        for sort in SORT_OPTIONS:
+            yield f"products sort={sort}", _products_query(sort=sort)
+            if category:
+                yield (
+                    f"products category={category.slug} sort={sort}",
+                    _products_query(category=category.slug, sort=sort),
+                )
+                yield (
+                    f"products rubro={category.rubro.slug} sort={sort}",
+                    _products_query(rubro=category.rubro.slug, sort=sort),
+                )
+
+        if connection.vendor == "mysql":
+            yield "products search", _products_query(search="cafe")
+
+        yield "orders by user", Order.objects.filter(user_id=1).order_by("-created_at")
+        yield "orders by status", Order.objects.filter(status=Order.Status.PENDING).order_by("-created_at")
+
+    def full_scans(self, qs):
+        if connection.vendor == "mysql":
+            plan = qs.explain(format="json")
+            return ["ALL"] if re.search(r'"access_type":\s*"ALL"', plan) else []
+        if connection.vendor == "sqlite":
+            plan = qs.explain()
+            return _SQLITE_FULL_SCAN.findall(plan)
+        raise CommandError(f"Unsupported database vendor: {connection.vendor}")
+
+    def handle(self, *args, **options):
+        failures = []
+        for name, qs in self.canonical_queries():
+            scans = self.full_scans(qs[:DEFAULT_PAGE_SIZE])
+            if scans:
+                failures.append(name)
+                self.stdout.write(self.style.ERROR(f"FULL SCAN  {name} ({', '.join(scans)})"))
+            else:
+                self.stdout.write(self.style.SUCCESS(f"ok         {name}"))
+
+        if failures:
+            raise CommandError(f"{len(failures)} query shape(s) regressed to a full scan.")
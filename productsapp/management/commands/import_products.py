@@ -0,0 +1,45 @@
+import csv
+import sys
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from productsapp.importer import BATCH_SIZE, ImportFormatError, import_products
+
+
+class Command(BaseCommand):
+    help = "Creates or updates products from a CSV/XLSX file (see productsapp/importer.py for the columns)."
+
+    def add_arguments(self, parser):
+        parser.add_argument("path", help="CSV or XLSX file.")
+        parser.add_argument("--batch-size", type=int, default=BATCH_SIZE)
+        parser.add_argument("--dry-run", action="store_true", help="Validate and report without saving.")
+        parser.add_argument("--errors", help="Write every rejected row to this CSV file (default: stderr).")
+
+    def handle(self, *args, **options):
+        report_file = open(options["errors"], "w", newline="", encoding="utf-8") if options["errors"] else sys.stderr
+        report = csv.writer(report_file)
+        report.writerow(["line", "slug", "error"])
+
+        started = time.perf_counter()
+        try:
+            with open(options["path"], "rb") as f:
+                result = import_products(
+                    f,
+                    options["path"],
+                    dry_run=options["dry_run"],
+                    batch_size=max(1, options["batch_size"]),
+                    on_error=lambda line, slug, message: report.writerow([line, slug, message]),
+                )
+        except (OSError, ImportFormatError) as e:
+            raise CommandError(str(e))
+        finally:
+            if report_file is not sys.stderr:
+                report_file.close()
+
+        elapsed = time.perf_counter() - started
+        prefix = "[dry run] " if options["dry_run"] else ""
+        self.stdout.write(self.style.SUCCESS(
+            f"{prefix}{result.created} created, {result.updated} updated, {result.bundles} bundle(s) set, "
+            f"{result.failed} rejected in {elapsed:.1f}s."
+        ))
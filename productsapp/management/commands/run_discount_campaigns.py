@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from productsapp.campaigns import run_due_campaigns
+
+
+class Command(BaseCommand):
+    help = "Starts scheduled discount campaigns that are due and ends expired ones. Run it from cron."
+
+    def handle(self, *args, **options):
+        started, ended, changed = run_due_campaigns()
+        self.stdout.write(f"{started} campaign(s) started, {ended} ended, {changed} product(s) changed.")
@@ -0,0 +1,34 @@
+from django.db import migrations
+
+
+INDEX_NAME = "product_fulltext_idx"
+
+
+def add_fulltext_index(apps, schema_editor):
+    # FULLTEXT is MySQL-only; other backends use the in-process index in
+    # productsapp/search.py
+    if schema_editor.connection.vendor != "mysql":
+        return
+    Product = apps.get_model("productsapp", "Product")
+    schema_editor.execute(
+        f"ALTER TABLE {Product._meta.db_table} ADD FULLTEXT INDEX {INDEX_NAME} "
+        "(name, short_description, long_description)"
+    )
+
+
+def drop_fulltext_index(apps, schema_editor):
+    if schema_editor.connection.vendor != "mysql":
+        return
+    Product = apps.get_model("productsapp", "Product")
+    schema_editor.execute(f"ALTER TABLE {Product._meta.db_table} DROP INDEX {INDEX_NAME}")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('productsapp', '0002_alter_category_rubro_alter_product_category'),
+    ]
+
+    operations = [
+        migrations.RunPython(add_fulltext_index, drop_fulltext_index),
+    ]
@@ -0,0 +1,26 @@
+# Generated by Django 5.2.7 on 2026-10-18 08:50
+
+from django.db import migrations, models
+from django.db.models import Exists, OuterRef
+
+
+def fill_is_bundle(apps, schema_editor):
+    Product = apps.get_model("productsapp", "Product")
+    has_items = Product.items.through.objects.filter(from_product_id=OuterRef("pk"))
+    Product.objects.update(is_bundle=Exists(has_items))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('productsapp', '0004_product_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='product',
+            name='is_bundle',
+            field=models.BooleanField(default=False, editable=False),
+        ),
+        migrations.RunPython(fill_is_bundle, migrations.RunPython.noop),
+    ]
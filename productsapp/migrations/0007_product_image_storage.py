@@ -0,0 +1,19 @@
+# Generated by Django 5.2.7 on 2026-10-18 09:30
+
+import productsapp.storage
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('productsapp', '0006_product_image_derivatives'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='product',
+            name='image',
+            field=models.ImageField(blank=True, null=True, storage=productsapp.storage.product_image_storage, upload_to='products/'),
+        ),
+    ]
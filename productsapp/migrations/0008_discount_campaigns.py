@@ -0,0 +1,49 @@
+# Generated by Django 5.2.18 on 2026-10-18 09:13
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('productsapp', '0007_product_image_storage'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DiscountCampaign',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=120)),
+                ('kind', models.CharField(choices=[('percent', 'Percentage of the price'), ('fixed', 'Fixed amount')], default='percent', max_length=10)),
+                ('value', models.DecimalField(decimal_places=2, max_digits=8)),
+                ('starts_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('ends_at', models.DateTimeField(blank=True, null=True)),
+                ('status', models.CharField(choices=[('scheduled', 'Scheduled'), ('active', 'Active'), ('ended', 'Ended')], default='scheduled', editable=False, max_length=10)),
+                ('applied_count', models.PositiveIntegerField(default=0, editable=False)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('categories', models.ManyToManyField(blank=True, related_name='discount_campaigns', to='productsapp.category')),
+                ('products', models.ManyToManyField(blank=True, related_name='discount_campaigns', to='productsapp.product')),
+                ('rubros', models.ManyToManyField(blank=True, related_name='discount_campaigns', to='productsapp.rubro')),
+            ],
+            options={
+                'ordering': ['-starts_at', '-id'],
+            },
+        ),
+        migrations.CreateModel(
+            name='CampaignProduct',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('previous_discount', models.DecimalField(decimal_places=2, max_digits=8)),
+                ('previous_discount_name', models.CharField(blank=True, max_length=120)),
+                ('product', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='campaign_entry', to='productsapp.product')),
+                ('campaign', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='entries', to='productsapp.discountcampaign')),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='discountcampaign',
+            index=models.Index(fields=['status', 'starts_at'], name='campaign_status_starts_idx'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-18 09:54
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('productsapp', '0008_discount_campaigns'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='campaignproduct',
+            name='applied_discount',
+            field=models.DecimalField(blank=True, decimal_places=2, max_digits=8, null=True),
+        ),
+    ]
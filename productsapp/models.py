@@ -1,6 +1,10 @@
+from django.core.exceptions import ValidationError
 from django.db import models
+from django.utils import timezone
 from django.utils.text import slugify
 
+from .storage import product_image_storage
+
 class Rubro(models.Model):
     name = models.CharField(max_length=80, unique=True)
     slug = models.SlugField(max_length=80, unique=True)
@@ -45,7 +49,11 @@ class Product(models.Model):
     short_description = models.CharField(max_length=300, blank=True)
     long_description = models.TextField(blank=True)
 
-    image = models.ImageField(upload_to="products/", blank=True, null=True)
+    # Stored once per distinct content, see productsapp/storage.py
+    image = models.ImageField(upload_to="products/", storage=product_image_storage, blank=True, null=True)
+    # Resized/WebP copies of `image`, written by productsapp/images.py:
+    # {"source": <image name>, "jpeg": {"160": <name>, ...}, "webp": {...}}
+    image_derivatives = models.JSONField(default=dict, blank=True, editable=False)
 
     stock = models.PositiveIntegerField(default=0)
 
@@ -56,11 +64,24 @@ class Product(models.Model):
         symmetrical=False,
         related_name="included_in"
     )
+    # Denormalized "has items", kept in sync by signals.py so listings
+    # don't need a query per product
+    is_bundle = models.BooleanField(default=False, editable=False)
 
     created_at = models.DateTimeField(auto_now_add=True)
 
     class Meta:
         ordering = ["name"]
+        # Match products_api's sorts, alone and under a category filter
+        # (see the explain_catalog_queries command)
+        indexes = [
+            models.Index(fields=["-featured", "name"], name="product_featured_name_idx"),
+            models.Index(fields=["price"], name="product_price_idx"),
+            models.Index(fields=["name"], name="product_name_idx"),
+            models.Index(fields=["category", "-featured", "name"], name="product_cat_featured_name_idx"),
+            models.Index(fields=["category", "price"], name="product_cat_price_idx"),
+            models.Index(fields=["category", "name"], name="product_cat_name_idx"),
+        ]
 
     def __str__(self):
         return self.name
@@ -70,6 +91,74 @@ class Product(models.Model):
     def discounted_price(self):
         return max(self.price - self.discount, 0)
 
-    @property
-    def is_bundle(self):
-        return self.items.exists()
\ No newline at end of file
+
+class DiscountCampaign(models.Model):
+    """
+    A discount set on many products at once, applied and reverted in bulk
+    by productsapp/campaigns.py. With no categories, rubros or products
+    selected it covers the whole catalog.
+    """
+
+    class Kind(models.TextChoices):
+        PERCENT = "percent", "Percentage of the price"
+        FIXED = "fixed", "Fixed amount"
+
+    class Status(models.TextChoices):
+        SCHEDULED = "scheduled", "Scheduled"
+        ACTIVE = "active", "Active"
+        ENDED = "ended", "Ended"
+
+    # Shown on the products as their discount_name
+    name = models.CharField(max_length=120)
+    kind = models.CharField(max_length=10, choices=Kind.choices, default=Kind.PERCENT)
+    value = models.DecimalField(max_digits=8, decimal_places=2)
+
+    categories = models.ManyToManyField(Category, blank=True, related_name="discount_campaigns")
+    rubros = models.ManyToManyField(Rubro, blank=True, related_name="discount_campaigns")
+    products = models.ManyToManyField(Product, blank=True, related_name="discount_campaigns")
+
+    starts_at = models.DateTimeField(default=timezone.now)
+    ends_at = models.DateTimeField(null=True, blank=True)
+
+    status = models.CharField(max_length=10, choices=Status.choices, default=Status.SCHEDULED, editable=False)
+    # Products the campaign discounted when it was applied
+    applied_count = models.PositiveIntegerField(default=0, editable=False)
+
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ["-starts_at", "-id"]
+        indexes = [
+            models.Index(fields=["status", "starts_at"], name="campaign_status_starts_idx"),
+        ]
+
+    def __str__(self):
+        return self.name
+
+    def clean(self):
+        if self.value is not None:
+            if self.value <= 0:
+                raise ValidationError({"value": "The discount must be greater than zero."})
+            if self.kind == self.Kind.PERCENT and self.value > 100:
+                raise ValidationError({"value": "A percentage can't be over 100."})
+        if self.ends_at and self.starts_at and self.ends_at <= self.starts_at:
+            raise ValidationError({"ends_at": "The end must be after the start."})
+
+
+class CampaignProduct(models.Model):
+    """
+    A product's own discount from before an active campaign replaced it,
+    restored when the campaign ends. A product is in at most one active
+    campaign at a time.
+    """
+    campaign = models.ForeignKey(DiscountCampaign, on_delete=models.CASCADE, related_name="entries")
+    product = models.OneToOneField(Product, on_delete=models.CASCADE, related_name="campaign_entry")
+
+    previous_discount = models.DecimalField(max_digits=8, decimal_places=2)
+    previous_discount_name = models.CharField(max_length=120, blank=True)
+    # What the campaign set; a product whose discount differs was edited since.
+    # Empty for entries recorded before it was tracked.
+    applied_discount = models.DecimalField(max_digits=8, decimal_places=2, null=True, blank=True)
+
+    def __str__(self):
+        return f"{self.campaign} — {self.product_id}"
@@ -0,0 +1,162 @@
+# productsapp/pagination.py
+"""
+Keyset (cursor) pagination.
+
+Instead of COUNT(*) + OFFSET n, each page is fetched with a WHERE on the
+sort key of the last row the client saw, so page 500 costs the same as
+page 1. The ordering must end in a unique field (usually id) so that the
+key is a strict total order.
+"""
+import base64
+import datetime
+import json
+
+from django.core.exceptions import FieldDoesNotExist, ValidationError
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import Q
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+class _CursorEncoder(DjangoJSONEncoder):
+    def default(self, o):
+        # DjangoJSONEncoder cuts datetimes to milliseconds, and a cursor
+        # that isn't exact skips the rows between the two values
+        if isinstance(o, datetime.datetime):
+            return o.isoformat()
+        return super().default(o)
+
+
+def encode_cursor(direction, values):
+    raw = json.dumps({"d": direction, "k": values}, cls=_CursorEncoder, separators=(",", ":"))
+    return base64.urlsafe_b64encode(raw.encode("utf-8")).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor):
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        data = json.loads(base64.urlsafe_b64decode(padded.encode("ascii")))
+        direction, values = data["d"], data["k"]
+    except (ValueError, TypeError, KeyError):
+        raise InvalidCursor("Invalid cursor.")
+    if direction not in ("next", "prev") or not isinstance(values, list):
+        raise InvalidCursor("Invalid cursor.")
+    return direction, values
+
+
+def _flip(field):
+    return field[1:] if field.startswith("-") else f"-{field}"
+
+
+def _row_value(row, field):
+    return row[field] if isinstance(row, dict) else getattr(row, field)
+
+
+class KeysetPage:
+    def __init__(self, items, next_cursor, prev_cursor):
+        self.items = items
+        self.next_cursor = next_cursor
+        self.prev_cursor = prev_cursor
+
+    def __iter__(self):
+        return iter(self.items)
+
+
+class KeysetPaginator:
+    """
+    paginator = KeysetPaginator(qs, ("-featured", "name", "id"), 40)
+    page = paginator.page(request.GET.get("cursor"))
+
+    Async views await paginator.apage(cursor) instead.
+    """
+
+    def __init__(self, queryset, ordering, page_size):
+        self.queryset = queryset
+        self.ordering = tuple(ordering)
+        self.fields = [f.lstrip("-") for f in self.ordering]
+        self.page_size = page_size
+
+    def _key(self, row):
+        return [_row_value(row, f) for f in self.fields]
+
+    def _key_values(self, values):
+        """
+        The cursor's key as the ordering fields' Python values. Cursors come
+        from clients, so anything a field won't take is an InvalidCursor,
+        not an error deep in the query.
+        """
+        opts = self.queryset.model._meta
+        converted = []
+        for name, value in zip(self.fields, values):
+            if value is None or isinstance(value, (dict, list)):
+                raise InvalidCursor("Invalid cursor.")
+            try:
+                field = opts.get_field(name)
+            except FieldDoesNotExist:
+                # An annotation: no field to check against
+                converted.append(value)
+                continue
+            try:
+                converted.append(field.to_python(value))
+            except (ValidationError, TypeError, ValueError):
+                raise InvalidCursor("Invalid cursor.")
+        return converted
+
+    def _after(self, ordering, values):
+        """
+        Rows strictly after `values` in `ordering`:
+        (a > x) OR (a = x AND b > y) OR (a = x AND b = y AND c > z) ...
+        """
+        condition = Q()
+        equal = Q()
+        for field, value in zip(ordering, values):
+            name = field.lstrip("-")
+            op = "lt" if field.startswith("-") else "gt"
+            condition |= equal & Q(**{f"{name}__{op}": value})
+            equal &= Q(**{name: value})
+        return condition
+
+    def _query(self, cursor):
+        """
+        (queryset for the page plus one row, direction, cursor key).
+        """
+        if cursor:
+            direction, values = decode_cursor(cursor)
+            if len(values) != len(self.fields):
+                raise InvalidCursor("Cursor does not match the current sort.")
+            values = self._key_values(values)
+        else:
+            direction, values = "next", None
+
+        # Walking backwards: flip the ordering, then restore it in Python
+        ordering = self.ordering if direction == "next" else tuple(_flip(f) for f in self.ordering)
+        qs = self.queryset.order_by(*ordering)
+        if values is not None:
+            qs = qs.filter(self._after(ordering, values))
+
+        # One extra row tells us whether there's more without a COUNT
+        return qs[: self.page_size + 1], direction, values
+
+    def _page(self, rows, direction, values):
+        has_more = len(rows) > self.page_size
+        rows = rows[: self.page_size]
+
+        if direction == "next":
+            has_next, has_prev = has_more, values is not None
+        else:
+            rows.reverse()
+            has_next, has_prev = True, has_more
+
+        next_cursor = encode_cursor("next", self._key(rows[-1])) if rows and has_next else None
+        prev_cursor = encode_cursor("prev", self._key(rows[0])) if rows and has_prev else None
+        return KeysetPage(rows, next_cursor, prev_cursor)
+
+    def page(self, cursor=None):
+        qs, direction, values = self._query(cursor)
+        return self._page(list(qs), direction, values)
+
+    async def apage(self, cursor=None):
+        qs, direction, values = self._query(cursor)
+        return self._page([row async for row in qs], direction, values)
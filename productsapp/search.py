@@ -0,0 +1,184 @@
+# productsapp/search.py
+"""
+Product search.
+
+On MySQL queries go through a FULLTEXT index over name, short_description
+and long_description (see migration 0003) and are ranked with
+MATCH ... AGAINST. Other backends (SQLite test runs) use an in-process
+inverted index that is rebuilt when the catalog version changes; its
+ranking is applied in Python (ranked_product_ids()), not in SQL.
+
+Both paths fold accents, so "cafe" finds "Café". On MySQL the folding comes
+from the accent-insensitive utf8mb4 collation.
+"""
+import bisect
+import re
+import threading
+import unicodedata
+from collections import defaultdict
+
+from django.db import connection
+from django.db.models import Value, FloatField, Q
+from django.db.models.expressions import RawSQL
+
+from .models import Product
+from .cache import get_catalog_version
+
+# Relevance weight per indexed column (used by the inverted index)
+FIELD_WEIGHTS = (
+    ("name", 3.0),
+    ("short_description", 2.0),
+    ("long_description", 1.0),
+)
+
+# Matches MySQL's default innodb_ft_min_token_size; shorter words are not
+# in the FULLTEXT index.
+MIN_TERM_LENGTH = 3
+
+_WORD_RE = re.compile(r"\w+")
+
+
+def fold(text):
+    """
+    Lowercases and strips diacritics: "Café Molido" -> "cafe molido".
+    """
+    normalized = unicodedata.normalize("NFKD", text)
+    return "".join(c for c in normalized if not unicodedata.combining(c)).casefold()
+
+
+def tokenize(text):
+    return _WORD_RE.findall(fold(text))
+
+
+def search_terms(query):
+    return [t for t in tokenize(query) if len(t) >= MIN_TERM_LENGTH]
+
+
+class InvertedIndex:
+    """
+    token -> {product_id: weight}, with prefix lookups so partial words
+    typed in the search box still match (like MySQL's `term*`).
+    """
+
+    def __init__(self, rows):
+        postings = defaultdict(dict)
+        # Tiebreakers of the default sort, so results can be ranked here
+        self.sort_keys = {}
+        for pid, featured, *texts in rows:
+            self.sort_keys[pid] = (not featured, texts[0] or "")
+            for (_, weight), text in zip(FIELD_WEIGHTS, texts):
+                for token in tokenize(text or ""):
+                    postings[token][pid] = postings[token].get(pid, 0.0) + weight
+        self.postings = dict(postings)
+        self.tokens = sorted(self.postings)
+
+    def _term_scores(self, term):
+        scores = defaultdict(float)
+        i = bisect.bisect_left(self.tokens, term)
+        while i < len(self.tokens) and self.tokens[i].startswith(term):
+            for pid, weight in self.postings[self.tokens[i]].items():
+                scores[pid] += weight
+            i += 1
+        return scores
+
+    def search(self, terms):
+        """
+        Returns {product_id: score} for products matching every term.
+        """
+        result = None
+        for term in terms:
+            scores = self._term_scores(term)
+            if result is None:
+                result = dict(scores)
+            else:
+                result = {pid: s + scores[pid] for pid, s in result.items() if pid in scores}
+            if not result:
+                return {}
+        return result or {}
+
+    def ranked(self, terms):
+        """
+        Ids matching every term, best first: score, then featured, then
+        name (the API's default sort).
+        """
+        scores = self.search(terms)
+        return sorted(scores, key=lambda pid: (-scores[pid], *self.sort_keys[pid]))
+
+
+_index_lock = threading.Lock()
+_index = (None, None)  # (catalog version, InvertedIndex)
+
+
+def get_inverted_index():
+    global _index
+    version = get_catalog_version()
+    if _index[0] != version:
+        with _index_lock:
+            if _index[0] != version:
+                rows = Product.objects.order_by().values_list(
+                    "id", "featured", *(field for field, _ in FIELD_WEIGHTS)
+                ).iterator(chunk_size=2000)
+                _index = (version, InvertedIndex(rows))
+    return _index[1]
+
+
+def _mysql_search(qs, terms):
+    table = connection.ops.quote_name(Product._meta.db_table)
+    columns = ", ".join(
+        f"{table}.{connection.ops.quote_name(field)}" for field, _ in FIELD_WEIGHTS
+    )
+    # Every term is required, and matched as a prefix
+    against = " ".join(f"+{term}*" for term in terms)
+    match = RawSQL(
+        f"MATCH ({columns}) AGAINST (%s IN BOOLEAN MODE)",
+        (against,),
+        output_field=FloatField(),
+    )
+    return qs.annotate(relevance=match).filter(relevance__gt=0)
+
+
+def _index_search(qs, terms):
+    """
+    Filter only. Pushing every score into SQL as a CASE took seconds on a
+    few thousand matches; the default sort is ranked in Python instead,
+    see ranked_product_ids().
+    """
+    scores = get_inverted_index().search(terms)
+    if not scores:
+        qs = qs.none()
+    else:
+        qs = qs.filter(id__in=list(scores))
+    return qs.annotate(relevance=Value(0.0, output_field=FloatField()))
+
+
+def ranked_product_ids(query):
+    """
+    Ids of the products matching `query`, best first, when the in-process
+    index answers it: pages can then be cut from this list and only their
+    rows read. None on MySQL (FULLTEXT ranks in SQL) and for queries with
+    no indexable words (substring fallback).
+    """
+    terms = search_terms(query)
+    if not terms or connection.vendor == "mysql":
+        return None
+    return get_inverted_index().ranked(terms)
+
+
+def search_products(qs, query):
+    """
+    Filters `qs` down to products matching `query` and annotates each one
+    with a `relevance` score (higher is better).
+    """
+    terms = search_terms(query)
+
+    if not terms:
+        # Only words too short to be indexed: plain substring match
+        return qs.filter(
+            Q(name__icontains=query)
+            | Q(short_description__icontains=query)
+            | Q(long_description__icontains=query)
+        ).annotate(relevance=Value(0.0, output_field=FloatField()))
+
+    if connection.vendor == "mysql":
+        return _mysql_search(qs, terms)
+    return _index_search(qs, terms)
@@ -0,0 +1,127 @@
+# productsapp/serializers.py
+"""
+Product listing serialization.
+
+Rows are read with values() (only the columns a field set needs, no model
+instances, no Category/Rubro joins). Prices are the ones checkout charges:
+the discounted price used to be computed in SQL, but with category
+percentages it comes from the compiled pricing rules (ordersapp/pricing.py),
+per row in Python, so listings and checkout can't disagree on a rule or on
+rounding. Bundle components
+and availability are resolved for the whole page at once (see bundles.py
+and availability.py). Payloads are encoded with orjson when it's installed.
+"""
+import json
+
+from ordersapp.pricing import get_rules
+from .models import Product
+from .bundles import expand_bundles
+from .availability import get_availability
+from .images import srcsets
+
+try:
+    import orjson
+except ImportError:  # optional speedup, stdlib json otherwise
+    orjson = None
+
+
+# Output keys per field set. `card` is what a grid tile needs.
+FIELD_SETS = {
+    "card": (
+        "id", "name", "price", "original_price", "discount", "discount_name",
+        "short_description", "image", "srcset", "is_bundle", "available",
+    ),
+    "full": (
+        "id", "name", "price", "original_price", "discount", "discount_name",
+        "short_description", "long_description", "image", "srcset", "is_bundle", "available", "components",
+    ),
+}
+DEFAULT_FIELD_SET = "full"
+
+# Output key -> column it's read from
+_SOURCES = {
+    "original_price": "price",
+    "srcset": "image_derivatives",
+}
+
+# Output keys that aren't columns
+_DERIVED = {"price", "discount", "available", "components"}
+
+# Always selected: keyset pagination reads the sort columns from the rows,
+# and the listing price needs the discount and the category
+_SORT_COLUMNS = ("id", "featured", "name", "price")
+_PRICING_COLUMNS = ("discount", "category_id")
+
+
+def project(qs, field_set):
+    """
+    values() queryset with just the columns `field_set` needs.
+    """
+    columns = set(_SORT_COLUMNS + _PRICING_COLUMNS)
+    columns.update(_SOURCES.get(key, key) for key in FIELD_SETS[field_set] if key not in _DERIVED)
+    return qs.values(*sorted(columns))
+
+
+def _bundle_components(rows):
+    """
+    {bundle_id: [{"id", "name", "quantity"}, ...]} for the bundles in
+    `rows`: the cached expansion plus one query for component names.
+    """
+    expanded = expand_bundles(row["id"] for row in rows if row["is_bundle"])
+    if not expanded:
+        return {}
+    component_ids = {cid for components in expanded.values() for cid in components}
+    names = dict(Product.objects.filter(id__in=component_ids).values_list("id", "name"))
+    return {
+        bundle_id: [
+            {"id": cid, "name": names.get(cid, ""), "quantity": qty}
+            for cid, qty in sorted(components.items())
+        ]
+        for bundle_id, components in expanded.items()
+    }
+
+
+def serialize_rows(rows, field_set):
+    keys = FIELD_SETS[field_set]
+    storage = Product._meta.get_field("image").storage
+    rows = list(rows)
+    derived = {}
+    if "price" in keys or "discount" in keys:
+        # The price checkout charges: own discount or category percent, whichever is lower
+        rules = get_rules()
+        prices = {row["id"]: rules.listing_price(row["price"], row["discount"], row["category_id"]) for row in rows}
+        derived["price"] = lambda row: float(prices[row["id"]])
+        derived["discount"] = lambda row: float(row["price"] - prices[row["id"]])
+    if "available" in keys:
+        availability = get_availability(row["id"] for row in rows)
+        derived["available"] = lambda row: availability.get(row["id"], 0)
+    if "components" in keys:
+        components = _bundle_components(rows)
+        derived["components"] = lambda row: components.get(row["id"], [])
+
+    results = []
+    for row in rows:
+        item = {}
+        for key in keys:
+            if key in derived:
+                item[key] = derived[key](row)
+                continue
+            value = row[_SOURCES.get(key, key)]
+            if key == "original_price":
+                value = float(value)
+            elif key == "image":
+                value = storage.url(value) if value else ""
+            elif key == "srcset":
+                value = srcsets(value)
+            item[key] = value
+        results.append(item)
+    return results
+
+
+def dumps(payload):
+    """
+    JSON bytes for `payload`.
+    """
+    if orjson is not None:
+        return orjson.dumps(payload)
+    return json.dumps(payload, separators=(",", ":")).encode("utf-8")
@@ -0,0 +1,98 @@
+# productsapp/signals.py
+from django.db import transaction
+from django.db.models.signals import pre_save, post_save, pre_delete, post_delete, m2m_changed
+from django.dispatch import Signal, receiver
+
+from .models import Product, Category, Rubro
+from .cache import bump_catalog_version, bump_taxonomy_version
+from .bundles import sync_is_bundle
+from .images import schedule_derivatives
+from .storage import release_image
+
+# Sent once per committed catalog write. Bulk operations that bypass model
+# signals (queryset.update, bulk_create) should send it themselves.
+catalog_changed = Signal()
+
+
+def _notify_catalog_changed(sender):
+    # Wait for the commit: bumping earlier would let a concurrent request
+    # cache pre-commit data under the new version.
+    transaction.on_commit(lambda: catalog_changed.send(sender=sender))
+
+
+@receiver(post_save, sender=Product)
+@receiver(post_save, sender=Category)
+@receiver(post_save, sender=Rubro)
+@receiver(post_delete, sender=Product)
+@receiver(post_delete, sender=Category)
+@receiver(post_delete, sender=Rubro)
+def catalog_model_changed(sender, **kwargs):
+    _notify_catalog_changed(sender)
+
+
+@receiver(pre_save, sender=Product)
+def product_saving(sender, instance, **kwargs):
+    # Remember the stored image, to collect it if this save replaces it
+    if instance.pk:
+        previous = Product.objects.filter(pk=instance.pk).values_list("image", "image_derivatives").first()
+        instance._previous_image = previous
+        # Same image: keep derivatives the worker wrote after this instance was loaded
+        if previous and previous[0] == instance.image.name:
+            instance.image_derivatives = previous[1]
+
+
+@receiver(post_save, sender=Product)
+def product_image_saved(sender, instance, **kwargs):
+    # Derivatives record the image they were made from
+    source = (instance.image_derivatives or {}).get("source")
+    if (instance.image.name or None) != source:
+        schedule_derivatives(instance.pk)
+
+    previous = instance.__dict__.pop("_previous_image", None)
+    if previous and previous[0] and previous[0] != instance.image.name:
+        transaction.on_commit(lambda: release_image(*previous))
+
+
+@receiver(m2m_changed, sender=Product.items.through)
+def bundle_items_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    if reverse and action == "pre_clear":
+        # product.included_in.clear(): the bundles are gone after the DELETE
+        instance._clearing_bundle_ids = list(instance.included_in.values_list("id", flat=True))
+        return
+    if action not in ("post_add", "post_remove", "post_clear"):
+        return
+
+    # Keep the denormalized Product.is_bundle in step with the rows
+    if reverse:
+        if action == "post_clear":
+            sync_is_bundle(instance.__dict__.pop("_clearing_bundle_ids", []))
+        else:
+            sync_is_bundle(pk_set)
+    else:
+        sync_is_bundle([instance.pk])
+        instance.refresh_from_db(fields=["is_bundle"])
+
+    _notify_catalog_changed(Product)
+
+
+@receiver(pre_delete, sender=Product)
+def product_deleting(sender, instance, **kwargs):
+    # Deleting a product drops it from its bundles without m2m_changed
+    instance._bundle_ids = list(instance.included_in.values_list("id", flat=True))
+    # Derivatives are written by queryset update, the instance may predate them
+    instance._stored_image = Product.objects.filter(pk=instance.pk).values_list("image", "image_derivatives").first()
+
+
+@receiver(post_delete, sender=Product)
+def product_deleted(sender, instance, **kwargs):
+    sync_is_bundle(instance.__dict__.pop("_bundle_ids", []))
+    stored = instance.__dict__.pop("_stored_image", None)
+    if stored and stored[0]:
+        transaction.on_commit(lambda: release_image(*stored))
+
+
+@receiver(catalog_changed)
+def invalidate_catalog_cache(sender, **kwargs):
+    if sender in (Category, Rubro):
+        bump_taxonomy_version()
+    bump_catalog_version()
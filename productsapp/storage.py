@@ -0,0 +1,119 @@
+# productsapp/storage.py
+"""
+Content-addressed storage for product images.
+
+Uploads are stored as <upload dir>/<sha256[:2]>/<sha256><ext>, so the same
+bytes uploaded twice end up as one file, and a file's URL changes whenever
+its content does (safe to serve with a far-future, immutable cache
+header). Derivatives written through the same storage (see images.py) are
+shared the same way.
+
+Blobs are shared between products, so they are never deleted directly:
+release_image() drops an image and each of its derivatives only once no
+product references it any more. A product sharing a blob may not have
+committed yet, so blobs saved within IMAGE_RELEASE_GRACE seconds are left
+for the dedupe_product_media sweep instead.
+"""
+import hashlib
+import os
+import time
+
+from django.conf import settings
+from django.core.files.storage import FileSystemStorage
+from django.db.models import Q
+from django.utils.deconstruct import deconstructible
+
+
+@deconstructible
+class ContentAddressedStorage(FileSystemStorage):
+    def content_name(self, name, content):
+        digest = hashlib.sha256()
+        for chunk in content.chunks():
+            digest.update(chunk)
+        content.seek(0)
+        hexdigest = digest.hexdigest()
+        directory = os.path.dirname(name)
+        ext = os.path.splitext(name)[1].lower()
+        return os.path.join(directory, hexdigest[:2], f"{hexdigest}{ext}").replace("\\", "/")
+
+    def _save(self, name, content):
+        name = self.content_name(name, content)
+        try:
+            # Reused: restart its grace period, the new owner isn't committed yet
+            os.utime(self.path(name))
+            return name
+        except FileNotFoundError:
+            pass
+        saved = super()._save(name, content)
+        if saved != name:
+            # An identical upload won the race, keep its copy
+            self.delete(saved)
+        return name
+
+    def recently_saved(self, name):
+        try:
+            age = time.time() - os.path.getmtime(self.path(name))
+        except FileNotFoundError:
+            return False
+        return age < settings.IMAGE_RELEASE_GRACE
+
+
+def product_image_storage():
+    return ContentAddressedStorage()
+
+
+def is_content_addressed(name):
+    base, ext = os.path.splitext(os.path.basename(name))
+    shard = os.path.basename(os.path.dirname(name))
+    return len(base) == 64 and shard == base[:2] and all(c in "0123456789abcdef" for c in base)
+
+
+def release_image(source, derivatives, exclude_pk=None):
+    """
+    Deletes `source` unless a product (other than `exclude_pk`) still uses
+    that image, and the files of `derivatives` (an image_derivatives dict)
+    no other product lists. Returns True if `source` was deleted.
+    """
+    # models.py imports this module
+    from .images import derivative_names
+    from .models import Product
+
+    if not source:
+        return False
+    users = Product.objects.filter(image=source)
+    if exclude_pk is not None:
+        users = users.exclude(pk=exclude_pk)
+    storage = Product._meta.get_field("image").storage
+    released = not users.exists() and not storage.recently_saved(source)
+    if released:
+        storage.delete(source)
+    # Derivatives are content-addressed too: sources differing only in
+    # metadata resize to the same files
+    release_derivatives(derivative_names(derivatives), exclude_pk)
+    return released
+
+
+def release_derivatives(names, exclude_pk=None):
+    """
+    Deletes the derivative files in `names` that no product (other than
+    `exclude_pk`) lists in its image_derivatives.
+    """
+    from .images import derivative_names
+    from .models import Product
+
+    names = set(names)
+    if not names:
+        return
+    listing = Q()
+    for name in names:
+        listing |= Q(image_derivatives__icontains=name)
+    others = Product.objects.filter(listing)
+    if exclude_pk is not None:
+        others = others.exclude(pk=exclude_pk)
+    for derivatives in others.values_list("image_derivatives", flat=True).iterator():
+        names.difference_update(derivative_names(derivatives))
+
+    storage = Product._meta.get_field("image").storage
+    for name in names:
+        if not storage.recently_saved(name):
+            storage.delete(name)
@@ -0,0 +1,16 @@
+# productsapp/testing.py
+"""
+Fixtures shared by the apps' tests.
+"""
+from django.utils.text import slugify
+
+from .models import Category, Rubro
+
+
+def make_category(name="Beans", rubro="Coffee"):
+    """
+    The category `name` under the rubro `rubro`, created on first use.
+    """
+    rubro, _ = Rubro.objects.get_or_create(name=rubro, slug=slugify(rubro))
+    category, _ = Category.objects.get_or_create(rubro=rubro, name=name, slug=slugify(name))
+    return category
@@ -1,3 +1,704 @@
-from django.test import TestCase
+import asyncio
+import datetime
+import os
+import shutil
+import tempfile
+import time
+from decimal import Decimal
+from io import BytesIO, StringIO
+from unittest import mock
 
-# Create your tests here.
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import CommandError, call_command
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.db import connection
+from django.db.models import F
+from django.utils import timezone
+from django.utils.text import slugify
+
+from adminapp.exports import encode_csv
+from PIL import Image
+from PIL.PngImagePlugin import PngInfo
+
+from .apis import _build_facets_payload, _products_etag
+from .availability import get_availability, invalidate_availability, stock_changed
+from .bundles import expand_bundles, BundleCycleError
+from .cache import get_stock_version
+from .campaigns import apply_campaign, end_now, run_due_campaigns
+from .forms import ProductForm
+from .images import derivative_names, generate_derivatives
+from .exports import PRODUCT_EXPORT_COLUMNS, product_export_chunks
+from .importer import import_products
+from .models import Product, DiscountCampaign
+from .pagination import encode_cursor
+from .search import search_products
+from .serializers import FIELD_SETS
+from .storage import release_image
+from .testing import make_category
+
+
+class BundleTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.category = make_category("Beans")
+        self.mug, self.beans, self.filter = [self.product(name) for name in ("mug", "beans", "filter")]
+        self.starter = self.product("starter")
+        self.starter.items.set([self.mug, self.beans])
+        self.gift = self.product("gift")
+        self.gift.items.set([self.starter, self.mug, self.filter])
+
+    def product(self, slug):
+        return Product.objects.create(name=slug, slug=slug, category=self.category, price="10.00")
+
+    def test_is_bundle_follows_items(self):
+        self.assertTrue(Product.objects.get(pk=self.starter.pk).is_bundle)
+        self.assertFalse(Product.objects.get(pk=self.mug.pk).is_bundle)
+
+        self.starter.items.clear()
+        self.assertFalse(Product.objects.get(pk=self.starter.pk).is_bundle)
+
+        self.mug.included_in.add(self.starter)
+        self.assertTrue(Product.objects.get(pk=self.starter.pk).is_bundle)
+
+    def test_deleting_the_last_item_unsets_is_bundle(self):
+        self.starter.items.set([self.beans])
+        self.beans.delete()
+        self.assertFalse(Product.objects.get(pk=self.starter.pk).is_bundle)
+
+    def test_expands_nested_bundles_one_query_per_level(self):
+        ids = [self.gift.pk, self.starter.pk, self.mug.pk]
+        with self.assertNumQueries(2):
+            expanded = expand_bundles(ids)
+        self.assertEqual(expanded[self.gift.pk], {self.mug.pk: 2, self.beans.pk: 1, self.filter.pk: 1})
+        self.assertEqual(expanded[self.starter.pk], {self.mug.pk: 1, self.beans.pk: 1})
+        self.assertNotIn(self.mug.pk, expanded)
+
+        # Cached until the catalog changes
+        with self.assertNumQueries(0):
+            self.assertEqual(expand_bundles(ids), expanded)
+
+    def test_cycles_are_detected(self):
+        Product.items.through.objects.create(from_product=self.mug, to_product=self.gift)
+        cache.clear()
+        with self.assertRaises(BundleCycleError):
+            expand_bundles([self.gift.pk])
+
+    def test_form_rejects_cycles(self):
+        form = ProductForm(
+            data={
+                "name": "starter", "slug": "starter", "category": self.category.pk,
+                "price": "10.00", "discount": "0", "stock": 0, "items": [self.gift.pk],
+            },
+            instance=self.starter,
+        )
+        self.assertFalse(form.is_valid())
+        self.assertIn("items", form.errors)
+
+
+class AvailabilityTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        category = make_category("Beans")
+        self.mug = Product.objects.create(name="mug", slug="mug", category=category, price="5.00", stock=7)
+        self.beans = Product.objects.create(name="beans", slug="beans", category=category, price="9.00", stock=2)
+        self.kit = Product.objects.create(name="kit", slug="kit", category=category, price="12.00", stock=50)
+        self.kit.items.set([self.mug, self.beans])
+
+    def test_bundles_sell_what_their_scarcest_component_allows(self):
+        with self.assertNumQueries(2):  # bundle edges, stock
+            availability = get_availability([self.mug.pk, self.beans.pk, self.kit.pk])
+        self.assertEqual(availability, {self.mug.pk: 7, self.beans.pk: 2, self.kit.pk: 2})
+
+        with self.assertNumQueries(0):
+            get_availability([self.mug.pk, self.beans.pk, self.kit.pk])
+
+    def test_invalidation_reaches_containing_bundles(self):
+        get_availability([self.kit.pk])
+        Product.objects.filter(pk=self.beans.pk).update(stock=0)
+        invalidate_availability([self.beans.pk])
+        self.assertEqual(get_availability([self.kit.pk]), {self.kit.pk: 0})
+
+    def test_in_stock_only_filters_bundles_by_components(self):
+        Product.objects.filter(pk=self.beans.pk).update(stock=0)
+        response = self.client.get("/api/products/", {"in_stock_only": "1", "taxonomy": "0"})
+        self.assertEqual([p["name"] for p in response.json()["results"]], ["mug"])
+
+    def move_stock(self, product, delta):
+        with self.captureOnCommitCallbacks(execute=True):
+            Product.objects.filter(pk=product.pk).update(stock=F("stock") + delta)
+            stock_changed({product.pk: delta})
+
+    def test_stock_version_only_moves_when_sold_out_or_back(self):
+        version = get_stock_version()
+        self.move_stock(self.mug, -3)
+        self.assertEqual(get_stock_version(), version)
+        self.assertEqual(get_availability([self.mug.pk]), {self.mug.pk: 4})
+
+        # The kit sells out with its beans
+        self.move_stock(self.beans, -2)
+        self.assertNotEqual(get_stock_version(), version)
+        version = get_stock_version()
+        self.assertEqual(get_availability([self.kit.pk]), {self.kit.pk: 0})
+
+        self.move_stock(self.beans, 1)
+        self.assertNotEqual(get_stock_version(), version)
+
+
+@override_settings(IMAGE_DERIVATIVE_WORKERS=0)
+class ImageDerivativeTests(TestCase):
+    def setUp(self):
+        media = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media)
+        override = override_settings(MEDIA_ROOT=media)
+        override.enable()
+        self.addCleanup(override.disable)
+
+        buffer = BytesIO()
+        Image.new("RGBA", (500, 250), (200, 30, 30, 128)).save(buffer, "PNG")
+        category = make_category("Beans")
+        self.product = Product.objects.create(
+            name="mug", slug="mug", category=category, price="5.00",
+            image=SimpleUploadedFile("mug.png", buffer.getvalue()),
+        )
+
+    def test_resized_copies_without_upscaling(self):
+        self.assertTrue(generate_derivatives(self.product.pk))
+        self.product.refresh_from_db()
+        derivatives = self.product.image_derivatives
+        self.assertEqual(derivatives["source"], self.product.image.name)
+        self.assertEqual(sorted(derivatives["webp"], key=int), ["160", "400", "500"])
+
+        storage = self.product.image.storage
+        with storage.open(derivatives["jpeg"]["160"]) as f:
+            self.assertEqual(Image.open(f).size, (160, 80))
+
+        # Up to date: nothing to do
+        self.assertFalse(generate_derivatives(self.product.pk))
+
+    def test_saves_generate_them_on_commit(self):
+        buffer = BytesIO()
+        Image.new("RGB", (100, 100), "blue").save(buffer, "PNG")
+        self.product.image = SimpleUploadedFile("blue.png", buffer.getvalue())
+        with self.captureOnCommitCallbacks(execute=True):
+            self.product.save()
+
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.image_derivatives["source"], self.product.image.name)
+        self.assertEqual(list(self.product.image_derivatives["webp"]), ["100"])
+
+
+# Derivatives inline: no pool threads writing after the temp MEDIA_ROOT is gone
+@override_settings(IMAGE_DERIVATIVE_WORKERS=0, IMAGE_RELEASE_GRACE=0)
+class ContentAddressedStorageTests(TestCase):
+    def setUp(self):
+        media = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media)
+        override = override_settings(MEDIA_ROOT=media)
+        override.enable()
+        self.addCleanup(override.disable)
+
+        self.category = make_category("Beans")
+
+    def upload(self, name, color, comment=None):
+        buffer = BytesIO()
+        info = PngInfo()
+        if comment:
+            info.add_text("Comment", comment)
+        Image.new("RGB", (20, 20), color).save(buffer, "PNG", pnginfo=info)
+        return SimpleUploadedFile(name, buffer.getvalue())
+
+    def product(self, slug, image):
+        with self.captureOnCommitCallbacks(execute=True):
+            return Product.objects.create(name=slug, slug=slug, category=self.category, price="5.00", image=image)
+
+    def test_identical_uploads_share_one_file_until_unused(self):
+        first = self.product("a", self.upload("mug.png", "red"))
+        second = self.product("b", self.upload("mug (1).png", "red"))
+        self.assertEqual(first.image.name, second.image.name)
+        storage = first.image.storage
+
+        with self.captureOnCommitCallbacks(execute=True):
+            first.delete()
+        self.assertTrue(storage.exists(second.image.name))
+
+        name = second.image.name
+        second.image = self.upload("new.png", "blue")
+        with self.captureOnCommitCallbacks(execute=True):
+            second.save()
+        self.assertNotEqual(second.image.name, name)
+        self.assertFalse(storage.exists(name))
+
+        # The new image's derivatives went into this test's MEDIA_ROOT
+        second.refresh_from_db()
+        derivatives = second.image_derivatives
+        self.assertEqual(derivatives["source"], second.image.name)
+        self.assertTrue(all(storage.exists(name) for name in derivatives["jpeg"].values()))
+
+    def test_derivatives_shared_across_sources_outlive_either(self):
+        first = self.product("a", self.upload("mug.png", "red", comment="first"))
+        second = self.product("b", self.upload("mug.png", "red", comment="second"))
+        self.assertNotEqual(first.image.name, second.image.name)
+        first.refresh_from_db()
+        second.refresh_from_db()
+        names = derivative_names(first.image_derivatives)
+        self.assertEqual(names, derivative_names(second.image_derivatives))
+        storage = first.image.storage
+
+        with self.captureOnCommitCallbacks(execute=True):
+            first.delete()
+        self.assertFalse(storage.exists(first.image.name))
+        self.assertTrue(all(storage.exists(name) for name in names))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            second.delete()
+        self.assertFalse(any(storage.exists(name) for name in names))
+
+    @override_settings(IMAGE_RELEASE_GRACE=300)
+    def test_release_spares_blobs_an_uncommitted_upload_reused(self):
+        storage = Product._meta.get_field("image").storage
+        name = storage.save("products/mug.png", self.upload("mug.png", "red"))
+        stale = time.time() - 600
+        os.utime(storage.path(name), (stale, stale))
+
+        # An identical upload whose product isn't committed yet
+        self.assertEqual(storage.save("products/copy.png", self.upload("copy.png", "red")), name)
+        self.assertFalse(release_image(name, {}))
+        self.assertTrue(storage.exists(name))
+
+        os.utime(storage.path(name), (stale, stale))
+        self.assertTrue(release_image(name, {}))
+        self.assertFalse(storage.exists(name))
+
+
+class ImportTests(TestCase):
+    def setUp(self):
+        self.category = make_category("Beans")
+        self.mug = Product.objects.create(name="Mug", slug="mug", category=self.category, price="10.00", stock=3)
+
+    def run_import(self, text, **kwargs):
+        return import_products(BytesIO(text.encode("utf-8")), "products.csv", batch_size=2, **kwargs)
+
+    def test_upserts_by_slug_and_reports_bad_rows(self):
+        result = self.run_import(
+            "slug,name,category,price,stock,items\n"
+            "mug,Big mug,beans,12.50,7,\n"
+            "beans,Beans,beans,\"8,00\",20,\n"
+            "kit,Kit,beans,18,0,mug|beans\n"
+            "bad,Bad,nope,1,1,\n"
+            "nan,NaN,beans,NaN,1,\n"
+        )
+        self.assertEqual((result.created, result.updated, result.bundles, result.failed), (2, 1, 1, 2))
+        self.assertEqual([e[1] for e in result.errors], ["bad", "nan"])
+
+        mug = Product.objects.get(slug="mug")
+        self.assertEqual((mug.name, str(mug.price), mug.stock), ("Big mug", "12.50", 7))
+        kit = Product.objects.get(slug="kit")
+        self.assertTrue(kit.is_bundle)
+        self.assertEqual(set(kit.items.values_list("slug", flat=True)), {"mug", "beans"})
+
+    def test_partial_columns_and_dry_run(self):
+        result = self.run_import("slug,stock\nmug,9\nghost,1\n", dry_run=True)
+        self.assertEqual((result.updated, result.failed), (1, 1))
+        self.assertEqual(Product.objects.get(slug="mug").stock, 3)
+
+        self.run_import("slug,stock\nmug,9\n")
+        mug = Product.objects.get(slug="mug")
+        self.assertEqual((mug.name, mug.stock), ("Mug", 9))
+
+    def test_export_imports_back_unchanged(self):
+        self.run_import("slug,name,category,price,featured,items\nkit,Kit,beans,18,yes,mug\n")
+        exported = "".join(encode_csv(PRODUCT_EXPORT_COLUMNS, product_export_chunks(Product.objects.all(), 1)))
+        self.assertIn("kit,Kit,beans,coffee,18.00,0.00,,True,,,0,mug", exported)
+
+        Product.objects.filter(slug="kit").update(name="Renamed", featured=False)
+        result = self.run_import(exported)
+        self.assertEqual((result.updated, result.failed), (2, 0))
+        kit = Product.objects.get(slug="kit")
+        self.assertEqual((kit.name, kit.featured, kit.is_bundle), ("Kit", True, True))
+
+
+class DiscountCampaignTests(TestCase):
+    def setUp(self):
+        self.beans = make_category("Beans")
+        self.green = make_category("Green", "Tea")
+        self.products = [
+            Product.objects.create(name=f"Beans {i}", slug=f"beans-{i}", category=self.beans, price="19.99")
+            for i in range(5)
+        ]
+        self.products[0].discount, self.products[0].discount_name = Decimal("2.00"), "Own"
+        self.products[0].save()
+        self.tea = Product.objects.create(name="Sencha", slug="sencha", category=self.green, price="8.00")
+
+    def campaign(self, **kwargs):
+        kwargs.setdefault("name", "Sale")
+        kwargs.setdefault("value", Decimal("10"))
+        return DiscountCampaign.objects.create(**kwargs)
+
+    def discounts(self):
+        return dict(Product.objects.values_list("slug", "discount"))
+
+    def test_percent_by_category_one_update_per_batch(self):
+        campaign = self.campaign()
+        campaign.categories.add(self.beans)
+        with CaptureQueriesContext(connection) as ctx:
+            self.assertEqual(apply_campaign(campaign, batch_size=2), 5)
+        updates = [q for q in ctx.captured_queries if q["sql"].startswith('UPDATE "productsapp_product"')]
+        self.assertEqual(len(updates), 3)
+
+        discounts = self.discounts()
+        self.assertEqual(discounts["beans-1"], Decimal("2.00"))
+        self.assertEqual(discounts["sencha"], Decimal("0.00"))
+
+        end_now(campaign)
+        discounts = self.discounts()
+        self.assertEqual((discounts["beans-0"], discounts["beans-1"]), (Decimal("2.00"), Decimal("0.00")))
+        self.assertEqual(Product.objects.get(slug="beans-0").discount_name, "Own")
+
+    def test_revert_keeps_discounts_edited_under_the_same_name(self):
+        campaign = self.campaign()
+        campaign.categories.add(self.beans)
+        apply_campaign(campaign)
+        Product.objects.filter(slug="beans-1").update(discount=Decimal("5.00"))
+        Product.objects.filter(slug="beans-2").update(discount_name="Clearance")
+
+        self.assertEqual(end_now(campaign), 3)
+        discounts = self.discounts()
+        self.assertEqual(
+            (discounts["beans-0"], discounts["beans-1"], discounts["beans-2"], discounts["beans-3"]),
+            (Decimal("2.00"), Decimal("5.00"), Decimal("2.00"), Decimal("0.00")),
+        )
+
+    def test_fixed_never_exceeds_price_and_one_campaign_per_product(self):
+        first = self.campaign(kind=DiscountCampaign.Kind.FIXED, value=Decimal("9.50"))
+        first.rubros.add(self.green.rubro)
+        second = self.campaign(name="Storewide", value=Decimal("50"))
+        run_due_campaigns()
+
+        discounts = self.discounts()
+        self.assertEqual(discounts["sencha"], Decimal("8.00"))
+        self.assertEqual(discounts["beans-2"], Decimal("10.00"))
+        second.refresh_from_db()
+        self.assertEqual((second.status, second.applied_count), (DiscountCampaign.Status.ACTIVE, 5))
+
+    def test_schedule_starts_and_ends(self):
+        now = timezone.now()
+        campaign = self.campaign(starts_at=now + datetime.timedelta(hours=1), ends_at=now + datetime.timedelta(hours=2))
+        campaign.products.add(self.tea)
+
+        self.assertEqual(run_due_campaigns(now), (0, 0, 0))
+        self.assertEqual(run_due_campaigns(now + datetime.timedelta(minutes=90)), (1, 0, 1))
+        self.assertEqual(self.discounts()["sencha"], Decimal("0.80"))
+        self.assertEqual(run_due_campaigns(now + datetime.timedelta(hours=3)), (0, 1, 1))
+        self.assertEqual(self.discounts()["sencha"], Decimal("0.00"))
+
+
+class ProductsApiCacheTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        category = make_category("Beans")
+        self.product = Product.objects.create(name="Beans", slug="beans", category=category, price="10.00", stock=3)
+
+    def test_miss_then_hit(self):
+        self.assertEqual(self.client.get("/api/products/")["X-Cache"], "MISS")
+        self.assertEqual(self.client.get("/api/products/")["X-Cache"], "HIT")
+        # Another query is another entry
+        self.assertEqual(self.client.get("/api/products/", {"page_size": "5"})["X-Cache"], "MISS")
+
+    def test_product_save_invalidates_the_cached_page(self):
+        self.client.get("/api/products/")
+        self.product.name = "Roasted beans"
+        with self.captureOnCommitCallbacks(execute=True):
+            self.product.save()
+
+        response = self.client.get("/api/products/")
+        self.assertEqual(response["X-Cache"], "MISS")
+        self.assertEqual(response.json()["results"][0]["name"], "Roasted beans")
+        self.assertEqual(self.client.get("/api/products/")["X-Cache"], "HIT")
+
+    def test_conditional_requests(self):
+        response = self.client.get("/api/products/")
+        etag, last_modified = response["ETag"], response["Last-Modified"]
+
+        response = self.client.get("/api/products/", headers={"if-none-match": etag})
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response.content, b"")
+        response = self.client.get("/api/products/", headers={"if-modified-since": last_modified})
+        self.assertEqual(response.status_code, 304)
+        # The ETag covers the query too
+        response = self.client.get("/api/products/", {"page_size": "5"}, headers={"if-none-match": etag})
+        self.assertEqual(response.status_code, 200)
+
+    def test_etag_changes_after_a_catalog_write(self):
+        etag = self.client.get("/api/products/")["ETag"]
+        with self.captureOnCommitCallbacks(execute=True):
+            self.product.save()
+
+        response = self.client.get("/api/products/", headers={"if-none-match": etag})
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response["ETag"], etag)
+
+
+class FieldSetTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        category = make_category("Beans")
+        Product.objects.create(
+            name="Beans", slug="beans", category=category, price="10.00", discount="1.00",
+            short_description="Short", long_description="Long " * 100,
+        )
+
+    def product_selects(self, fields):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get("/api/products/", {"fields": fields, "taxonomy": "0"})
+        selects = [
+            q["sql"] for q in ctx.captured_queries
+            if q["sql"].startswith("SELECT") and 'FROM "productsapp_product"' in q["sql"]
+        ]
+        return response.json()["results"][0], selects
+
+    def test_card_emits_its_keys_and_skips_the_deferred_columns(self):
+        result, selects = self.product_selects("card")
+        self.assertEqual(list(result), list(FIELD_SETS["card"]))
+        self.assertEqual((result["price"], result["original_price"], result["discount"]), (9.0, 10.0, 1.0))
+        self.assertTrue(selects)
+        for sql in selects:
+            self.assertNotIn("long_description", sql)
+            self.assertNotIn("productsapp_category", sql)
+
+        result, selects = self.product_selects("full")
+        self.assertEqual(list(result), list(FIELD_SETS["full"]))
+        self.assertTrue(any("long_description" in sql for sql in selects))
+
+
+class FacetsTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.beans = make_category("Beans")
+        self.ground = make_category("Ground")
+        self.green = make_category("Green", "Tea")
+        for slug, category in [
+            ("colombia-beans", self.beans), ("brazil-beans", self.beans),
+            ("colombia-ground", self.ground), ("sencha", self.green),
+        ]:
+            Product.objects.create(name=slug.replace("-", " ").title(), slug=slug, category=category, price="5.00")
+
+    def counts(self, payload):
+        return (
+            {c["slug"]: c["count"] for c in payload["categories"]},
+            {r["slug"]: r["count"] for r in payload["rubros"]},
+        )
+
+    def test_counts_per_category_and_rubro(self):
+        categories, rubros = self.counts(_build_facets_payload({"search": ""}))
+        self.assertEqual(categories, {"beans": 2, "ground": 1, "green": 1})
+        self.assertEqual(rubros, {"coffee": 3, "tea": 1})
+
+    def test_counts_follow_the_search(self):
+        categories, rubros = self.counts(_build_facets_payload({"search": "colombia"}))
+        # Empty categories are still listed, with 0
+        self.assertEqual(categories, {"beans": 1, "ground": 1, "green": 0})
+        self.assertEqual(rubros, {"coffee": 2, "tea": 0})
+
+        response = self.client.get("/api/products/facets/", {"search": "  Colombia "})
+        self.assertEqual(self.counts(response.json()), (categories, rubros))
+
+    def test_products_api_can_drop_the_taxonomy(self):
+        payload = self.client.get("/api/products/").json()
+        self.assertEqual(len(payload["categories"]), 3)
+        self.assertEqual(len(payload["rubros"]), 2)
+
+        payload = self.client.get("/api/products/", {"taxonomy": "0"}).json()
+        self.assertNotIn("categories", payload)
+        self.assertNotIn("rubros", payload)
+        self.assertEqual(len(payload["results"]), 4)
+
+
+class CursorPaginationTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        category = make_category("Beans")
+        # Repeated prices and names: only the id tells them apart
+        for i, (name, price) in enumerate([
+            ("Mocha", "5.00"), ("Arabica", "7.50"), ("Mocha", "5.00"), ("Bourbon", "7.50"),
+            ("Arabica", "5.00"), ("Mocha", "9.00"), ("Arabica", "7.50"),
+        ]):
+            Product.objects.create(name=name, slug=f"p-{i}", category=category, price=price)
+
+    def get(self, **params):
+        return self.client.get("/api/products/", {"page_size": "3", "taxonomy": "0", **params})
+
+    def walk(self, sort):
+        pages, cursor = [], ""
+        while cursor is not None:
+            payload = self.get(sort=sort, cursor=cursor).json()
+            pages.append(payload)
+            cursor = payload["next"]
+        return pages
+
+    def test_walks_forward_and_back_with_ties_broken_by_id(self):
+        expected = {
+            "price-asc": list(Product.objects.order_by("price", "id").values_list("id", flat=True)),
+            "price-desc": list(Product.objects.order_by("-price", "-id").values_list("id", flat=True)),
+            "name-asc": list(Product.objects.order_by("name", "id").values_list("id", flat=True)),
+        }
+        for sort, ids in expected.items():
+            pages = self.walk(sort)
+            self.assertEqual([r["id"] for page in pages for r in page["results"]], ids)
+            self.assertEqual([len(page["results"]) for page in pages], [3, 3, 1])
+            self.assertIsNone(pages[0]["prev"])
+
+            # Back from the last page gives the same pages again
+            back = self.get(sort=sort, cursor=pages[-1]["prev"]).json()
+            self.assertEqual(back["results"], pages[1]["results"])
+            back = self.get(sort=sort, cursor=back["prev"]).json()
+            self.assertEqual(back["results"], pages[0]["results"])
+            self.assertIsNone(back["prev"])
+
+    def test_cursor_from_another_sort(self):
+        cursor = self.get(sort="default", cursor="").json()["next"]
+        response = self.get(sort="price-asc", cursor=cursor)
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json()["message"], "Cursor does not match the current sort.")
+
+    def test_tampered_cursors_are_rejected(self):
+        tampered = [
+            ("default", "nope"),
+            ("default", encode_cursor("next", [{"a": 1}, "x", 1])),
+            ("default", encode_cursor("next", [True, "x", None])),
+            ("price-asc", encode_cursor("next", ["cheap", 1])),
+            ("price-asc", encode_cursor("next", ["5.00", "x"])),
+            ("price-asc", encode_cursor("sideways", ["5.00", 1])),
+        ]
+        for sort, cursor in tampered:
+            with self.subTest(sort=sort, cursor=cursor):
+                self.assertEqual(self.get(sort=sort, cursor=cursor).status_code, 400)
+
+
+class AsyncProductsApiTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        category = make_category("Beans")
+        for i in range(12):
+            Product.objects.create(name=f"Beans {i:02}", slug=f"beans-{i}", category=category, price="10.00", stock=i)
+
+    def assertSamePayload(self, params):
+        sync_body = self.client.get("/api/products/", params).content
+        cache.clear()
+        response = self.client.get("/api/async/products/", params)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.content, sync_body)
+        return response
+
+    def test_same_payload_as_sync_view(self):
+        self.assertSamePayload({"page": "2", "page_size": "5"})
+        self.assertSamePayload({"page": "9", "page_size": "5", "in_stock_only": "1"})
+        response = self.assertSamePayload({"cursor": "", "page_size": "5", "with_total": "1"})
+        self.assertSamePayload({"cursor": response.json()["next"], "page_size": "5"})
+
+    async def test_runs_async_and_revalidates(self):
+        response = await self.async_client.get("/api/async/products/", {"page_size": "5"})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.json()["results"]), 5)
+        self.assertEqual(response["X-Cache"], "MISS")
+
+        response = await self.async_client.get(
+            "/api/async/products/", {"page_size": "5"}, headers={"if-none-match": response["ETag"]}
+        )
+        self.assertEqual(response.status_code, 304)
+
+        response = await self.async_client.get("/api/async/products/", {"cursor": "nope"})
+        self.assertEqual(response.status_code, 400)
+
+    async def test_validators_are_read_off_the_event_loop(self):
+        threads = []
+
+        def etag(request):
+            try:
+                asyncio.get_running_loop()
+                threads.append("event loop")
+            except RuntimeError:
+                threads.append("sync thread")
+            return _products_etag(request)
+
+        with mock.patch("productsapp.async_apis._products_etag", etag):
+            response = await self.async_client.get("/api/async/products/")
+        self.assertEqual(threads, ["sync thread"])
+
+        response = await self.async_client.get(
+            "/api/async/products/", headers={"if-modified-since": response["Last-Modified"]}
+        )
+        self.assertEqual(response.status_code, 304)
+
+
+class SearchTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.beans = make_category("Beans")
+        mugs = make_category("Mugs")
+
+        def make(name, category, short="", featured=False):
+            return Product.objects.create(
+                name=name, slug=slugify(name), category=category, price="10.00", short_description=short,
+                featured=featured, stock=5,
+            )
+
+        self.molido = make("Café Molido", self.beans)
+        self.grano = make("Cafe en grano", self.beans, featured=True)
+        self.taza = make("Taza", mugs, short="Para el café molido")
+        self.te = make("Té verde", self.beans)
+
+    def matches(self, query):
+        return set(search_products(Product.objects.all(), query).values_list("id", flat=True))
+
+    def test_accents_fold_both_ways(self):
+        self.assertEqual(self.matches("CAFE"), {self.molido.id, self.grano.id, self.taza.id})
+        self.assertEqual(self.matches("café"), {self.molido.id, self.grano.id, self.taza.id})
+
+    def test_prefixes_match(self):
+        self.assertEqual(self.matches("mol"), {self.molido.id, self.taza.id})
+
+    def test_every_term_is_required(self):
+        self.assertEqual(self.matches("cafe molido"), {self.molido.id, self.taza.id})
+        self.assertEqual(self.matches("cafe verde"), set())
+
+    def test_short_words_fall_back_to_substring(self):
+        self.assertEqual(self.matches("té"), {self.te.id})
+
+    def test_ranked_pages_read_only_their_rows(self):
+        # Name matches outweigh descriptions; featured breaks the tie
+        response = self.client.get("/api/products/", {"search": "cafe", "page_size": 2, "taxonomy": "0"})
+        payload = response.json()
+        self.assertEqual([r["id"] for r in payload["results"]], [self.grano.id, self.molido.id])
+        self.assertEqual(payload["total_pages"], 2)
+
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get("/api/products/", {"search": "cafe", "page_size": 2, "page": 2, "taxonomy": "0"})
+        self.assertFalse([q for q in queries if "CASE" in q["sql"]])
+
+        payload = self.client.get(
+            "/api/products/", {"search": "cafe", "category": "mugs", "taxonomy": "0"}
+        ).json()
+        self.assertEqual([r["id"] for r in payload["results"]], [self.taza.id])
+        self.assertEqual(payload["total_pages"], 1)
+
+
+class ExplainCatalogQueriesTests(TestCase):
+    def test_explains_every_query_shape(self):
+        category = make_category("Beans")
+        Product.objects.create(name="Mug", slug="mug", category=category, price="10.00", stock=3)
+
+        out = StringIO()
+        # Tiny tables may legitimately plan a scan: only the run itself is checked here
+        try:
+            call_command("explain_catalog_queries", stdout=out)
+        except CommandError:
+            pass
+        # "ok         <name>" or "FULL SCAN  <name> (<tables>)"
+        shapes = {line[11:].split(" (")[0] for line in out.getvalue().splitlines()}
+        self.assertLessEqual(
+            {"products sort=default", "products category=beans sort=price-asc", "products rubro=coffee sort=name-asc",
+             "orders by user", "orders by status"},
+            shapes,
+        )
@@ -1,19 +1,111 @@
 from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib import messages
 from django.contrib.auth.decorators import user_passes_test
-from django.db.models import ProtectedError
-from .models import Product, Category, Rubro
-from .forms import ProductForm, RubroForm, CategoryForm
+from django.db.models import ProtectedError, Q
+from django.http import HttpResponseBadRequest
+from adminapp.exports import EXPORT_FORMATS, created_between, date_param, stream_export
+from adminapp.listing import paginate_list
+from django.utils import timezone
+from .models import Product, Category, Rubro, DiscountCampaign
+from .forms import ProductForm, RubroForm, CategoryForm, DiscountCampaignForm
+from .campaigns import start_now, end_now
+from .importer import COLUMNS, ImportFormatError, import_products
+from .exports import PRODUCT_EXPORT_COLUMNS, product_export_chunks
+
+# "Low stock" filter on the product list
+LOW_STOCK_THRESHOLD = 5
+
+PRODUCT_SORTS = {
+    "name": ("name", "id"),
+    "category": ("category__name", "name", "id"),
+    "price": ("price", "id"),
+    "stock": ("stock", "id"),
+    "featured": ("-featured", "name", "id"),
+}
+CATEGORY_SORTS = {
+    "name": ("name", "id"),
+    "rubro": ("rubro__name", "name", "id"),
+    "slug": ("slug", "id"),
+}
+CAMPAIGN_SORTS = {
+    "name": ("name", "id"),
+    "starts": ("starts_at", "id"),
+    "ends": ("ends_at", "id"),
+    "status": ("status", "starts_at", "id"),
+}
+RUBRO_SORTS = {
+    "name": ("name", "id"),
+    "slug": ("slug", "id"),
+}
 
 
 def is_manager(user):
     return user.is_authenticated and user.role == 'manager'
 
 
+def _filter_products(request, products):
+    """
+    Applies the product list filters in request.GET. Returns the queryset
+    and the filter values for the template.
+    """
+    q = request.GET.get("q", "").strip()
+    if q:
+        products = products.filter(Q(name__icontains=q) | Q(slug__icontains=q))
+    category = request.GET.get("category", "")
+    if category.isdigit():
+        products = products.filter(category_id=category)
+    rubro = request.GET.get("rubro", "")
+    if rubro.isdigit():
+        products = products.filter(category__rubro_id=rubro)
+    featured = request.GET.get("featured", "")
+    if featured in ("yes", "no"):
+        products = products.filter(featured=featured == "yes")
+    low_stock = request.GET.get("low_stock") == "1"
+    if low_stock:
+        products = products.filter(stock__lte=LOW_STOCK_THRESHOLD)
+    date_from = date_param(request.GET.get("from"))
+    date_to = date_param(request.GET.get("to"))
+    products = products.filter(**created_between(date_from, date_to))
+
+    return products, {
+        "q": q,
+        "category": category,
+        "rubro": rubro,
+        "featured": featured,
+        "low_stock": low_stock,
+        "date_from": date_from,
+        "date_to": date_to,
+    }
+
+
 @user_passes_test(is_manager, login_url="/unauthorized/")
 def product_list(request):
-    products = Product.objects.select_related("category", "category__rubro").order_by("name")
-    return render(request, "product_list.html", {"products": products})
+    # Only the columns the table shows
+    products = Product.objects.select_related("category").only(
+        "id", "name", "price", "discount", "discount_name", "featured", "stock", "is_bundle", "category__name"
+    )
+    products, filters = _filter_products(request, products)
+
+    context = paginate_list(request, products, PRODUCT_SORTS, "name")
+    context.update(filters)
+    context.update({
+        "low_stock_threshold": LOW_STOCK_THRESHOLD,
+        "categories": Category.objects.values_list("id", "name").order_by("name"),
+        "rubros": Rubro.objects.values_list("id", "name"),
+    })
+    return render(request, "product_list.html", context)
+
+
+@user_passes_test(is_manager, login_url="/unauthorized/")
+def product_export(request):
+    """
+    Streams the products matching the list filters as CSV or JSON Lines.
+    """
+    fmt = request.GET.get("format", "csv")
+    if fmt not in EXPORT_FORMATS:
+        return HttpResponseBadRequest("format must be csv or jsonl.")
+    products, _ = _filter_products(request, Product.objects.all())
+    return stream_export(fmt, "products", PRODUCT_EXPORT_COLUMNS, product_export_chunks(products))
 
 
 @user_passes_test(is_manager, login_url="/unauthorized/")
@@ -46,6 +138,35 @@ def product_edit(request, product_id):
     return render(request, "product_edit.html", {"form": form, "product": product})
 
 
+@user_passes_test(is_manager, login_url="/unauthorized/")
+def product_import(request):
+    result = None
+    dry_run = False
+    if request.method == "POST":
+        upload = request.FILES.get("file")
+        dry_run = request.POST.get("dry_run") == "1"
+        if upload is None:
+            messages.error(request, "Choose a CSV or XLSX file to import.")
+        else:
+            try:
+                result = import_products(upload.file, upload.name, dry_run=dry_run)
+            except ImportFormatError as e:
+                messages.error(request, str(e))
+            else:
+                verb = "Checked" if dry_run else "Imported"
+                messages.success(
+                    request,
+                    f"{verb}: {result.created} created, {result.updated} updated, "
+                    f"{result.bundles} bundle(s) set, {result.failed} rejected.",
+                )
+
+    return render(request, "product_import.html", {
+        "result": result,
+        "dry_run": dry_run,
+        "columns": COLUMNS,
+    })
+
+
 @user_passes_test(is_manager, login_url="/unauthorized/")
 def product_delete(request, product_id):
     product = get_object_or_404(Product, id=product_id)
@@ -64,10 +185,75 @@ def product_delete(request, product_id):
     return redirect("product_list")
 
 
+@user_passes_test(is_manager, login_url="/unauthorized/")
+def campaign_list(request):
+    campaigns = DiscountCampaign.objects.all()
+    status = request.GET.get("status", "")
+    if status in DiscountCampaign.Status.values:
+        campaigns = campaigns.filter(status=status)
+
+    context = paginate_list(request, campaigns, CAMPAIGN_SORTS, "-starts")
+    context.update({"status": status, "statuses": DiscountCampaign.Status.choices})
+    return render(request, "campaign_list.html", context)
+
+
+@user_passes_test(is_manager, login_url="/unauthorized/")
+def campaign_add(request):
+    if request.method == "POST":
+        form = DiscountCampaignForm(request.POST)
+        if form.is_valid():
+            campaign = form.save()
+            if campaign.starts_at <= timezone.now():
+                changed = start_now(campaign)
+                messages.success(request, f"Campaign started: {changed} product(s) discounted.")
+            else:
+                messages.success(request, "Campaign scheduled.")
+            return redirect("campaign_list")
+    else:
+        form = DiscountCampaignForm()
+
+    return render(request, "campaign_add.html", {"form": form})
+
+
+@user_passes_test(is_manager, login_url="/unauthorized/")
+def campaign_start(request, campaign_id):
+    campaign = get_object_or_404(DiscountCampaign, id=campaign_id)
+
+    if request.method == "POST":
+        if campaign.status == DiscountCampaign.Status.ENDED:
+            messages.error(request, "This campaign has already ended.")
+        else:
+            changed = start_now(campaign)
+            messages.success(request, f"Campaign started: {changed} product(s) discounted.")
+
+    return redirect("campaign_list")
+
+
+@user_passes_test(is_manager, login_url="/unauthorized/")
+def campaign_end(request, campaign_id):
+    campaign = get_object_or_404(DiscountCampaign, id=campaign_id)
+
+    if request.method == "POST":
+        changed = end_now(campaign)
+        messages.success(request, f"Campaign ended: {changed} product(s) restored.")
+
+    return redirect("campaign_list")
+
+
 @user_passes_test(is_manager, login_url="/unauthorized/")
 def category_list(request):
-    categories = Category.objects.select_related("rubro").order_by("rubro__name", "name")
-    return render(request, "category_list.html", {"categories": categories})
+    categories = Category.objects.select_related("rubro").only("id", "name", "slug", "rubro__name")
+
+    q = request.GET.get("q", "").strip()
+    if q:
+        categories = categories.filter(Q(name__icontains=q) | Q(slug__icontains=q))
+    rubro = request.GET.get("rubro", "")
+    if rubro.isdigit():
+        categories = categories.filter(rubro_id=rubro)
+
+    context = paginate_list(request, categories, CATEGORY_SORTS, "rubro")
+    context.update({"q": q, "rubro": rubro, "rubros": Rubro.objects.values_list("id", "name")})
+    return render(request, "category_list.html", context)
 
 
 @user_passes_test(is_manager, login_url="/unauthorized/")
@@ -122,8 +308,15 @@ def category_delete(request, category_id):
 
 @user_passes_test(is_manager, login_url='/unauthorized/')
 def rubro_list(request):
-    rubros = Rubro.objects.all().order_by("name")
-    return render(request, "rubro_list.html", {"rubros": rubros})
+    rubros = Rubro.objects.only("id", "name", "slug")
+
+    q = request.GET.get("q", "").strip()
+    if q:
+        rubros = rubros.filter(Q(name__icontains=q) | Q(slug__icontains=q))
+
+    context = paginate_list(request, rubros, RUBRO_SORTS, "name")
+    context["q"] = q
+    return render(request, "rubro_list.html", context)
 
 @user_passes_test(is_manager, login_url="/unauthorized/")
 def rubro_add(request):
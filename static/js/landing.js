@@ -25,6 +25,8 @@ function getCSRFToken() {
 /* ---------- Config: API endpoint & page size ---------- */
 
 const API_URL = "/api/products/"; // adjust to your actual endpoint
+const FACETS_URL = "/api/products/facets/";
+const QUOTE_URL = "/api/quote/";
 
 // Expected JSON response shape (example):
 // {
@@ -40,13 +42,18 @@ const API_URL = "/api/products/"; // adjust to your actual endpoint
 //      ...
 //   ],
 //   "page": 1,
-//   "total_pages": 3,
+//   "total_pages": 3
+// }
+//
+// Rubros/categories come from FACETS_URL (with product counts for the
+// current search), so product pages are requested with taxonomy=0:
+// {
 //   "rubros": [
-//      {"id": 1, "name": "Coffee", "slug": "coffee"},
-//      {"id": 2, "name": "Snacks", "slug": "snacks"}
+//      {"id": 1, "name": "Coffee", "slug": "coffee", "count": 12},
+//      ...
 //   ],
 //   "categories": [
-//      {"id": 10, "name": "Whole Beans", "slug": "whole-beans", "rubro_id": 1},
+//      {"id": 10, "name": "Whole Beans", "slug": "whole-beans", "rubro_id": 1, "count": 5},
 //      ...
 //   ]
 // }
@@ -57,6 +64,15 @@ function formatMoney(n) {
   return `$${Number(n || 0).toFixed(2)}`;
 }
 
+/* <picture> with the API's resized/WebP srcsets, falling back to the
+   original upload when a product has no derivatives yet. */
+function productImageHTML(p, sizes, attrs = "") {
+  const srcset = p.srcset || {};
+  const webp = srcset.webp ? `<source type="image/webp" srcset="${srcset.webp}" sizes="${sizes}" />` : "";
+  const jpeg = srcset.jpeg ? ` srcset="${srcset.jpeg}" sizes="${sizes}"` : "";
+  return `<picture>${webp}<img src="${p.image || ""}"${jpeg} alt="${p.name}" ${attrs} /></picture>`;
+}
+
 function debounce(fn, delay = 300) {
   let t;
   return (...args) => {
@@ -83,6 +99,7 @@ let state = {
   sort: urlParams.get("sort") || "default",
   rubros: [],
   categories: [], // all categories; we filter client-side per rubro
+  quote: null,    // last server quote for the cart (see fetchQuote)
   isLoading: false
 };
 
@@ -134,18 +151,78 @@ function syncURL() {
 
 function saveCart() {
   localStorage.setItem(storageKey, JSON.stringify(cart));
+  requestQuote();
 }
 
 /* ---------- Cart calculations & rendering ---------- */
 
+/* Prices, discounts and shipping come from QUOTE_URL, which uses the same
+   rules as checkout. Until the first quote arrives we show the local
+   subtotal with no shipping. */
+let quoteSeq = 0;
+
+function currentDeliveryMethod() {
+  const input = document.getElementById("delivery_method");
+  return (input && input.value) || "pickup";
+}
+
+async function fetchQuote() {
+  const seq = ++quoteSeq;
+
+  if (!cart.length) {
+    state.quote = { subtotal: 0, discount_total: 0, promotion: null, promotion_discount: 0, shipping: 0, total: 0, lines: [] };
+    renderCart();
+    renderOrderSummary();
+    return;
+  }
+
+  try {
+    const res = await fetch(QUOTE_URL, {
+      method: "POST",
+      headers: {
+        "Content-Type": "application/json",
+        "Accept": "application/json",
+        "X-CSRFToken": getCSRFToken(),
+      },
+      body: JSON.stringify({
+        delivery_method: currentDeliveryMethod(),
+        items: cart.map(i => ({ product_id: i.id, quantity: i.qty }))
+      })
+    });
+    if (!res.ok) throw new Error(`Quote failed (${res.status})`);
+    const data = await res.json();
+
+    // A newer cart change already asked for another quote
+    if (seq !== quoteSeq) return;
+
+    state.quote = data;
+
+    // Keep stored unit prices in line with the server's
+    const prices = new Map((data.lines || []).map(l => [String(l.product_id), l.unit_price]));
+    cart.forEach(item => {
+      if (prices.has(String(item.id))) item.price = prices.get(String(item.id));
+    });
+    localStorage.setItem(storageKey, JSON.stringify(cart));
+
+    renderCart();
+    renderOrderSummary();
+  } catch (err) {
+    console.error(err);
+  }
+}
+
+const requestQuote = debounce(fetchQuote, 250);
+
 function cartTotals() {
+  if (state.quote) {
+    const { subtotal, shipping, total, promotion, promotion_discount } = state.quote;
+    return { subtotal, shipping, total, promotion, promotion_discount };
+  }
   const subtotal = cart.reduce((sum, item) => {
     const price = Number(item.price || 0);
     return sum + price * item.qty;
   }, 0);
-  const shipping = subtotal === 0 ? 0 : subtotal >= 30 ? 0 : 4.5;
-  const total = subtotal + shipping;
-  return { subtotal, shipping, total };
+  return { subtotal, shipping: 0, total: subtotal, promotion: null, promotion_discount: 0 };
 }
 
 function renderCart() {
@@ -271,7 +348,7 @@ function renderRubros() {
   state.rubros.forEach(r => {
     const btn = document.createElement("button");
     btn.className = "btn";
-    btn.textContent = r.name;
+    btn.textContent = r.count !== undefined ? `${r.name} (${r.count})` : r.name;
     btn.dataset.rubro = r.slug;
     if (state.rubro === r.slug) btn.classList.add("primary");
     btn.addEventListener("click", () => {
@@ -311,7 +388,7 @@ function renderCategoryFilter() {
   relevantCats.forEach(cat => {
     const opt = document.createElement("option");
     opt.value = cat.slug;
-    opt.textContent = cat.name;
+    opt.textContent = cat.count !== undefined ? `${cat.name} (${cat.count})` : cat.name;
     if (state.category === cat.slug) opt.selected = true;
     categoryFilter.appendChild(opt);
   });
@@ -352,7 +429,7 @@ state.products.forEach(p => {
     : 0;
 
   card.innerHTML = `
-    <img src="${p.image || ""}" alt="${p.name}" loading="lazy" />
+    ${productImageHTML(p, "(max-width: 600px) 50vw, 280px", 'loading="lazy"')}
     <div class="card-body">
       <h4>${p.name}</h4>
       <p class="muted">${desc}</p>
@@ -380,7 +457,11 @@ state.products.forEach(p => {
 
         <div style="display:flex;gap:8px;align-items:center">
           <button class="btn" data-id="${p.id}" data-action="quick">View</button>
-          <button class="btn primary" data-id="${p.id}" data-action="add">Add</button>
+          ${
+            p.available === 0
+              ? `<button class="btn primary" disabled>Sold out</button>`
+              : `<button class="btn primary" data-id="${p.id}" data-action="add">Add</button>`
+          }
         </div>
       </div>
     </div>
@@ -527,7 +608,7 @@ if (closeProductModal && productModal) {
 function renderOrderSummary() {
   if (!orderSummaryEl) return;
 
-  const { subtotal, shipping, total } = cartTotals();
+  const { subtotal, shipping, total, promotion, promotion_discount } = cartTotals();
   let html = `<h4>Items</h4>`;
 
   if (cart.length === 0) {
@@ -543,6 +624,7 @@ function renderOrderSummary() {
   html += `
     <div style="margin-top:10px">
       <div><strong>Subtotal:</strong> ${formatMoney(subtotal)}</div>
+      ${promotion ? `<div><strong>${promotion}:</strong> −${formatMoney(promotion_discount)}</div>` : ""}
       <div><strong>Shipping:</strong> ${formatMoney(shipping)}</div>
       <div style="margin-top:6px"><strong>Total:</strong> ${formatMoney(total)}</div>
     </div>
@@ -553,6 +635,16 @@ function renderOrderSummary() {
 
 /* -------------------- REAL CHECKOUT API INTEGRATION -------------------- */
 
+/* One Idempotency-Key per order attempt: resubmitting after a timeout or
+   a double click reuses it, so the server replays the original order
+   instead of creating a duplicate. Cleared once the order goes through. */
+let checkoutKey = null;
+
+function newIdempotencyKey() {
+  if (window.crypto && crypto.randomUUID) return crypto.randomUUID();
+  return `${Date.now()}-${Math.random().toString(16).slice(2)}`;
+}
+
 if (checkoutForm) {
   const deliveryMethodInput = document.getElementById("delivery_method");
   const addressRow = document.getElementById("addressRow");
@@ -575,6 +667,11 @@ if (checkoutForm) {
     deliveryMethodInput.addEventListener("change", toggleAddress);
   }
 
+  // Shipping depends on the delivery method
+  if (deliveryMethodInput) {
+    deliveryMethodInput.addEventListener("change", requestQuote);
+  }
+
   checkoutForm.addEventListener("submit", async (ev) => {
     ev.preventDefault();
 
@@ -616,6 +713,8 @@ if (checkoutForm) {
     }
 
     // 🚀 Call the backend API
+    if (!checkoutKey) checkoutKey = newIdempotencyKey();
+
     try {
       const res = await fetch("/api/checkout/", {
         method: "POST",
@@ -623,6 +722,7 @@ if (checkoutForm) {
           "Content-Type": "application/json",
           "Accept": "application/json",
           "X-CSRFToken": getCSRFToken(),   // <-- ADD THIS
+          "Idempotency-Key": checkoutKey,
         },
         body: JSON.stringify(payload)
       });
@@ -630,10 +730,14 @@ if (checkoutForm) {
       const data = await res.json();
 
       if (!res.ok) {
+        // A changed cart is a new attempt
+        if (res.status === 422) checkoutKey = null;
         alert(data.message || "Error processing your order.");
         return;
       }
 
+      checkoutKey = null;
+
       // 🎉 SUCCESS — Show success modal
       const successModal = document.getElementById("orderSuccessModal");
       const successMsg = document.getElementById("orderSuccessMessage");
@@ -694,6 +798,7 @@ if (searchInput) {
     state.search = searchInput.value.trim();
     state.page = 1;
     syncURL();
+    fetchFacets();
     fetchProducts();
   }, 400);
   searchInput.addEventListener("input", onSearch);
@@ -740,6 +845,48 @@ document.addEventListener("click", (e) => {
 
 /* ---------- Data loading from API ---------- */
 
+/* Conditional GET cache: url -> { etag, lastModified, data }.
+   The server answers 304 (no body, no product query) when the catalog
+   hasn't changed, and we reuse the data we already have. */
+const responseCache = new Map();
+const RESPONSE_CACHE_SIZE = 50;
+
+async function fetchJSONWithValidators(url) {
+  const cached = responseCache.get(url);
+  const headers = { "Accept": "application/json" };
+  if (cached) {
+    if (cached.etag) headers["If-None-Match"] = cached.etag;
+    if (cached.lastModified) headers["If-Modified-Since"] = cached.lastModified;
+  }
+
+  const res = await fetch(url, { headers });
+
+  if (res.status === 304 && cached) {
+    // refresh LRU position
+    responseCache.delete(url);
+    responseCache.set(url, cached);
+    return cached.data;
+  }
+
+  if (!res.ok) {
+    throw new Error(`Failed loading ${url}`);
+  }
+
+  const data = await res.json();
+
+  responseCache.delete(url);
+  responseCache.set(url, {
+    etag: res.headers.get("ETag"),
+    lastModified: res.headers.get("Last-Modified"),
+    data
+  });
+  if (responseCache.size > RESPONSE_CACHE_SIZE) {
+    responseCache.delete(responseCache.keys().next().value);
+  }
+
+  return data;
+}
+
 async function fetchProducts() {
   try {
     state.isLoading = true;
@@ -748,26 +895,17 @@ async function fetchProducts() {
     const params = new URLSearchParams();
     params.set("page", state.page);
     params.set("page_size", 40); // limit per page
+    params.set("taxonomy", 0);   // rubros/categories come from fetchFacets()
     if (state.search) params.set("search", state.search);
     if (state.rubro) params.set("rubro", state.rubro);
     if (state.category) params.set("category", state.category);
     if (state.sort && state.sort !== "default") params.set("sort", state.sort);
 
-    const res = await fetch(`${API_URL}?${params.toString()}`, {
-      headers: { "Accept": "application/json" }
-    });
-
-    if (!res.ok) {
-      throw new Error("Failed loading products");
-    }
-
-    const data = await res.json();
+    const data = await fetchJSONWithValidators(`${API_URL}?${params.toString()}`);
 
     state.products = data.results || [];
     state.page = data.page || 1;
     state.totalPages = data.total_pages || 1;
-    if (data.rubros) state.rubros = data.rubros;
-    if (data.categories) state.categories = data.categories;
 
     state.isLoading = false;
 
@@ -787,6 +925,23 @@ async function fetchProducts() {
   }
 }
 
+async function fetchFacets() {
+  try {
+    const params = new URLSearchParams();
+    if (state.search) params.set("search", state.search);
+
+    const data = await fetchJSONWithValidators(`${FACETS_URL}?${params.toString()}`);
+
+    state.rubros = data.rubros || [];
+    state.categories = data.categories || [];
+
+    renderRubros();
+    renderCategoryFilter();
+  } catch (err) {
+    console.error(err);
+  }
+}
+
 /* ---------- Order Success Modal Handlers ---------- */
 
 const orderSuccessModal = document.getElementById("orderSuccessModal");
@@ -819,6 +974,8 @@ if (orderSuccessModal) {
 
 function initLanding() {
   renderCart();
+  requestQuote();
+  fetchFacets();
   fetchProducts();
 }
 
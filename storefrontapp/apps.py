@@ -1,6 +1,11 @@
 from django.apps import AppConfig
+from django.core import checks
 
 
 class StorefrontappConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'storefrontapp'
+
+    def ready(self):
+        from dadsproject.caching import check_shared_caches
+        checks.register(check_shared_caches, checks.Tags.caches)
@@ -0,0 +1,511 @@
+# storefrontapp/benchmarks.py
+"""
+Benchmark data and scenarios (`manage.py seed_benchmark_data`,
+`manage.py run_benchmarks`).
+
+seed_data() fills the configured database with a reproducible catalog.
+The same seed gives the same rows. Everything it creates is slugged or
+named with BENCH_PREFIX, so it can be found and deleted again.
+
+Scenarios drive the real URL stack in process through django.test.Client,
+middleware included. Query counts and DB time come from the Server-Timing
+header that InstrumentationMiddleware adds (dadsproject/middleware.py).
+Run them against a local database: the checkout scenario creates orders
+and takes stock from the benchmark products.
+"""
+import asyncio
+import json
+import math
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from decimal import Decimal
+from urllib.error import HTTPError, URLError
+from urllib.parse import urlencode
+from urllib.request import urlopen
+
+from asgiref.sync import ThreadSensitiveContext, sync_to_async
+from django.contrib.auth.hashers import make_password
+from django.db import connection, transaction
+from django.test import AsyncClient, Client
+
+from dadsproject.caching import catalog_cache
+from ordersapp.models import Order
+from productsapp.bundles import BundleItem, sync_is_bundle
+from productsapp.models import Category, Product, Rubro
+from productsapp.signals import catalog_changed
+from usersapp.models import CustomUser
+
+BENCH_PREFIX = "bench-"
+BENCH_PASSWORD = "bench-password"
+BATCH_SIZE = 1000
+CENT = Decimal("0.01")
+
+SEARCH_TERMS = ("cafe", "te", "molido", "grano", "taza", "premium", "organico", "kit")
+_DISCOUNT_RATES = (Decimal("0"), Decimal("0"), Decimal("0"), Decimal("0.1"), Decimal("0.2"))
+_WORDS = (
+    "Café", "Té", "Molido", "Grano", "Taza", "Premium", "Orgánico", "Tostado", "Suave", "Intenso",
+    "Blend", "Filtro", "Prensa", "Espresso", "Verde", "Negro", "Chai", "Kit", "Regalo", "Clásico",
+)
+
+
+# --- Data ---
+
+def clear_data():
+    """
+    Deletes everything seed_data() created, with the orders placed by the
+    benchmark users.
+    """
+    with transaction.atomic():
+        users = CustomUser.objects.filter(username__startswith=BENCH_PREFIX)
+        Order.objects.filter(user__in=users).delete()
+        users.delete()
+        products = Product.objects.filter(slug__startswith=BENCH_PREFIX)
+        BundleItem.objects.filter(from_product__in=products).delete()
+        products.delete()
+        Category.objects.filter(slug__startswith=BENCH_PREFIX).delete()
+        Rubro.objects.filter(slug__startswith=BENCH_PREFIX).delete()
+    catalog_changed.send(sender=Product)
+
+
+def seed_data(rubros=5, categories=8, products=10000, bundles=200, users=50, seed=1, stdout=None):
+    """
+    Creates `categories` categories per rubro, `products` products spread
+    over them, `bundles` bundles of 2-4 products (some nested) and `users`
+    clients plus one manager. Returns the row counts.
+    """
+    rng = random.Random(seed)
+    log = stdout.write if stdout else (lambda message: None)
+
+    with transaction.atomic():
+        Rubro.objects.bulk_create([
+            Rubro(name=f"Bench rubro {r}", slug=f"{BENCH_PREFIX}rubro-{r}") for r in range(rubros)
+        ])
+        rubro_ids = list(Rubro.objects.filter(slug__startswith=BENCH_PREFIX).order_by("id").values_list("id", flat=True))
+        Category.objects.bulk_create([
+            Category(rubro_id=rubro_id, name=f"Bench category {r}-{c}", slug=f"{BENCH_PREFIX}category-{r}-{c}")
+            for r, rubro_id in enumerate(rubro_ids)
+            for c in range(categories)
+        ])
+    category_ids = list(Category.objects.filter(slug__startswith=BENCH_PREFIX).values_list("id", flat=True))
+    log(f"{len(rubro_ids)} rubros, {len(category_ids)} categories")
+
+    for start in range(0, products, BATCH_SIZE):
+        batch = []
+        for i in range(start, min(start + BATCH_SIZE, products)):
+            words = rng.sample(_WORDS, 3)
+            price = Decimal(rng.randrange(200, 20000)) / 100
+            batch.append(Product(
+                name=f"{' '.join(words)} {i}",
+                slug=f"{BENCH_PREFIX}product-{i}",
+                category_id=rng.choice(category_ids),
+                price=price,
+                discount=(price * rng.choice(_DISCOUNT_RATES)).quantize(CENT),
+                featured=rng.random() < 0.1,
+                short_description=" ".join(rng.sample(_WORDS, 6)),
+                long_description=" ".join(rng.choices(_WORDS, k=40)),
+                # Enough for every checkout a benchmark run makes
+                stock=rng.choice((0, 5, 1000000, 1000000, 1000000)),
+            ))
+        Product.objects.bulk_create(batch)
+        log(f"{min(start + BATCH_SIZE, products)}/{products} products")
+
+    product_ids = list(
+        Product.objects.filter(slug__startswith=BENCH_PREFIX, slug__contains="-product-")
+        .order_by("id").values_list("id", flat=True)
+    )
+    Product.objects.bulk_create([
+        Product(
+            name=f"Kit {' '.join(rng.sample(_WORDS, 2))} {b}",
+            slug=f"{BENCH_PREFIX}bundle-{b}",
+            category_id=rng.choice(category_ids),
+            price=Decimal(rng.randrange(1000, 30000)) / 100,
+        )
+        for b in range(bundles)
+    ])
+    bundle_ids = list(
+        Product.objects.filter(slug__startswith=f"{BENCH_PREFIX}bundle-").order_by("id").values_list("id", flat=True)
+    )
+    edges = []
+    for n, bundle_id in enumerate(bundle_ids):
+        items = set(rng.sample(product_ids, rng.randint(2, 4)))
+        # Every tenth bundle also holds an earlier bundle (no cycles possible)
+        if n % 10 == 9:
+            items.add(bundle_ids[rng.randrange(n)])
+        edges += [BundleItem(from_product_id=bundle_id, to_product_id=item) for item in items]
+    BundleItem.objects.bulk_create(edges, batch_size=BATCH_SIZE)
+    sync_is_bundle(bundle_ids)
+    log(f"{len(bundle_ids)} bundles")
+
+    password = make_password(BENCH_PASSWORD)  # hashed once, not per user
+    CustomUser.objects.bulk_create(
+        [CustomUser(username=f"{BENCH_PREFIX}user-{u}", email=f"user{u}@bench.test", password=password) for u in range(users)]
+        + [CustomUser(username=f"{BENCH_PREFIX}manager", password=password, role=CustomUser.MANAGER)]
+    )
+    log(f"{users} users and 1 manager")
+
+    catalog_changed.send(sender=Product)
+    return {
+        "rubros": len(rubro_ids),
+        "categories": len(category_ids),
+        "products": len(product_ids),
+        "bundles": len(bundle_ids),
+        "users": users,
+    }
+
+
+# --- Measuring ---
+
+def percentile(sorted_values, p):
+    """
+    Nearest-rank percentile of an already sorted list.
+    """
+    if not sorted_values:
+        return 0.0
+    rank = max(1, math.ceil(p / 100 * len(sorted_values)))
+    return sorted_values[rank - 1]
+
+
+def _server_timing(header):
+    """
+    (db ms, queries) from InstrumentationMiddleware's Server-Timing header.
+    """
+    db_ms, queries = 0.0, 0
+    for part in (header or "").split(","):
+        fields = part.strip().split(";")
+        if fields[0] != "db":
+            continue
+        for field in fields[1:]:
+            key, _, value = field.partition("=")
+            if key == "dur":
+                db_ms = float(value)
+            elif key == "desc":
+                queries = int(value.strip('"').split()[0])
+    return db_ms, queries
+
+
+class Recorder:
+    """
+    Latencies, query counts and errors per endpoint label. Thread-safe.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.samples = {}
+        # Labels timed on their own, for their throughput
+        self.walls = {}
+
+    def record(self, label, elapsed_ms, status, server_timing, expected=(200,)):
+        db_ms, queries = _server_timing(server_timing)
+        with self._lock:
+            sample = self.samples.setdefault(label, {"ms": [], "db_ms": [], "queries": [], "errors": 0})
+            sample["ms"].append(elapsed_ms)
+            sample["db_ms"].append(db_ms)
+            sample["queries"].append(queries)
+            if status not in expected:
+                sample["errors"] += 1
+
+    def request(self, client, label, method, path, data=None, expected=(200,)):
+        started = time.perf_counter()
+        if method == "post":
+            response = client.post(path, json.dumps(data), content_type="application/json")
+        else:
+            response = client.get(path, data)
+        elapsed = (time.perf_counter() - started) * 1000
+        self.record(label, elapsed, response.status_code, response.get("Server-Timing"), expected)
+        return response
+
+    async def arequest(self, client, label, path, data=None, expected=(200,)):
+        started = time.perf_counter()
+        response = await client.get(path, data)
+        elapsed = (time.perf_counter() - started) * 1000
+        self.record(label, elapsed, response.status_code, response.get("Server-Timing"), expected)
+        return response
+
+    def http_request(self, label, url, expected=(200,)):
+        started = time.perf_counter()
+        try:
+            with urlopen(url, timeout=30) as response:
+                response.read()
+                status, server_timing = response.status, response.headers.get("Server-Timing")
+        except HTTPError as e:
+            status, server_timing = e.code, e.headers.get("Server-Timing")
+        except URLError:
+            status, server_timing = 0, None
+        self.record(label, (time.perf_counter() - started) * 1000, status, server_timing, expected)
+
+    def summary(self, wall_seconds):
+        result = {}
+        for label, sample in sorted(self.samples.items()):
+            ms = sorted(sample["ms"])
+            count = len(ms)
+            wall = self.walls.get(label, wall_seconds)
+            result[label] = {
+                "requests": count,
+                "errors": sample["errors"],
+                "throughput_rps": round(count / wall, 1) if wall else 0,
+                "mean_ms": round(sum(ms) / count, 2),
+                "p50_ms": round(percentile(ms, 50), 2),
+                "p95_ms": round(percentile(ms, 95), 2),
+                "p99_ms": round(percentile(ms, 99), 2),
+                "queries_per_request": round(sum(sample["queries"]) / count, 2),
+                "db_ms_per_request": round(sum(sample["db_ms"]) / count, 2),
+            }
+        return result
+
+
+def _client(host, username=None):
+    client = Client(HTTP_HOST=host)
+    if username:
+        client.force_login(CustomUser.objects.get(username=username))
+    return client
+
+
+def _close_connection():
+    # Looked up on the calling thread: connections are per thread
+    connection.close()
+
+
+def _bench_taxonomy():
+    return (
+        list(Rubro.objects.filter(slug__startswith=BENCH_PREFIX).values_list("slug", flat=True)),
+        list(Category.objects.filter(slug__startswith=BENCH_PREFIX).values_list("slug", flat=True)),
+    )
+
+
+# --- Scenarios: each returns (Recorder, wall seconds) ---
+
+def catalog_browsing(requests=300, seed=1, host="localhost", cold=False, **kwargs):
+    """
+    Landing page loads: facets, then product pages with a random mix of
+    search, rubro/category filter and sort, paged by number or cursor.
+    `cold` clears the cache before each request (outside the timing).
+    """
+    rng = random.Random(seed)
+    rubros, categories = _bench_taxonomy()
+    client = _client(host)
+    recorder = Recorder()
+
+    def get(label, path, params=None):
+        if cold:
+            catalog_cache.clear()
+        return recorder.request(client, label, "get", path, params)
+
+    started = time.perf_counter()
+    done = 0
+    while done < requests:
+        get("facets", "/api/products/facets/", {"taxonomy": "1"})
+        params = {"sort": rng.choice(("default", "price-asc", "price-desc", "name-asc")), "taxonomy": "0"}
+        roll = rng.random()
+        if roll < 0.3:
+            params["search"] = rng.choice(SEARCH_TERMS)
+            label = "products:search"
+        elif roll < 0.6:
+            params["category"] = rng.choice(categories)
+            label = "products:category"
+        elif roll < 0.75:
+            params["rubro"] = rng.choice(rubros)
+            label = "products:rubro"
+        else:
+            label = "products:all"
+        done += 1
+
+        if rng.random() < 0.5:
+            # Numbered pages, like the landing's pager
+            for page in range(1, rng.randint(1, 4) + 1):
+                get(label, "/api/products/", {**params, "page": page})
+                done += 1
+        else:
+            cursor = ""
+            for _ in range(rng.randint(1, 4)):
+                response = get(f"{label}:cursor", "/api/products/", {**params, "cursor": cursor})
+                done += 1
+                cursor = response.json().get("next") if response.status_code == 200 else None
+                if not cursor:
+                    break
+    return recorder, time.perf_counter() - started
+
+
+def concurrent_checkouts(requests=200, seed=1, host="localhost", concurrency=8, **kwargs):
+    """
+    `concurrency` logged-in clients posting checkouts of 1-4 in-stock
+    benchmark products at once.
+    """
+    in_stock = list(
+        Product.objects.filter(slug__startswith=f"{BENCH_PREFIX}product-", stock__gte=1000)
+        .values_list("id", flat=True)[:2000]
+    )
+    usernames = list(
+        CustomUser.objects.filter(username__startswith=f"{BENCH_PREFIX}user-").values_list("username", flat=True)
+    )
+    if not in_stock or not usernames:
+        raise ValueError("No benchmark products or users, run seed_benchmark_data first.")
+    recorder = Recorder()
+
+    def worker(n):
+        rng = random.Random(seed * 1000 + n)
+        try:
+            client = _client(host, usernames[n % len(usernames)])
+            for _ in range(requests // concurrency + (n < requests % concurrency)):
+                cart = {
+                    "customer_name": "Bench",
+                    "customer_email": "bench@bench.test",
+                    "items": [
+                        {"product_id": pid, "quantity": rng.randint(1, 3)}
+                        for pid in rng.sample(in_stock, rng.randint(1, 4))
+                    ],
+                }
+                recorder.request(client, "checkout", "post", "/api/checkout/", cart, expected=(201,))
+        finally:
+            connection.close()
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        list(pool.map(worker, range(concurrency)))
+    return recorder, time.perf_counter() - started
+
+
+def admin_lists(requests=100, seed=1, host="localhost", **kwargs):
+    """
+    A manager paging, sorting and filtering the management lists.
+    """
+    rng = random.Random(seed)
+    _, categories = _bench_taxonomy()
+    category_ids = list(Category.objects.filter(slug__in=categories).values_list("id", flat=True))
+    client = _client(host, f"{BENCH_PREFIX}manager")
+    recorder = Recorder()
+    lists = (
+        ("admin:products", "/adminmodule/products/", ("name", "-price", "stock", "category", "-featured")),
+        ("admin:categories", "/adminmodule/categories/", ("name", "rubro", "-slug")),
+        ("admin:users", "/adminmodule/userlist/", ("username", "-id", "role")),
+        ("admin:campaigns", "/adminmodule/campaigns/", ("-starts", "name")),
+    )
+
+    started = time.perf_counter()
+    for _ in range(requests):
+        label, path, sorts = rng.choice(lists)
+        params = {"sort": rng.choice(sorts), "page": rng.randint(1, 20), "per_page": rng.choice((25, 50, 100))}
+        if label == "admin:products" and rng.random() < 0.5:
+            if rng.random() < 0.5:
+                params["q"] = rng.choice(SEARCH_TERMS)
+            else:
+                params["category"] = rng.choice(category_ids)
+        recorder.request(client, label, "get", path, params)
+    return recorder, time.perf_counter() - started
+
+
+def _product_queries(requests, seed):
+    """
+    Query strings for products_api: filters, sorts and pages spread wide
+    enough that most requests miss the response cache.
+    """
+    rng = random.Random(seed)
+    rubros, categories = _bench_taxonomy()
+    queries = []
+    for _ in range(requests):
+        params = {
+            "sort": rng.choice(("default", "price-asc", "price-desc", "name-asc")),
+            "page": rng.randint(1, 50),
+            "page_size": rng.choice((20, 40)),
+            "taxonomy": rng.choice(("0", "1")),
+        }
+        roll = rng.random()
+        if roll < 0.2:
+            params["search"] = rng.choice(SEARCH_TERMS)
+        elif roll < 0.7:
+            params["category"] = rng.choice(categories)
+        elif roll < 0.85:
+            params["rubro"] = rng.choice(rubros)
+        queries.append(params)
+    return queries
+
+
+def sync_vs_async(requests=300, seed=1, host="localhost", concurrency=8, base_url=None, **kwargs):
+    """
+    The same product queries against products_api and products_api_async,
+    `concurrency` at a time. In process, the sync view is driven from a
+    thread pool and the async one from the event loop (AsyncClient, the
+    ASGI code path). With `base_url` both go over HTTP to a running
+    server: run it under a WSGI server and under uvicorn
+    (dadsproject.asgi:application), saving and comparing baselines.
+    """
+    queries = _product_queries(requests, seed)
+    recorder = Recorder()
+    started = time.perf_counter()
+
+    def timed(label, run):
+        label_started = time.perf_counter()
+        run()
+        recorder.walls[label] = time.perf_counter() - label_started
+
+    if base_url:
+        base_url = base_url.rstrip("/")
+        for label, path in (("http:sync", "/api/products/"), ("http:async", "/api/async/products/")):
+            urls = [f"{base_url}{path}?{urlencode(params)}" for params in queries]
+            with ThreadPoolExecutor(max_workers=concurrency) as pool:
+                timed(label, lambda: list(pool.map(lambda url: recorder.http_request(label, url), urls)))
+        return recorder, time.perf_counter() - started
+
+    def run_sync():
+        def worker(n):
+            client = _client(host)
+            try:
+                for params in queries[n::concurrency]:
+                    recorder.request(client, "wsgi:products", "get", "/api/products/", params)
+            finally:
+                connection.close()
+
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            list(pool.map(worker, range(concurrency)))
+
+    async def run_async():
+        client = AsyncClient(HTTP_HOST=host)
+        slots = asyncio.Semaphore(concurrency)
+
+        async def get(params):
+            # A sync thread (and connection) per request, like ASGIHandler
+            async with slots, ThreadSensitiveContext():
+                try:
+                    await recorder.arequest(client, "asgi:products", "/api/async/products/", params)
+                finally:
+                    await sync_to_async(_close_connection)()
+
+        await asyncio.gather(*(get(params) for params in queries))
+
+    catalog_cache.clear()
+    timed("wsgi:products", run_sync)
+    catalog_cache.clear()
+    timed("asgi:products", lambda: asyncio.run(run_async()))
+    return recorder, time.perf_counter() - started
+
+
+SCENARIOS = {
+    "catalog": catalog_browsing,
+    "checkout": concurrent_checkouts,
+    "admin": admin_lists,
+    "async": sync_vs_async,
+}
+
+
+def compare(results, baseline, threshold=20.0):
+    """
+    Rows of (scenario, label, metric, baseline, current, change %,
+    regressed) and whether any metric got worse by more than `threshold`
+    percent.
+    """
+    rows, regressed = [], False
+    for scenario, labels in results.items():
+        for label, current in labels.items():
+            before = baseline.get(scenario, {}).get(label)
+            if not before:
+                continue
+            for metric in ("p50_ms", "p95_ms", "p99_ms", "queries_per_request", "throughput_rps"):
+                old, new = before.get(metric, 0), current[metric]
+                change = (new - old) / old * 100 if old else (0.0 if new == old else math.inf)
+                # Throughput regresses when it drops, everything else when it grows
+                worse = -change if metric == "throughput_rps" else change
+                if worse > threshold:
+                    regressed = True
+                rows.append((scenario, label, metric, old, new, change, worse > threshold))
+    return rows, regressed
@@ -0,0 +1,109 @@
+import json
+import logging
+import platform
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.utils import timezone
+
+from dadsproject.caching import catalog_cache
+from productsapp.models import Product
+from storefrontapp.benchmarks import BENCH_PREFIX, SCENARIOS, compare
+
+
+class Command(BaseCommand):
+    help = (
+        "Runs the benchmark scenarios (catalog, checkout, admin) against the seeded data and reports "
+        "p50/p95/p99 latency, throughput and queries per request. Can save a JSON baseline and compare to one."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--scenario", action="append", dest="scenarios", choices=list(SCENARIOS), help="Repeatable. Default: all."
+        )
+        parser.add_argument("--requests", type=int, default=300, help="Requests per scenario.")
+        parser.add_argument("--concurrency", type=int, default=8, help="Parallel clients for checkout.")
+        parser.add_argument("--seed", type=int, default=1)
+        parser.add_argument("--cold", action="store_true", help="Clear the cache before every catalog request.")
+        parser.add_argument("--host", default="localhost", help="Host header; must be allowed by ALLOWED_HOSTS.")
+        parser.add_argument(
+            "--base-url", help="async scenario only: hit a running server (e.g. http://127.0.0.1:8000) over HTTP."
+        )
+        parser.add_argument("--save", metavar="PATH", help="Write the results as a JSON baseline.")
+        parser.add_argument("--compare", metavar="PATH", help="Compare against a saved baseline.")
+        parser.add_argument("--threshold", type=float, default=20.0, help="Regression threshold in percent.")
+        parser.add_argument("--fail-on-regression", action="store_true", help="Exit with an error on a regression.")
+
+    def handle(self, *args, **options):
+        if not Product.objects.filter(slug__startswith=BENCH_PREFIX).exists():
+            raise CommandError("No benchmark data, run seed_benchmark_data first.")
+        baseline = None
+        if options["compare"]:
+            try:
+                with open(options["compare"], encoding="utf-8") as f:
+                    baseline = json.load(f)["results"]
+            except (OSError, ValueError, KeyError) as e:
+                raise CommandError(f"Can't read the baseline: {e}")
+
+        names = options["scenarios"] or list(SCENARIOS)
+        if options["verbosity"] < 2:
+            # Slow request/SQL warnings would bury the tables
+            logging.getLogger("dadsproject.performance").setLevel(logging.ERROR)
+        results = {}
+        for name in names:
+            self.stdout.write(f"Running {name}...")
+            # Same starting point for every run
+            catalog_cache.clear()
+            recorder, wall = SCENARIOS[name](
+                requests=options["requests"],
+                seed=options["seed"],
+                host=options["host"],
+                concurrency=options["concurrency"],
+                cold=options["cold"],
+                base_url=options["base_url"],
+            )
+            results[name] = recorder.summary(wall)
+            self.print_table(name, results[name])
+
+        if options["save"]:
+            with open(options["save"], "w", encoding="utf-8") as f:
+                json.dump({"meta": self.meta(options), "results": results}, f, indent=2)
+            self.stdout.write(f"Baseline saved to {options['save']}.")
+
+        if baseline is not None:
+            rows, regressed = compare(results, baseline, options["threshold"])
+            self.print_comparison(rows)
+            if regressed and options["fail_on_regression"]:
+                raise CommandError(f"Regression over {options['threshold']:g}% against {options['compare']}.")
+
+    def meta(self, options):
+        return {
+            "created_at": timezone.now().isoformat(),
+            "database": connection.vendor,
+            "python": platform.python_version(),
+            "debug": settings.DEBUG,
+            "products": Product.objects.count(),
+            "requests": options["requests"],
+            "concurrency": options["concurrency"],
+            "seed": options["seed"],
+            "cold": options["cold"],
+            "base_url": options["base_url"],
+        }
+
+    def print_table(self, scenario, rows):
+        header = f"{'endpoint':<28}{'reqs':>6}{'err':>5}{'rps':>8}{'p50':>9}{'p95':>9}{'p99':>9}{'queries':>9}{'db ms':>8}"
+        self.stdout.write(header)
+        for label, r in rows.items():
+            self.stdout.write(
+                f"{label:<28}{r['requests']:>6}{r['errors']:>5}{r['throughput_rps']:>8}"
+                f"{r['p50_ms']:>9.1f}{r['p95_ms']:>9.1f}{r['p99_ms']:>9.1f}"
+                f"{r['queries_per_request']:>9.1f}{r['db_ms_per_request']:>8.1f}"
+            )
+        self.stdout.write("")
+
+    def print_comparison(self, rows):
+        self.stdout.write(f"{'scenario/endpoint':<38}{'metric':<22}{'baseline':>10}{'now':>10}{'change':>9}")
+        for scenario, label, metric, old, new, change, regressed in rows:
+            line = f"{scenario + '/' + label:<38}{metric:<22}{old:>10}{new:>10}{change:>+8.1f}%"
+            self.stdout.write(self.style.ERROR(line) if regressed else line)
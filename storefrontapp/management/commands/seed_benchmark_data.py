@@ -0,0 +1,46 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from productsapp.models import Product
+from storefrontapp.benchmarks import BENCH_PREFIX, BENCH_PASSWORD, clear_data, seed_data
+
+
+class Command(BaseCommand):
+    help = (
+        "Fills the configured database with a reproducible benchmark catalog, users included. "
+        "Use a local database: run_benchmarks places orders against it."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--rubros", type=int, default=5)
+        parser.add_argument("--categories", type=int, default=8, help="Per rubro.")
+        parser.add_argument("--products", type=int, default=10000)
+        parser.add_argument("--bundles", type=int, default=200)
+        parser.add_argument("--users", type=int, default=50)
+        parser.add_argument("--seed", type=int, default=1)
+        parser.add_argument("--reset", action="store_true", help="Delete earlier benchmark data first.")
+        parser.add_argument("--clear", action="store_true", help="Only delete the benchmark data.")
+
+    def handle(self, *args, **options):
+        if options["reset"] or options["clear"]:
+            clear_data()
+            self.stdout.write("Benchmark data deleted.")
+            if options["clear"]:
+                return
+        elif Product.objects.filter(slug__startswith=BENCH_PREFIX).exists():
+            raise CommandError("Benchmark data already exists, use --reset to recreate it.")
+
+        started = time.perf_counter()
+        counts = seed_data(
+            rubros=options["rubros"],
+            categories=options["categories"],
+            products=options["products"],
+            bundles=options["bundles"],
+            users=options["users"],
+            seed=options["seed"],
+            stdout=self.stdout,
+        )
+        summary = ", ".join(f"{n} {name}" for name, n in counts.items())
+        self.stdout.write(self.style.SUCCESS(f"Seeded {summary} in {time.perf_counter() - started:.1f}s."))
+        self.stdout.write(f"Benchmark users log in with the password '{BENCH_PASSWORD}'.")
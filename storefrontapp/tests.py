@@ -1,3 +1,110 @@
-from django.test import TestCase
+from django.core.cache import cache
+from django.test import TestCase, override_settings
 
-# Create your tests here.
+from dadsproject.metrics import registry
+from dadsproject.middleware import QueryBudgetExceeded
+from ordersapp.pricing import get_rules
+from productsapp.models import Product
+from productsapp.testing import make_category
+from storefrontapp.benchmarks import BENCH_PREFIX, clear_data, compare, percentile, seed_data
+from usersapp.models import CustomUser
+
+
+@override_settings(QUERY_BUDGET_STRICT=True)
+class QueryBudgetTests(TestCase):
+    """
+    Hits the budgeted views with enough rows that an N+1 would blow the
+    budget (see QUERY_BUDGETS in settings.py).
+    """
+
+    def setUp(self):
+        cache.clear()
+        registry.reset()
+        category = make_category("Beans")
+        self.products = [
+            Product.objects.create(name=f"Beans {i}", slug=f"beans-{i}", category=category, price="10.00", stock=50)
+            for i in range(30)
+        ]
+        bundle = Product.objects.create(name="Kit", slug="kit", category=category, price="25.00")
+        bundle.items.set(self.products[:3])
+        self.manager = CustomUser.objects.create_user("boss", password="x", role="manager")
+        get_rules()
+
+    def cart(self):
+        return {
+            "customer_name": "Ana",
+            "customer_email": "ana@example.com",
+            "items": [{"product_id": p.id, "quantity": 1} for p in self.products[:3]],
+        }
+
+    def test_storefront_views_stay_within_budget(self):
+        for url in ("/", "/api/products/", "/api/products/?cursor=", "/api/products/facets/"):
+            self.assertEqual(self.client.get(url).status_code, 200, url)
+        self.assertEqual(self.client.post("/api/quote/", self.cart(), content_type="application/json").status_code, 200)
+
+        self.client.force_login(self.manager)
+        response = self.client.post("/api/checkout/", self.cart(), content_type="application/json")
+        self.assertEqual(response.status_code, 201)
+
+    def test_admin_lists_stay_within_budget(self):
+        self.client.force_login(self.manager)
+        for path in ("adminlanding/", "products/", "categories/", "rubros/", "campaigns/", "userlist/"):
+            self.assertEqual(self.client.get(f"/adminmodule/{path}").status_code, 200, path)
+
+    @override_settings(QUERY_BUDGETS={"products_api": 1})
+    def test_over_budget_fails_in_strict_mode(self):
+        with self.assertRaisesMessage(QueryBudgetExceeded, "products_api ran"):
+            self.client.get("/api/products/")
+
+    @override_settings(QUERY_BUDGETS={"products_api": 1}, QUERY_BUDGET_STRICT=False)
+    def test_over_budget_only_logs_otherwise(self):
+        with self.assertLogs("dadsproject.performance", "WARNING"):
+            self.assertEqual(self.client.get("/api/products/").status_code, 200)
+
+    def test_server_timing_and_metrics(self):
+        response = self.client.get("/api/products/")
+        self.assertRegex(response["Server-Timing"], r'^app;dur=[\d.]+, db;dur=[\d.]+;desc="\d+ queries"$')
+
+        with override_settings(METRICS_TOKEN="s3cret"):
+            metrics = self.client.get("/metrics/", headers={"authorization": "Bearer s3cret"}).content.decode()
+        self.assertIn('http_request_duration_seconds_count{view="products_api"} 1', metrics)
+        self.assertIn('http_responses_total{view="products_api",status="200"} 1', metrics)
+
+    @override_settings(METRICS_TOKEN="s3cret")
+    def test_metrics_need_a_superuser_or_the_token(self):
+        # Loopback is what a local reverse proxy forwards everyone from
+        self.assertEqual(self.client.get("/metrics/", REMOTE_ADDR="127.0.0.1").status_code, 404)
+        self.assertEqual(self.client.get("/metrics/", headers={"authorization": "Bearer nope"}).status_code, 404)
+        self.assertEqual(self.client.get("/metrics/", headers={"authorization": "Bearer s3cret"}).status_code, 200)
+
+        self.client.force_login(CustomUser.objects.create_superuser("root", password="x"))
+        self.assertEqual(self.client.get("/metrics/").status_code, 200)
+
+
+class BenchmarkTests(TestCase):
+    def test_seed_is_reproducible_and_clearable(self):
+        seed_data(rubros=2, categories=2, products=40, bundles=3, users=2, seed=7)
+        first = list(Product.objects.filter(slug__startswith=BENCH_PREFIX).order_by("slug").values_list("slug", "price"))
+        clear_data()
+        self.assertFalse(Product.objects.filter(slug__startswith=BENCH_PREFIX).exists())
+
+        seed_data(rubros=2, categories=2, products=40, bundles=3, users=2, seed=7)
+        again = list(Product.objects.filter(slug__startswith=BENCH_PREFIX).order_by("slug").values_list("slug", "price"))
+        self.assertEqual(first, again)
+        self.assertEqual(Product.objects.filter(slug__startswith=BENCH_PREFIX, is_bundle=True).count(), 3)
+
+    def test_compare_flags_regressions(self):
+        before = {"catalog": {"facets": {"p50_ms": 10, "p95_ms": 20, "p99_ms": 30,
+                                         "queries_per_request": 2, "throughput_rps": 100}}}
+        slower = {"catalog": {"facets": {"p50_ms": 10.5, "p95_ms": 20, "p99_ms": 30,
+                                         "queries_per_request": 2, "throughput_rps": 70}}}
+        rows, regressed = compare(slower, before, threshold=20)
+        self.assertTrue(regressed)
+        self.assertEqual([row[2] for row in rows if row[6]], ["throughput_rps"])
+        self.assertFalse(compare(before, before)[1])
+
+    def test_percentile(self):
+        values = list(range(1, 101))
+        self.assertEqual(percentile(values, 50), 50)
+        self.assertEqual(percentile(values, 99), 99)
+        self.assertEqual(percentile([], 95), 0)
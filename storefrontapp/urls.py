@@ -1,8 +1,10 @@
 from django.urls import path
 from django.contrib.auth.views import LogoutView
 from .views import SBLoginView, home, unauthorized, newcontact
-from productsapp.apis import products_api
-from ordersapp.apis import checkout_api
+from productsapp.apis import products_api, facets_api
+from productsapp.async_apis import products_api_async
+from ordersapp.apis import checkout_api, checkout_batch_api, quote_api, orders_api, order_detail_api
+from ordersapp.async_apis import checkout_api_async
 
 
 urlpatterns = [
@@ -12,5 +14,13 @@ urlpatterns = [
     path('unauthorized/', unauthorized, name='unauthorized'),
     path('newcontact/', newcontact, name='newcontact'),
     path("api/products/", products_api, name="products_api"),
+    path("api/products/facets/", facets_api, name="facets_api"),
     path("api/checkout/", checkout_api, name="checkout_api"),
-]
\ No newline at end of file
+    path("api/checkout/batch/", checkout_batch_api, name="checkout_batch_api"),
+    path("api/quote/", quote_api, name="quote_api"),
+    path("api/orders/", orders_api, name="orders_api"),
+    path("api/orders/<int:order_id>/", order_detail_api, name="order_detail_api"),
+    # Async variants for ASGI servers, see productsapp/async_apis.py
+    path("api/async/products/", products_api_async, name="products_api_async"),
+    path("api/async/checkout/", checkout_api_async, name="checkout_api_async"),
+]
@@ -0,0 +1,34 @@
+import time
+
+from django.contrib.sessions.models import Session
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+
+class Command(BaseCommand):
+    help = (
+        "Deletes expired sessions in batches, each its own short DELETE, so logins aren't blocked "
+        "behind one long one (as with clearsessions). Run it from cron, e.g. nightly."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=5000)
+        parser.add_argument("--sleep", type=float, default=0.0, help="Seconds to pause between batches.")
+        parser.add_argument("--dry-run", action="store_true", help="Only count the expired sessions.")
+
+    def handle(self, *args, **options):
+        expired = Session.objects.filter(expire_date__lt=timezone.now())
+        if options["dry_run"]:
+            self.stdout.write(f"{expired.count()} expired session(s).")
+            return
+
+        # Cached copies expire on their own: cached_db gives them the session's age as timeout
+        deleted = 0
+        while True:
+            keys = list(expired.values_list("session_key", flat=True)[: options["batch_size"]])
+            if not keys:
+                break
+            deleted += Session.objects.filter(session_key__in=keys).delete()[0]
+            if options["sleep"]:
+                time.sleep(options["sleep"])
+        self.stdout.write(f"{deleted} expired session(s) deleted.")
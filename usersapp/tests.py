@@ -1,3 +1,78 @@
-from django.test import TestCase
+from datetime import timedelta
+from io import StringIO
 
-# Create your tests here.
+from django.contrib.sessions.models import Session
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.db import connection
+from django.utils import timezone
+
+from dadsproject.caching import app_cache, cache_settings, check_shared_caches, session_engine
+from .models import CustomUser
+
+
+class SessionTests(TestCase):
+    @override_settings(SESSION_ENGINE="django.contrib.sessions.backends.cached_db")
+    def test_authenticated_requests_read_the_session_from_cache(self):
+        user = CustomUser.objects.create_user("ana", password="x")
+        self.client.force_login(user)
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get("/")
+        self.assertFalse([q for q in queries if "django_session" in q["sql"]])
+
+    def test_purge_deletes_only_expired_sessions_in_batches(self):
+        now = timezone.now()
+        for i in range(5):
+            Session.objects.create(session_key=f"old{i}", session_data="", expire_date=now - timedelta(days=1))
+        Session.objects.create(session_key="live", session_data="", expire_date=now + timedelta(days=1))
+
+        out = StringIO()
+        call_command("purge_sessions", "--dry-run", stdout=out)
+        self.assertIn("5 expired", out.getvalue())
+        self.assertEqual(Session.objects.count(), 6)
+
+        with CaptureQueriesContext(connection) as queries:
+            call_command("purge_sessions", "--batch-size", "2", stdout=StringIO())
+        self.assertEqual(list(Session.objects.values_list("session_key", flat=True)), ["live"])
+        self.assertEqual(len([q for q in queries if q["sql"].startswith("DELETE")]), 3)
+
+
+class CacheSettingsTests(TestCase):
+    def test_backend_urls(self):
+        self.assertEqual(cache_settings("file:///var/tmp/dads")["LOCATION"], "/var/tmp/dads")
+        self.assertEqual(cache_settings("memcached:///run/mc.sock")["LOCATION"], "unix:/run/mc.sock")
+        self.assertEqual(cache_settings("unix:///run/redis.sock?db=1")["LOCATION"], "unix:///run/redis.sock?db=1")
+        self.assertNotEqual(
+            cache_settings("locmem://", key_prefix="a")["LOCATION"],
+            cache_settings("locmem://", key_prefix="b")["LOCATION"],
+        )
+
+    def test_cached_sessions_only_on_shared_backends(self):
+        self.assertEqual(session_engine("locmem://"), "django.contrib.sessions.backends.db")
+        self.assertEqual(session_engine("file:///var/tmp/dads"), "django.contrib.sessions.backends.cached_db")
+        self.assertEqual(session_engine("unix:///run/redis.sock"), "django.contrib.sessions.backends.cached_db")
+
+    def test_warns_about_per_process_caches_without_debug(self):
+        caches = {
+            "default": cache_settings("locmem://", key_prefix="default"),
+            "sessions": cache_settings("locmem://", key_prefix="sessions"),
+        }
+        with override_settings(CACHES=caches, DEBUG=False):
+            self.assertEqual([w.id for w in check_shared_caches()], ["dadsproject.W001"])
+        with override_settings(CACHES=caches, DEBUG=True):
+            self.assertEqual(check_shared_caches(), [])
+
+        caches["default"] = cache_settings("file:///var/tmp/dads", key_prefix="default")
+        with override_settings(CACHES=caches, DEBUG=False):
+            self.assertEqual(check_shared_caches(), [])
+
+    def test_app_cache_falls_back_to_default(self):
+        caches = {
+            "default": cache_settings("locmem://", key_prefix="default"),
+            "catalog": cache_settings("locmem://", key_prefix="catalog"),
+        }
+        with override_settings(CACHES=caches):
+            app_cache("catalog").set("k", 1)
+            self.assertIsNone(app_cache("default").get("k"))
+            self.assertEqual(app_cache("other").get("k", "miss"), "miss")
@@ -1,6 +1,8 @@
 from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib import messages
 from django.contrib.auth.decorators import user_passes_test
+from django.db.models import Q
+from adminapp.listing import paginate_list
 from .forms import CustomUserCreationForm
 from django.contrib.auth import get_user_model
 from .models import CustomUser
@@ -11,10 +13,30 @@ def is_manager(user):
 
 User = get_user_model()
 
+USER_SORTS = {
+    'id': ('id',),
+    'username': ('username', 'id'),
+    'name': ('last_name', 'first_name', 'id'),
+    'role': ('role', 'username', 'id'),
+}
+
 @user_passes_test(is_manager, login_url='/unauthorized/')
 def user_list(request):
-    users = CustomUser.objects.all().order_by('username')
-    return render(request, 'user_list.html', {'users': users})
+    users = CustomUser.objects.only('id', 'username', 'first_name', 'last_name', 'role')
+
+    q = request.GET.get('q', '').strip()
+    if q:
+        users = users.filter(
+            Q(username__icontains=q) | Q(first_name__icontains=q)
+            | Q(last_name__icontains=q) | Q(email__icontains=q)
+        )
+    role = request.GET.get('role', '')
+    if role in dict(CustomUser.ROLE_CHOICES):
+        users = users.filter(role=role)
+
+    context = paginate_list(request, users, USER_SORTS, 'username')
+    context.update({'q': q, 'role': role, 'roles': CustomUser.ROLE_CHOICES})
+    return render(request, 'user_list.html', context)
 
 @user_passes_test(is_manager, login_url='/unauthorized/')
 def user_create(request):